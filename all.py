@@ -1,12 +1,26 @@
-import time
+import sys
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
+from waits import (recorder, wait_for_page_ready, wait_for_element, wait_for_staleness,
+                   wait_for_network_idle, wait_for_stable_count)
+from crawl_plan import load_or_build_plan, iter_jobs
+from crawl_pool import run_pool, CRAWL_WORKERS
+from fast_fetch import fetch_listing, stats as fetch_stats
+from catalog_store import CATALOG_CSV, write_catalog
+from service_store import ServiceStore
+import metrics
+
+# Locators shared by the waits and the scraping steps
+TOPIC_LOCATOR = (By.XPATH, "//a[contains(@class, 'topic')]")
+SUBTOPIC_LOCATOR = (By.XPATH, "//div[@class='subtopic-heading']")
+RESULT_LOCATOR = (By.CLASS_NAME, "title")
+NEXT_PAGE_LOCATOR = (By.XPATH, "//span[@aria-label='Next Page']/parent::a")
+# The listing's "No results" notice, so an empty subtopic doesn't wait out the full timeout
+EMPTY_RESULTS_LOCATOR = (By.XPATH, "//*[contains(translate(text(), 'NORESULTS', 'noresults'), 'no results')]")
 
 # ---------- Helper Functions ----------
 
@@ -16,38 +30,39 @@ def dismiss_cookie_banner(driver):
     Adjust the element IDs/selectors as needed.
     """
     try:
-        # Remove cookie banner elements
-        driver.execute_script("var e = document.getElementById('cookie-banner'); if(e){e.remove();}")
-        driver.execute_script("var e = document.getElementById('cookie-text'); if(e){e.remove();}")
-        driver.execute_script("var e = document.getElementById('cookie-info'); if(e){e.remove();}")
-        # Also remove site navigation that might intercept clicks
-        driver.execute_script("var e = document.getElementById('site-nav-lt'); if(e){e.remove();}")
+        # Remove cookie banner elements and site navigation that might intercept clicks.
+        # DOM removal is synchronous, so there is nothing to wait for afterwards.
+        driver.execute_script(
+            "['cookie-banner', 'cookie-text', 'cookie-info', 'site-nav-lt'].forEach(function(id) {"
+            "  var e = document.getElementById(id); if(e){e.remove();}"
+            "});"
+        )
         print("[INFO] Cookie banner and interfering navigation dismissed.")
     except Exception as ex:
         print(f"[WARNING] Could not dismiss interfering elements: {ex}")
-    time.sleep(1)
 
 def open_search_page(driver, location="Toronto"):
     """
     Opens the main search page and sets the location.
     """
     driver.get("https://211ontario.ca/search/")
-    time.sleep(3)
+    wait_for_page_ready(driver, step="open_search_page", baseline=3)
     dismiss_cookie_banner(driver)
-    location_box = driver.find_element(By.ID, "searchLocation")
+    location_box = wait_for_element(driver, (By.ID, "searchLocation"), step="location_box")
     location_box.clear()
     location_box.send_keys(location)
-    time.sleep(2)
+    # Typing the location may trigger an autocomplete lookup
+    wait_for_network_idle(driver, step="set_location", baseline=2)
 
 def get_all_topics(driver):
     """
     Collects all main topics available on the search page.
     Returns a list of tuples: (topic_name, topic_element)
     """
-    time.sleep(3)
+    wait_for_stable_count(driver, TOPIC_LOCATOR, step="get_all_topics", baseline=3)
     topics = []
     # Adjust this XPath as needed; here we assume topics are <a> elements with a class that contains "topic"
-    topic_elements = driver.find_elements(By.XPATH, "//a[contains(@class, 'topic')]")
+    topic_elements = driver.find_elements(*TOPIC_LOCATOR)
     for elem in topic_elements:
         topic_name = elem.text.strip()
         if topic_name:
@@ -58,21 +73,23 @@ def click_topic(driver, topic_name="Abuse / Assault"):
     """
     Finds and clicks the main topic by its text.
     """
-    time.sleep(3)
     dismiss_cookie_banner(driver)
-    topic_element = driver.find_element(By.XPATH, f"//a[contains(text(), '{topic_name}')]")
+    topic_element = wait_for_element(
+        driver, (By.XPATH, f"//a[contains(text(), '{topic_name}')]"),
+        step="click_topic", clickable=True, baseline=3
+    )
     topic_element.click()
-    time.sleep(3)
+    wait_for_stable_count(driver, SUBTOPIC_LOCATOR, step="topic_loaded", baseline=3)
 
 def get_subtopics(driver):
     """
     Returns a list of tuples: (subtopic_name, view_resources_button)
-    from the currently loaded topic page.
+    from the currently loaded topic page. click_topic already waited for
+    the subtopics to settle, so this reads them without waiting again.
     """
-    time.sleep(3)
     dismiss_cookie_banner(driver)
     subtopics = []
-    heading_elements = driver.find_elements(By.XPATH, "//div[@class='subtopic-heading']")
+    heading_elements = driver.find_elements(*SUBTOPIC_LOCATOR)
     for heading in heading_elements:
         subtopic_name = heading.text.strip()
         try:
@@ -90,12 +107,12 @@ def click_subtopic(driver, subtopic_name="Child abuse services", attempts=3):
     Returns True if successful, False otherwise.
     """
     for i in range(attempts):
-        time.sleep(3)
         dismiss_cookie_banner(driver)
         try:
             # Re-locate the subtopic heading to avoid stale element errors
-            heading_element = driver.find_element(
-                By.XPATH, f"//div[@class='subtopic-heading' and contains(text(), '{subtopic_name}')]"
+            heading_element = wait_for_element(
+                driver, (By.XPATH, f"//div[@class='subtopic-heading' and contains(text(), '{subtopic_name}')]"),
+                step="click_subtopic", baseline=3
             )
             print(f"[INFO] Found subtopic heading: {subtopic_name}")
             view_resources = heading_element.find_element(
@@ -105,7 +122,9 @@ def click_subtopic(driver, subtopic_name="Child abuse services", attempts=3):
             driver.execute_script("arguments[0].scrollIntoView(true);", view_resources)
             print(f"[INFO] Attempt {i+1}: Forcing click on 'View Resources' for '{subtopic_name}'...")
             driver.execute_script("arguments[0].click();", view_resources)
-            time.sleep(5)
+            # The old page detaches once the listing navigation starts
+            wait_for_staleness(driver, heading_element, step="subtopic_navigation", baseline=5)
+            wait_for_page_ready(driver, step="subtopic_loaded")
             return True
         except Exception as e:
             print(f"[ERROR] Attempt {i+1} to click subtopic '{subtopic_name}' failed: {e}")
@@ -121,11 +140,12 @@ def extract_services(driver):
 
     while True:
         print(f"\n🔍 [INFO] Scraping page {page_count}...\n")
-        time.sleep(3)
+        wait_for_stable_count(driver, RESULT_LOCATOR, step="extract_services", empty_locator=EMPTY_RESULTS_LOCATOR,
+                              baseline=3)
         dismiss_cookie_banner(driver)
 
         # Find all service containers (assumed to be in <div class="title">)
-        title_elements = driver.find_elements(By.CLASS_NAME, "title")
+        title_elements = driver.find_elements(*RESULT_LOCATOR)
         for title_elem in title_elements:
             try:
                 service_name = title_elem.text.strip()
@@ -146,17 +166,20 @@ def extract_services(driver):
         # Pagination: locate the Next Page link via the <span aria-label='Next Page'> and then its parent <a>
         try:
             print("[INFO] Checking for 'Next Page' link via <span aria-label='Next Page'>...")
+            # The result list is already stable, so the pager is rendered if it exists at all
+            if not driver.find_elements(*NEXT_PAGE_LOCATOR):
+                print("[INFO] No more pages found.")
+                break
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
-            next_page_element = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.XPATH, "//span[@aria-label='Next Page']/parent::a"))
+            next_page_element = wait_for_element(
+                driver, NEXT_PAGE_LOCATOR, step="next_page", clickable=True, baseline=2
             )
             next_page_href = next_page_element.get_attribute("href")
             if next_page_href:
                 print(f"[INFO] Found next page: {next_page_href}")
                 driver.get(next_page_href)
                 page_count += 1
-                time.sleep(5)
+                wait_for_page_ready(driver, step="next_page_loaded", baseline=5)
             else:
                 print("[INFO] No more pages found.")
                 break
@@ -167,64 +190,112 @@ def extract_services(driver):
     print(f"✅ [INFO] Scraping complete. Total services found: {len(all_services)}")
     return all_services
 
-# ---------- Main Function ----------
+def _is_navigable(href):
+    """True if an href can be opened directly instead of clicked"""
+    return bool(href) and not href.startswith("javascript") and not href.endswith("#")
 
-def main():
+def discover_taxonomy(driver, location="Toronto"):
+    """
+    Walks the search UI once and returns the taxonomy for the crawl plan:
+    [(topic_name, [(subtopic_name, result_url), ...]), ...].
+    Each topic page is opened once and the "View Resources" hrefs are read directly;
+    only buttons without a usable href are clicked to learn their URL.
+    """
+    open_search_page(driver, location=location)
+    topic_names = [name for name, _ in get_all_topics(driver)]
+    print(f"[INFO] Found {len(topic_names)} topics.")
+
+    taxonomy = []
+    for topic_name in topic_names:
+        open_search_page(driver, location=location)
+        try:
+            click_topic(driver, topic_name)
+        except Exception as e:
+            print(f"[ERROR] Could not click topic '{topic_name}': {e}")
+            continue
+
+        subtopics = [(name, btn.get_attribute("href")) for name, btn in get_subtopics(driver)]
+        print(f"[INFO] Found {len(subtopics)} subtopics under {topic_name}.")
+
+        # Fall back to clicking for buttons that only navigate via script
+        for i, (subtopic_name, href) in enumerate(subtopics):
+            if _is_navigable(href):
+                continue
+            if click_subtopic(driver, subtopic_name):
+                subtopics[i] = (subtopic_name, driver.current_url)
+            else:
+                print(f"[ERROR] Could not resolve URL for subtopic '{subtopic_name}'.")
+            open_search_page(driver, location=location)
+            click_topic(driver, topic_name)
+
+        taxonomy.append((topic_name, subtopics))
+    return taxonomy
+
+def make_driver():
+    """Start a headless Chrome instance"""
     options = Options()
     options.add_argument("--headless")
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    options.add_argument("--disable-gpu")
+    options.add_argument("--disable-dev-shm-usage")
+    return metrics.instrument_driver(webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options))
 
-    all_results = []
-    try:
-        open_search_page(driver, location="Toronto")
-        topics = get_all_topics(driver)
-        print(f"[INFO] Found {len(topics)} topics.")
-
-        for topic_name, _ in topics:
-            print(f"\n===== Scraping Topic: {topic_name} =====\n")
-            # Reload the search page for each topic
-            open_search_page(driver, location="Toronto")
-            try:
-                click_topic(driver, topic_name)
-            except Exception as e:
-                print(f"[ERROR] Could not click topic '{topic_name}': {e}")
-                continue
+def scrape_listing_selenium(driver, result_url):
+    """Open a subtopic listing directly by URL and scrape all of its pages with Selenium"""
+    driver.get(result_url)
+    wait_for_page_ready(driver, step="open_listing")
+    return extract_services(driver)
 
-            subtopics = get_subtopics(driver)
-            print(f"[INFO] Found {len(subtopics)} subtopics under {topic_name}.")
-
-            # Loop through each subtopic (re-read the list each time)
-            for i in range(len(subtopics)):
-                subtopics = get_subtopics(driver)
-                if i >= len(subtopics):
-                    break
-                subtopic_name, _ = subtopics[i]
-                print(f"\n--> Scraping Subtopic: {subtopic_name}")
-                if not click_subtopic(driver, subtopic_name):
-                    print(f"[ERROR] Failed to click subtopic '{subtopic_name}'. Skipping...")
-                    continue
+def scrape_listing(get_driver, result_url):
+    """
+    Scrape a subtopic listing over plain HTTP, starting a browser only
+    for pages whose markup is incomplete.
+    """
+    return fetch_listing(result_url, lambda url: scrape_listing_selenium(get_driver(), url))
 
-                services = extract_services(driver)
-                for s in services:
-                    s["Topic"] = topic_name
-                    s["Subtopic"] = subtopic_name
-                    all_results.append(s)
-
-                # After scraping a subtopic, return to the topic page for the next subtopic
-                open_search_page(driver, location="Toronto")
-                try:
-                    click_topic(driver, topic_name)
-                except Exception as e:
-                    print(f"[ERROR] Could not re-click topic '{topic_name}': {e}")
-                    break
-                time.sleep(2)
-
-        df = pd.DataFrame(all_results)
-        df.to_csv("all_services_output.csv", index=False)
-        print(f"\n🎯 SUCCESS: Scraped {len(all_results)} services across all topics and subtopics.")
-        print("📁 Saved to all_services_output.csv!")
+def discover_with_browser(location):
+    """
+    discover_taxonomy on a browser started just for it. Passed to
+    load_or_build_plan, so Chrome only starts when the plan is rebuilt.
+    """
+    driver = make_driver()
+    try:
+        return discover_taxonomy(driver, location)
     finally:
         driver.quit()
 
+def parse_workers(argv, default=CRAWL_WORKERS):
+    """Read '--workers N' or '--workers=N' from the command line"""
+    for i, arg in enumerate(argv):
+        if arg.startswith("--workers="):
+            return int(arg.split("=", 1)[1])
+        if arg == "--workers" and i + 1 < len(argv):
+            return int(argv[i + 1])
+    return default
+
+# ---------- Main Function ----------
+
+def main():
+    workers = parse_workers(sys.argv)
+
+    # Walk the taxonomy (and start a browser) only when the cached plan is missing or expired
+    plan = load_or_build_plan(discover_with_browser, location="Toronto", refresh="--refresh-plan" in sys.argv)
+
+    jobs = list(iter_jobs(plan))
+    print(f"[INFO] Crawl plan has {len(jobs)} subtopics across {len(plan['topics'])} topics.")
+
+    # Each worker opens listings directly instead of replaying the search UI
+    all_results, failures = run_pool(jobs, make_driver, scrape_listing, workers=workers)
+
+    df = pd.DataFrame(all_results, columns=["service_name", "service_url", "Topic", "Subtopic"])
+    df.to_csv(CATALOG_CSV, index=False)
+    write_catalog(all_results)
+    with ServiceStore() as store:
+        store.add_memberships(all_results)
+    print(f"\n🎯 SUCCESS: Scraped {len(all_results)} services across all topics and subtopics.")
+    print(f"📁 Saved to {CATALOG_CSV}!")
+    recorder.print_summary()
+    fetch_stats.print_summary()
+    metrics.export()
+
 if __name__ == "__main__":
     main()
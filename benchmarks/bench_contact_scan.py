@@ -0,0 +1,96 @@
+"""
+Micro-benchmark: single-pass contact scanner vs the old multi-pass regexes.
+
+Usage: python benchmarks/bench_contact_scan.py [file_or_dir ...]
+Defaults to every file in service_data/.
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from contact_scan import scan_contacts
+
+# Configuration
+DEFAULT_INPUTS = ["service_data"]
+REPEAT = 200
+EMAIL_DOMAINS = ["protectchildren.ca", "missingkids.ca", "cybertip.ca", "needhelpnow.ca"]
+
+# ---------- Previous Implementation ----------
+
+def legacy_scan(page_source):
+    """The per-field regex passes extract_initiative_details used to run"""
+    contact = {'phone': '', 'email': '', 'emergency': ''}
+
+    email_pattern = r'\b[A-Za-z0-9._%+-]+@(?:protectchildren|missingkids|cybertip|needhelpnow)\.ca\b'
+    emails = [e for e in re.findall(email_pattern, page_source) if not re.match(r'^[a-f0-9]{32}@', e)]
+    if emails:
+        contact['email'] = emails[0]
+
+    phone_patterns = [
+        r'1-(?:\d{3}[-.)]\s*)+\d{4}',
+        r'(?:\(\d{3}\)|\d{3})[-.\s]\d{3}[-.\s]\d{4}',
+        r'\b\d{3}[-.\s]\d{3}[-.\s]\d{4}\b'
+    ]
+    for pattern in phone_patterns:
+        phones = re.findall(pattern, page_source)
+        if phones:
+            contact['phone'] = phones[0]
+            break
+
+    for pattern in (
+        r'(?:24/7|emergency|crisis).*?(?:\d{3}[-.\s]\d{3}[-.\s]\d{4}|\(\d{3}\)[.\s]\d{3}[-.\s]\d{4}|1-\d{3}[-.\s]\d{3}[-.\s]\d{4})',
+        r'toll[- ]free.*?(?:\d{3}[-.\s]\d{3}[-.\s]\d{4}|\(\d{3}\)[.\s]\d{3}[-.\s]\d{4}|1-\d{3}[-.\s]\d{3}[-.\s]\d{4})',
+    ):
+        matches = re.findall(pattern, page_source, re.I | re.S)
+        if matches:
+            contact['emergency'] = matches[0].strip()
+            break
+    return contact
+
+# ---------- Benchmark ----------
+
+def load_pages(paths):
+    pages = []
+    for path in paths:
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for file_path in files:
+            if os.path.isfile(file_path):
+                with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+                    pages.append((file_path, f.read()))
+    return pages
+
+def time_it(fn, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, text in pages:
+            fn(text)
+    return time.perf_counter() - start
+
+def main():
+    pages = load_pages(sys.argv[1:] or DEFAULT_INPUTS)
+    if not pages:
+        print("[ERROR] No pages found to benchmark")
+        return
+    total_bytes = sum(len(text) for _, text in pages)
+    print(f"[INFO] {len(pages)} pages, {total_bytes / 1024:.0f} KB, {REPEAT} repetitions")
+
+    mismatches = 0
+    for path, text in pages:
+        old = legacy_scan(text)
+        new = scan_contacts(text, email_domains=EMAIL_DOMAINS)
+        for field in ('phone', 'email', 'emergency'):
+            if old[field] != new[field]:
+                mismatches += 1
+                print(f"[WARNING] {os.path.basename(path)}: {field} differs: {old[field][:60]!r} vs {new[field][:60]!r}")
+
+    legacy = time_it(legacy_scan, pages, REPEAT)
+    single = time_it(lambda text: scan_contacts(text, email_domains=EMAIL_DOMAINS), pages, REPEAT)
+    pages_run = len(pages) * REPEAT
+    print(f"  multi-pass:  {legacy * 1000 / pages_run:.3f} ms/page")
+    print(f"  single-pass: {single * 1000 / pages_run:.3f} ms/page ({legacy / single:.1f}x)")
+    print(f"  field mismatches: {mismatches}")
+
+if __name__ == "__main__":
+    main()
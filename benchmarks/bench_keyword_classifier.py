@@ -0,0 +1,50 @@
+"""
+Benchmark: label the whole service catalog with the topic classifier,
+against the per-category "any(kw in text)" loop it replaces.
+
+Usage: python benchmarks/bench_keyword_classifier.py [catalog_csv]
+"""
+import csv
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from keyword_classifier import TOPIC_KEYWORDS_PATH, KeywordClassifier
+
+# Configuration
+DEFAULT_CATALOG = "all_services_output.csv"
+
+def naive_classify(categories, text):
+    text = text.lower()
+    return [label for label, keywords in categories.items() if any(kw in text for kw in keywords)]
+
+def main():
+    catalog = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CATALOG
+    with open(catalog, newline="", encoding="utf-8") as f:
+        texts = [f"{row['service_name']} {row.get('Subtopic', '')}" for row in csv.DictReader(f)]
+    with open(TOPIC_KEYWORDS_PATH, "r", encoding="utf-8") as f:
+        categories = {label: [kw.lower() for kw in keywords] for label, keywords in json.load(f).items()}
+
+    start = time.perf_counter()
+    classifier = KeywordClassifier(categories)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels = [classifier.classify(text) for text in texts]
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [naive_classify(categories, text) for text in texts]
+    naive = time.perf_counter() - start
+
+    print(f"[INFO] {len(texts)} catalog rows, {len(categories)} topics, "
+          f"{sum(len(k) for k in categories.values())} keywords, {len(classifier.goto)} automaton states")
+    print(f"  build automaton: {build * 1000:.1f} ms")
+    print(f"  automaton:       {single * 1000:.1f} ms")
+    print(f"  any(kw in text): {naive * 1000:.1f} ms")
+    print(f"  label mismatches: {sum(a != b for a, b in zip(labels, expected))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Benchmark: run the crawlers end to end against the local replay site
+(benchmarks/replay_site.py) instead of 211ontario.ca.
+
+Usage: python benchmarks/bench_replay.py [catalog_csv] [--services N] [--latency S]
+           [--jitter S] [--llm-latency S] [--workers N] [--recordings DIR] [--selenium] [--json PATH]
+
+Phases, each in a fresh process inside one scratch directory, so the HTTP,
+LLM and journal caches start cold and the real ones are left alone:
+  crawl      the all.py flow: crawl plan -> browser pool -> scrape_listing -> catalog CSV
+  scrape     ServiceScraper.process_services over the crawled catalog; the
+             DeepSeek calls are answered by the replay site after --llm-latency
+  extractor  ServiceContentExtractor.process_single_service (Selenium only, so
+             it runs with --selenium and a local Chrome)
+Without --selenium a listing that needs the browser fallback fails its job
+instead of starting Chrome. For each phase the report gives pages/sec,
+latency percentiles per stage and the process's peak RSS. The LLM client's
+rate budgets are lifted (LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE) so
+the numbers measure the scraper rather than the configured throttle.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from replay_site import ReplaySite
+
+# Configuration
+DEFAULT_CATALOG = os.path.join(ROOT, "all_services_output.csv")
+DEFAULT_SERVICES = 300     # Services replayed; 0 for the whole catalog
+PERCENTILES = (50, 90, 99)
+UNTHROTTLED = "1000000000"
+
+# ---------- Stage Timing ----------
+
+class StageTimes:
+    """Thread-safe latency samples per stage"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, stage, seconds):
+        with self.lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def timed(self, stage, fn):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def timed_async(self, stage, fn):
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def summary(self):
+        """{stage: {"count", "p50", "p90", "p99", "max"}} in milliseconds"""
+        out = {}
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            stats = {"count": len(ordered), "max": ordered[-1] * 1000}
+            for p in PERCENTILES:
+                stats[f"p{p}"] = ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000
+            out[stage] = stats
+        return out
+
+def instrument(times):
+    """
+    Wrap the fetch, clean and LLM entry points the crawlers call. Each is
+    patched where it is looked up: fast_fetch's own functions call
+    fetch_html through the module, the scrapers imported clean_page_text by name.
+    """
+    import fast_fetch
+    import provider_fetch
+    import services_url
+    from llm_client import LLMClient
+
+    fetch_html = fast_fetch.fetch_html
+    def timed_fetch_html(url, *args, **kwargs):
+        stage = "listing_page" if "/results/" in url else "detail_page"
+        return times.timed(stage, fetch_html)(url, *args, **kwargs)
+    fast_fetch.fetch_html = timed_fetch_html
+
+    # Provider pages are fetched and cleaned inside _fetch_one
+    provider_fetch._fetch_one = times.timed_async("provider_page", provider_fetch._fetch_one)
+    provider_fetch.clean_page_text = times.timed("clean", provider_fetch.clean_page_text)
+    services_url.clean_page_text = times.timed("clean", services_url.clean_page_text)
+    LLMClient.complete = times.timed("llm", LLMClient.complete)
+
+def _no_browser():
+    raise RuntimeError("listing needs the Selenium fallback; re-run with --selenium")
+
+# ---------- Phases ----------
+
+def run_phase(phase, workdir, site_info, options, results):
+    os.environ["LLM_REQUESTS_PER_MINUTE"] = UNTHROTTLED
+    os.environ["LLM_TOKENS_PER_MINUTE"] = UNTHROTTLED
+    os.chdir(workdir)
+    times = StageTimes()
+    instrument(times)
+    from catalog_store import CATALOG_CSV
+
+    start = time.perf_counter()
+    detail = {}
+    if phase == "crawl":
+        import pandas as pd
+        import all as crawler
+        from crawl_plan import make_plan, iter_jobs
+        from crawl_pool import run_pool
+        plan = make_plan("Toronto", site_info["taxonomy"])
+        make_driver = crawler.make_driver if options["selenium"] else _no_browser
+        rows, failures = run_pool(iter_jobs(plan), make_driver, crawler.scrape_listing, workers=options["workers"])
+        pd.DataFrame(rows, columns=["service_name", "service_url", "Topic", "Subtopic"]).to_csv(CATALOG_CSV, index=False)
+        detail = {"rows": len(rows), "failed_jobs": len(failures)}
+    elif phase == "scrape":
+        from services_url import ServiceScraper
+        from journal import completed_ids
+        scraper = ServiceScraper()
+        scraper.llm_client.url = site_info["llm_url"]
+        scraper.process_services(CATALOG_CSV, resume=False)
+        detail = {"extracted": len(completed_ids())}
+    elif phase == "extractor":
+        from service_url_mini import ServiceContentExtractor
+        ServiceContentExtractor().process_single_service(CATALOG_CSV)
+    elapsed = time.perf_counter() - start
+
+    results[phase] = {
+        "seconds": elapsed,
+        "stages": times.summary(),
+        # ru_maxrss is in KB on Linux and bytes on macOS
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+        **detail,
+    }
+
+def print_report(results):
+    for phase, r in results.items():
+        pages = sum(n for kind, n in r["served"].items() if kind != "llm")
+        print(f"\n  {phase}: {r['seconds']:.1f}s, {pages} pages ({pages / r['seconds']:.1f} pages/sec), "
+              f"{r['served'].get('llm', 0)} LLM calls, peak RSS {r['peak_rss_mb']:.0f} MB")
+        extra = {k: v for k, v in r.items() if k not in ("seconds", "stages", "peak_rss_mb", "served")}
+        if extra:
+            print("    " + ", ".join(f"{k}={v}" for k, v in extra.items()))
+        for stage, s in sorted(r["stages"].items()):
+            print(f"    {stage:13s} n={s['count']:6d}  " +
+                  "  ".join(f"p{p} {s[f'p{p}']:8.1f} ms" for p in PERCENTILES) + f"  max {s['max']:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay benchmark for the 211 crawlers")
+    parser.add_argument("catalog", nargs="?", default=DEFAULT_CATALOG)
+    parser.add_argument("--services", type=int, default=DEFAULT_SERVICES)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every page")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra random seconds, up to this much")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per LLM completion")
+    parser.add_argument("--workers", type=int, default=4, help="crawl pool workers")
+    parser.add_argument("--recordings", help="http_cache directory with recorded detail and provider pages")
+    parser.add_argument("--selenium", action="store_true", help="allow browser fallbacks and run the extractor phase")
+    parser.add_argument("--json", help="also write the results here")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+
+    phases = ["crawl", "scrape"] + (["extractor"] if args.selenium else [])
+    workdir = tempfile.mkdtemp(prefix="snm_replay_")
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Manager().dict()
+    report = {}
+    with ReplaySite(args.catalog, limit=args.services or None, cache_dir=args.recordings, latency=args.latency,
+                    jitter=args.jitter, llm_latency=args.llm_latency) as site:
+        print(f"[INFO] Replaying {len(site.services)} services across {len(site.topics)} topics at {site.base_url} "
+              f"(latency {args.latency * 1000:.0f} ms + up to {args.jitter * 1000:.0f} ms, "
+              f"LLM {args.llm_latency * 1000:.0f} ms)")
+        site_info = {"taxonomy": site.taxonomy(), "llm_url": f"{site.base_url}/v1/chat/completions"}
+        options = {"workers": args.workers, "selenium": args.selenium}
+        for phase in phases:
+            print(f"[INFO] Phase '{phase}'...")
+            site.reset_counts()
+            process = ctx.Process(target=run_phase, args=(phase, workdir, site_info, options, results))
+            process.start()
+            process.join()
+            if phase not in results:
+                print(f"[ERROR] Phase '{phase}' failed; later phases depend on it")
+                break
+            report[phase] = {**results[phase], "served": site.reset_counts()}
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"options": vars(args), "phases": report}, f, indent=2)
+        print(f"\n[INFO] Results saved to {args.json}")
+    if args.keep:
+        print(f"[INFO] Scratch directory kept at {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
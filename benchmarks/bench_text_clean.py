@@ -0,0 +1,99 @@
+"""
+Benchmark: lxml streaming cleaner vs the BeautifulSoup cleaner on recorded pages.
+
+Usage: python benchmarks/bench_text_clean.py [file_or_dir ...]
+Defaults to the provider pages benchmarks/replay_site.py serves for the
+catalog: recorded ones where the HTTP cache (http_cache/) has them,
+generated ones otherwise, so it runs on a fresh checkout.
+Each implementation runs in a fresh process so peak memory is comparable:
+"heap" is the tracemalloc peak of Python allocations, "rss" the process
+high-water mark, which also counts libxml2's own buffers.
+"""
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from replay_site import ReplaySite
+
+# Configuration
+DEFAULT_CATALOG = os.path.join(ROOT, "all_services_output.csv")
+DEFAULT_RECORDINGS = os.path.join(ROOT, "http_cache")
+DEFAULT_SERVICES = 300     # Replayed provider pages when no paths are given
+REPEAT = 3
+
+def replay_pages(catalog_csv=DEFAULT_CATALOG, limit=DEFAULT_SERVICES, recordings=DEFAULT_RECORDINGS):
+    """The provider pages the replay site serves for the catalog, as bench_replay uses them"""
+    site = ReplaySite(catalog_csv, limit=limit, cache_dir=recordings if os.path.isdir(recordings) else None)
+    return [site.provider_page(sid) for sid in site.services]
+
+def load_pages(paths):
+    if not paths:
+        return replay_pages()
+    pages = []
+    for path in paths:
+        if os.path.isfile(path):
+            files = [path]
+        else:
+            files = [os.path.join(d, name) for d, _, names in os.walk(path) for name in sorted(names)]
+        for file_path in files:
+            if file_path.endswith(".tmp"):
+                continue
+            with open(file_path, "rb") as f:
+                pages.append(f.read().decode("utf-8", errors="replace"))
+    return pages
+
+def run(implementation, paths, results):
+    import text_clean
+    clean = text_clean.clean_page_text if implementation == "lxml" else text_clean.clean_page_text_bs4
+    pages = load_pages(paths)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        outputs = [clean(html) for html in pages]
+    elapsed = time.perf_counter() - start
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    results[implementation] = {
+        "pages_per_sec": len(pages) * REPEAT / elapsed,
+        "heap_peak_mb": heap_peak / 1024 / 1024,
+        "rss_growth_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+        "outputs": outputs,
+    }
+
+def main():
+    paths = sys.argv[1:]
+    pages = load_pages(paths)
+    if not pages:
+        print(f"[ERROR] No pages found in {paths}")
+        return
+    print(f"[INFO] {len(pages)} pages, {sum(len(p) for p in pages) / 1024 / 1024:.1f} MB of HTML, {REPEAT} repetitions")
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Manager().dict()
+    for implementation in ("bs4", "lxml"):
+        process = ctx.Process(target=run, args=(implementation, paths, results))
+        process.start()
+        process.join()
+        if implementation not in results:
+            print(f"[ERROR] {implementation} run failed")
+            return
+
+    for implementation in ("bs4", "lxml"):
+        r = results[implementation]
+        print(f"  {implementation:5s} {r['pages_per_sec']:8.1f} pages/sec   "
+              f"heap peak {r['heap_peak_mb']:6.1f} MB   rss growth {r['rss_growth_mb']:6.1f} MB")
+    print(f"  speedup: {results['lxml']['pages_per_sec'] / results['bs4']['pages_per_sec']:.1f}x")
+    mismatches = sum(a != b for a, b in zip(results["bs4"]["outputs"], results["lxml"]["outputs"]))
+    print(f"  pages with different text: {mismatches}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Local stand-in for 211ontario.ca and the provider websites, for offline benchmarks.
+
+The site is built from a catalog CSV (all_services_output.csv): the search page
+lists its topics, topic pages list subtopics with "View Resources" buttons,
+listings are paginated like the real site, and every service has a
+/service/<id>/<slug>/ detail page linking to its provider website. Pages are
+served with the markup the crawlers' selectors expect. When an HTTP cache
+directory is given, recorded 211 detail bodies and provider pages are
+replayed from it in place of the generated ones.
+
+Provider sites are spread over several extra ports so per-host connection
+limits behave as they do against many real hosts. An OpenAI-style
+/v1/chat/completions endpoint answers LLM calls with a fixed extraction,
+as server-sent events when the request asks for a stream.
+Every response is delayed by 'latency' seconds (plus up to 'jitter').
+"""
+import csv
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from service_ids import service_id, canonical_service_url
+
+# Configuration
+PAGE_SIZE = 10             # Services per listing page, as on 211ontario.ca
+PROVIDER_HOSTS = 32        # Ports the provider sites are spread over
+PROVIDER_PARAGRAPHS = 40   # Body paragraphs on a generated provider page
+LOCATION = "Toronto"
+
+PROVIDER_LINK_PATTERN = re.compile(r'(<a[^>]*target="_blank"[^>]*href=")([^"]+)(")|(<a[^>]*href=")([^"]+)("[^>]*target="_blank")')
+
+COMPLETION = {
+    "services": {"main_programs": ["Counselling"], "description": "Replay benchmark service", "special_services": []},
+    "eligibility": {"requirements": ["Not specified"], "restrictions": [], "documentation_needed": []},
+    "location": {"address": "Not specified", "service_area": LOCATION, "accessibility": "Not specified"},
+    "contact": {"phone": "416-555-0100", "email": "info@example.org", "website": "", "social_media": []},
+    "hours": {"regular_hours": "Mon-Fri 9-5", "special_hours": "Not specified", "holidays": "Not specified"},
+    "costs": {"fee_structure": "Free", "payment_methods": [], "financial_assistance": "Not specified"},
+    "application": {"process": ["Call"], "required_documents": [], "waiting_period": "Not specified"},
+    "languages": {"service_languages": ["English"], "translation_available": "Not specified"},
+}
+
+def _page(title, body):
+    return (f"<!DOCTYPE html><html><head><title>{escape(title)}</title></head><body>"
+            f"<nav id='site-nav-lt'><a href='/'>Home</a> <a href='/search/'>Search</a></nav>"
+            f"<div id='cookie-banner'>We use cookies.</div>{body}"
+            f"<footer>211 Ontario replay site</footer></body></html>")
+
+# ---------- Content ----------
+
+class ReplaySite:
+    """
+    Pages for one catalog. Topics and subtopics keep their catalog order and
+    each listing holds its services in crawl order, so a full crawl of the
+    replay site yields the same rows as the catalog (with local URLs).
+    """
+    def __init__(self, catalog_csv, limit=None, cache_dir=None, latency=0.05, jitter=0.0,
+                 llm_latency=0.5, provider_hosts=PROVIDER_HOSTS, page_size=PAGE_SIZE):
+        self.latency = latency
+        self.jitter = jitter
+        self.llm_latency = llm_latency
+        self.page_size = page_size
+        self.provider_hosts = provider_hosts
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.servers = []
+        self.base_url = None
+        self.provider_urls = []
+
+        self.topics = {}    # topic -> {subtopic: [service_id, ...]}
+        self.services = {}  # service_id -> {"name", "slug"}
+        with open(catalog_csv, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                sid = service_id(row.get("service_url"))
+                if not sid:
+                    continue
+                if limit and sid not in self.services and len(self.services) >= limit:
+                    continue
+                slug = urlparse(canonical_service_url(row["service_url"])).path.rstrip("/").rsplit("/", 1)[-1]
+                self.services.setdefault(sid, {"name": row["service_name"], "slug": slug})
+                listing = self.topics.setdefault(row["Topic"], {}).setdefault(row["Subtopic"], [])
+                if sid not in listing:
+                    listing.append(sid)
+        self.position = {sid: n for n, sid in enumerate(self.services)}
+        self.recorded_details, self.recorded_providers = self._load_recordings(cache_dir) if cache_dir else ({}, {})
+
+    def _load_recordings(self, cache_dir):
+        """Recorded 211 detail bodies and provider pages from an http_cache directory, by service ID"""
+        index = os.path.join(cache_dir, "index.sqlite")
+        if not os.path.exists(index):
+            print(f"[WARNING] No HTTP cache index at {index}; serving generated pages only")
+            return {}, {}
+        db = sqlite3.connect(index)
+        bodies = {}
+        for url, body_hash, encoding in db.execute("SELECT url, body_hash, encoding FROM entries"):
+            path = os.path.join(cache_dir, "objects", body_hash[:2], body_hash)
+            if os.path.exists(path):
+                bodies[url] = (path, encoding or "utf-8")
+        db.close()
+
+        def read(entry):
+            with open(entry[0], "rb") as f:
+                return f.read().decode(entry[1], errors="replace")
+
+        details, providers = {}, {}
+        for url, entry in bodies.items():
+            sid = service_id(url) if "211ontario.ca" in url else None
+            if sid in self.services:
+                html = read(entry)
+                details[sid] = html
+                for match in PROVIDER_LINK_PATTERN.finditer(html):
+                    provider_url = match.group(2) or match.group(5)
+                    if provider_url in bodies:
+                        providers[sid] = read(bodies[provider_url])
+                    break
+        print(f"[INFO] Replaying {len(details)} recorded detail pages and {len(providers)} provider pages")
+        return details, providers
+
+    # ----- URLs -----
+
+    def listing_url(self, topic_index, subtopic_index, page=1):
+        return f"{self.base_url}/results/?searchLocation={LOCATION}&topicPath={topic_index}-{subtopic_index}&page={page}"
+
+    def service_url(self, sid, topic_path):
+        return (f"{self.base_url}/service/{sid}/{self.services[sid]['slug']}/"
+                f"?searchLocation={LOCATION}&topicPath={topic_path}&sd=25&ss=Distance")
+
+    def provider_url(self, sid):
+        return f"{self.provider_urls[self.position[sid] % len(self.provider_urls)]}/site/{sid}/"
+
+    def taxonomy(self):
+        """[(topic, [(subtopic, listing_url), ...]), ...] in the shape crawl_plan.make_plan takes"""
+        return [
+            (topic, [(subtopic, self.listing_url(i, j)) for j, subtopic in enumerate(subtopics)])
+            for i, (topic, subtopics) in enumerate(self.topics.items())
+        ]
+
+    # ----- Pages -----
+
+    def search_page(self):
+        links = "".join(f"<a class='topic' href='/topic/{i}/'>{escape(topic)}</a>" for i, topic in enumerate(self.topics))
+        return _page("Search", f"<input id='searchLocation' value=''><div class='topics'>{links}</div>")
+
+    def topic_page(self, i):
+        topic, subtopics = list(self.topics.items())[i]
+        blocks = "".join(
+            f"<div class='subtopic'><div class='subtopic-heading'>{escape(subtopic)}</div>"
+            f"<a class='red-button' href='{escape(self.listing_url(i, j))}'>View Resources</a></div>"
+            for j, subtopic in enumerate(subtopics)
+        )
+        return _page(topic, blocks)
+
+    def listing_page(self, i, j, page):
+        topic, subtopics = list(self.topics.items())[i]
+        sids = list(subtopics.values())[j]
+        start = (page - 1) * self.page_size
+        rows = "".join(
+            f"<div class='title'><a href='{escape(self.service_url(sid, f'{i}-{j}'))}'>"
+            f"{escape(self.services[sid]['name'])}</a></div>"
+            for sid in sids[start:start + self.page_size]
+        )
+        pager = ""
+        if start + self.page_size < len(sids):
+            pager = f"<a href='{escape(self.listing_url(i, j, page + 1))}'><span aria-label='Next Page'>Next</span></a>"
+        return _page(topic, f"<div class='results'>{rows}</div><div class='pager'>{pager}</div>")
+
+    def detail_page(self, sid):
+        recorded = self.recorded_details.get(sid)
+        if recorded is not None:
+            # Point the recorded provider link at the local provider site
+            provider = self.provider_url(sid)
+            return PROVIDER_LINK_PATTERN.sub(
+                lambda m: (m.group(1) + provider + m.group(3)) if m.group(1) else (m.group(4) + provider + m.group(6)),
+                recorded, count=1)
+        name = escape(self.services[sid]["name"])
+        return _page(name, (
+            f"<div class='record-detail-content'><h1>{name}</h1>"
+            f"<p>{name} offers programs for residents of {LOCATION}. Call 416-555-{int(sid) % 10000:04d}.</p>"
+            f"<a target='_blank' href='{escape(self.provider_url(sid))}'>Website</a></div>"
+        ))
+
+    def provider_page(self, sid):
+        recorded = self.recorded_providers.get(sid)
+        if recorded is not None:
+            return recorded
+        name = escape(self.services[sid]["name"])
+        rng = random.Random(int(sid))
+        paragraphs = "".join(
+            f"<p>{name} program {n}: {' '.join(rng.choice(WORDS) for _ in range(60))}.</p>"
+            for n in range(PROVIDER_PARAGRAPHS)
+        )
+        menu = "".join(f"<li><a href='/{word}'>{word}</a></li>" for word in WORDS[:12])
+        return _page(name, (
+            f"<header><ul class='menu'>{menu}</ul></header>"
+            f"<main><h1>{name}</h1>{paragraphs}"
+            f"<p>Phone: (416) 555-{int(sid) % 10000:04d} Email: info@{self.services[sid]['slug'][:20]}.example.org</p>"
+            f"<p>Hours: Monday to Friday 9:00 am - 5:00 pm</p></main>"
+            f"<footer><p>Copyright {name}. Privacy policy. Terms of use. Accessibility.</p></footer>"
+        ))
+
+    def completion(self, request):
+        """Chat-completion response with the fixed extraction and token usage"""
+        prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+        content = json.dumps(COMPLETION, indent=2)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return {"choices": [{"message": {"role": "assistant", "content": content}}], "usage": usage}
+
+    def completion_events(self, request, piece_chars=16):
+        """The same completion as a server-sent-events stream, usage in the last event"""
+        response = self.completion(request)
+        content = response["choices"][0]["message"]["content"]
+        events = [
+            {"choices": [{"index": 0, "delta": {"content": content[i:i + piece_chars]}}]}
+            for i in range(0, len(content), piece_chars)
+        ]
+        events.append({"choices": [], "usage": response["usage"]})
+        return "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+
+    def route(self, method, url, body):
+        """(page kind, status, content type, text) for one request"""
+        parsed = urlparse(url)
+        parts = [p for p in parsed.path.split("/") if p]
+        query = parse_qs(parsed.query)
+        if method == "POST" and parsed.path == "/v1/chat/completions":
+            request = json.loads(body or b"{}")
+            if request.get("stream"):
+                return "llm", 200, "text/event-stream", self.completion_events(request)
+            return "llm", 200, "application/json", json.dumps(self.completion(request))
+        if parsed.path.startswith("/search"):
+            return "search", 200, "text/html", self.search_page()
+        if len(parts) == 2 and parts[0] == "topic" and parts[1].isdigit() and int(parts[1]) < len(self.topics):
+            return "topic", 200, "text/html", self.topic_page(int(parts[1]))
+        if parts[:1] == ["results"] and "topicPath" in query:
+            i, j = (int(x) for x in query["topicPath"][0].split("-"))
+            return "listing", 200, "text/html", self.listing_page(i, j, int(query.get("page", ["1"])[0]))
+        if len(parts) >= 2 and parts[0] == "service" and parts[1] in self.services:
+            return "detail", 200, "text/html", self.detail_page(parts[1])
+        if len(parts) >= 2 and parts[0] == "site" and parts[1] in self.services:
+            return "provider", 200, "text/html", self.provider_page(parts[1])
+        return "missing", 404, "text/plain", "Not found"
+
+    # ----- Server -----
+
+    def count(self, kind):
+        with self.lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def reset_counts(self):
+        with self.lock:
+            counts, self.counts = self.counts, {}
+        return counts
+
+    def start(self):
+        """Serve the 211 pages and the provider sites on free loopback ports"""
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real servers
+            disable_nagle_algorithm = True  # Headers and body go out as separate writes
+
+            def _serve(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                kind, status, content_type, text = site.route(method, self.path, body)
+                delay = site.llm_latency if kind == "llm" else site.latency
+                time.sleep(delay + random.uniform(0, site.jitter))
+                data = text.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                site.count(kind)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, *args):
+                pass
+
+        for _ in range(1 + self.provider_hosts):
+            server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers.append(server)
+        urls = [f"http://127.0.0.1:{server.server_address[1]}" for server in self.servers]
+        self.base_url, self.provider_urls = urls[0], urls[1:] or urls[:1]
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+WORDS = ("support counselling family youth housing shelter food newcomer seniors community health "
+         "mental program referral appointment eligibility language free drop-in clinic legal "
+         "employment training crisis abuse children parents workshop volunteer donation outreach").split()
+
+def main():
+    # python benchmarks/replay_site.py [catalog_csv] -> serve the replay site until interrupted
+    catalog = sys.argv[1] if len(sys.argv) > 1 else "all_services_output.csv"
+    with ReplaySite(catalog, latency=0) as site:
+        print(f"[INFO] {len(site.services)} services across {len(site.topics)} topics")
+        print(f"[INFO] Search page: {site.base_url}/search/")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import csv
+import os
+import sys
+import time
+from urllib.parse import urlparse
+from service_ids import service_id, canonical_service_url, dedupe_services
+
+# Configuration
+CATALOG_CSV = "all_services_output.csv"
+CATALOG_STORE = "all_services_output.arrow"
+CSV_COLUMNS = ["service_name", "service_url", "Topic", "Subtopic"]
+
+# Columns with few distinct values are stored once in a dictionary and referenced by int32 index
+DICTIONARY_COLUMNS = ("service_name", "canonical_url", "search_query", "Topic", "Subtopic")
+
+def store_path(catalog_csv=CATALOG_CSV):
+    """The columnar store kept next to a catalog CSV: all_services_output.csv -> all_services_output.arrow"""
+    return os.path.splitext(catalog_csv)[0] + ".arrow"
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401  (submodule is not imported by 'import pyarrow')
+        return pyarrow
+    except ImportError:
+        return None
+
+# ---------- Writing ----------
+
+def _split_url(url):
+    """(numeric service ID or None, canonical URL, per-search query string)"""
+    if not isinstance(url, str) or not url:
+        return None, None, None
+    sid = service_id(url)
+    return (int(sid) if sid else None), canonical_service_url(url), urlparse(url).query or None
+
+def _text(value):
+    return value if isinstance(value, str) else None  # pandas rows carry NaN for empty cells
+
+def catalog_table(rows):
+    """
+    Topic rows (dicts with service_name, service_url, Topic, Subtopic) as an
+    Arrow table. The service URL is split into the numeric service ID, the
+    canonical page URL and the search query string, which is identical for
+    every row of a crawl; text columns are dictionary-encoded.
+    """
+    pa = _pyarrow()
+    columns = {name: [] for name in ("service_id",) + DICTIONARY_COLUMNS}
+    for row in rows:
+        sid, url, query = _split_url(row.get("service_url"))
+        columns["service_id"].append(sid)
+        columns["service_name"].append(_text(row.get("service_name")))
+        columns["canonical_url"].append(url)
+        columns["search_query"].append(query)
+        columns["Topic"].append(_text(row.get("Topic")))
+        columns["Subtopic"].append(_text(row.get("Subtopic")))
+    arrays = {"service_id": pa.array(columns["service_id"], type=pa.int64())}
+    for name in DICTIONARY_COLUMNS:
+        arrays[name] = pa.array(columns[name], type=pa.string()).dictionary_encode()
+    return pa.table(arrays)
+
+def write_catalog(rows, path=CATALOG_STORE):
+    """
+    Write topic rows to the columnar store as an uncompressed Arrow IPC file,
+    which load_table() memory-maps without copying. Returns False when
+    pyarrow is not installed; the CSV stays the canonical output then.
+    """
+    pa = _pyarrow()
+    if pa is None:
+        print("[INFO] pyarrow not installed; skipping the columnar catalog store")
+        return False
+    table = catalog_table(rows)
+    # Replace atomically so a reader with the old file mapped is never handed a partial one
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+    print(f"[INFO] Catalog store saved to {path} ({table.num_rows} rows, {os.path.getsize(path) / 1024:.0f} KB)")
+    return True
+
+def save_rows(rows, catalog_csv=CATALOG_CSV):
+    """Replace the catalog CSV (atomically) and its columnar store with freshly crawled topic rows"""
+    tmp_path = f"{catalog_csv}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, catalog_csv)
+    write_catalog(rows, store_path(catalog_csv))
+
+# ---------- Reading ----------
+
+def load_table(path=CATALOG_STORE):
+    """Memory-map the store; columns are read from the page cache only when touched"""
+    pa = _pyarrow()
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+def _column(table, name):
+    # Decoding per dictionary entry instead of per row keeps repeated strings shared
+    column = table.column(name).combine_chunks()
+    values = column.dictionary.to_pylist()
+    return [None if i is None else values[i] for i in column.indices.to_pylist()]
+
+def table_rows(table):
+    """Topic rows in the CSV schema, with the original service URLs rebuilt"""
+    urls = _column(table, "canonical_url")
+    queries = _column(table, "search_query")
+    names = _column(table, "service_name")
+    topics = _column(table, "Topic")
+    subtopics = _column(table, "Subtopic")
+    return [
+        {
+            "service_name": name,
+            "service_url": f"{url}?{query}" if url and query else url,
+            "Topic": topic,
+            "Subtopic": subtopic,
+        }
+        for name, url, query, topic, subtopic in zip(names, urls, queries, topics, subtopics)
+    ]
+
+def table_services(table):
+    """
+    The same records as service_ids.dedupe_services, built from the stored
+    ID and canonical URL columns without re-parsing any URL.
+    """
+    ids = table.column("service_id").to_pylist()
+    urls = _column(table, "canonical_url")
+    names = _column(table, "service_name")
+    topics = _column(table, "Topic")
+    subtopics = _column(table, "Subtopic")
+    services = {}
+    for sid, url, name, topic, subtopic in zip(ids, urls, names, topics, subtopics):
+        key = str(sid) if sid is not None else url
+        if not key:
+            continue
+        record = services.get(key)
+        if record is None:
+            record = services[key] = {"service_id": key, "service_name": name, "service_url": url, "topics": []}
+        membership = (topic, subtopic)
+        if membership not in record["topics"]:
+            record["topics"].append(membership)
+    return list(services.values())
+
+def _use_store(catalog_csv):
+    """True when the store exists, pyarrow can read it and it is not older than the CSV"""
+    path = store_path(catalog_csv)
+    if _pyarrow() is None or not os.path.exists(path):
+        return False
+    return not os.path.exists(catalog_csv) or os.path.getmtime(path) >= os.path.getmtime(catalog_csv)
+
+def load_rows(catalog_csv=CATALOG_CSV):
+    """Topic rows from the columnar store when it is current, otherwise from the CSV"""
+    if _use_store(catalog_csv):
+        return table_rows(load_table(store_path(catalog_csv)))
+    with open(catalog_csv, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def load_services(catalog_csv=CATALOG_CSV):
+    """Deduplicated services from the columnar store when it is current, otherwise from the CSV"""
+    if _use_store(catalog_csv):
+        return table_services(load_table(store_path(catalog_csv)))
+    return dedupe_services(load_rows(catalog_csv))
+
+def export_csv(path=CATALOG_STORE, catalog_csv=CATALOG_CSV):
+    """Write the store back out as the four-column CSV older tools expect"""
+    with open(catalog_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(table_rows(load_table(path)))
+    print(f"[INFO] Catalog exported to {catalog_csv}")
+
+def main():
+    # python catalog_store.py [catalog_csv]          -> build the store from the CSV
+    # python catalog_store.py --export [catalog_csv] -> rewrite the CSV from the store
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    catalog_csv = args[0] if args else CATALOG_CSV
+    if "--export" in sys.argv:
+        export_csv(store_path(catalog_csv), catalog_csv)
+        return
+
+    with open(catalog_csv, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    if not write_catalog(rows, store_path(catalog_csv)):
+        return
+
+    start = time.perf_counter()
+    services = table_services(load_table(store_path(catalog_csv)))
+    print(f"[INFO] Loaded {len(services)} services from the store in {(time.perf_counter() - start) * 1000:.1f} ms")
+    start = time.perf_counter()
+    with open(catalog_csv, newline="", encoding="utf-8") as f:
+        dedupe_services(csv.DictReader(f))
+    print(f"[INFO] Same from the CSV: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
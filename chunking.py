@@ -0,0 +1,176 @@
+from collections import Counter, defaultdict
+from urllib.parse import urlparse
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Configuration
+CHARS_PER_TOKEN = 4              # Fallback estimate when tiktoken isn't installed
+BOILERPLATE_MIN_PAGES = 2        # A line must appear on at least this many pages of a site...
+BOILERPLATE_MIN_FRACTION = 0.5   # ...and on at least this fraction of them to count as boilerplate
+MISSING_VALUES = {None, "", "Not specified", "not specified", "N/A", "null"}
+
+# ---------- Token Counting ----------
+
+_encodings = {}
+_warned_estimate = False
+
+def _encoding_for(model):
+    global _warned_estimate
+    if tiktoken is None:
+        if not _warned_estimate:
+            print(f"[INFO] tiktoken not installed; estimating tokens as {CHARS_PER_TOKEN} characters each")
+            _warned_estimate = True
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Unknown to tiktoken (e.g. deepseek-chat); cl100k is a close enough proxy for budgeting
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """Count tokens for 'model', using tiktoken when available and a character estimate otherwise"""
+    if not text:
+        return 0
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+# ---------- Boilerplate Stripping ----------
+
+def dedupe_lines(text):
+    """Drop repeated lines within one page, keeping the first occurrence"""
+    seen = set()
+    lines = []
+    for line in text.splitlines():
+        if line not in seen:
+            seen.add(line)
+            lines.append(line)
+    return "\n".join(lines)
+
+def strip_site_boilerplate(pages):
+    """
+    Remove navigation menus, cookie notices and footers from cleaned page texts.
+    'pages' maps url -> text (or None). Pages are grouped by host, and any line
+    that repeats across enough pages of the same host is dropped from all of them.
+    Returns a new dict with the same keys.
+    """
+    by_host = defaultdict(list)
+    for url, text in pages.items():
+        if text:
+            by_host[urlparse(url).netloc.lower()].append(url)
+
+    stripped = dict(pages)
+    for host, urls in by_host.items():
+        if len(urls) < BOILERPLATE_MIN_PAGES:
+            for url in urls:
+                stripped[url] = dedupe_lines(pages[url])
+            continue
+
+        line_pages = Counter()
+        for url in urls:
+            line_pages.update(set(pages[url].splitlines()))
+        threshold = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_MIN_FRACTION * len(urls))
+        boilerplate = {line for line, n in line_pages.items() if n >= threshold}
+
+        for url in urls:
+            kept = [line for line in dedupe_lines(pages[url]).splitlines() if line not in boilerplate]
+            # Never strip a page down to nothing; fall back to its de-duplicated text
+            stripped[url] = "\n".join(kept) if kept else dedupe_lines(pages[url])
+    return stripped
+
+# ---------- Chunking ----------
+
+def chunk_text(text, max_tokens, model="gpt-3.5-turbo"):
+    """
+    Split text into chunks of at most 'max_tokens' tokens, breaking on line
+    boundaries (and on words for a single oversized line). Nothing is dropped.
+    """
+    if not text:
+        return []
+    if count_tokens(text, model) <= max_tokens:
+        return [text]
+
+    chunks = []
+    current, current_tokens = [], 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("\n".join(current))
+        current, current_tokens = [], 0
+
+    for line in text.splitlines():
+        line_tokens = count_tokens(line, model) + 1
+        if line_tokens > max_tokens:
+            flush()
+            words, part = line.split(), []
+            for word in words:
+                if part and count_tokens(" ".join(part + [word]), model) > max_tokens:
+                    chunks.append(" ".join(part))
+                    part = []
+                part.append(word)
+            if part:
+                current, current_tokens = [" ".join(part)], count_tokens(" ".join(part), model)
+            continue
+        if current_tokens + line_tokens > max_tokens:
+            flush()
+        current.append(line)
+        current_tokens += line_tokens
+    flush()
+    return chunks
+
+def chunk_cache_texts(label, chunks, source_text=None):
+    """
+    LLM cache keys for the chunks of one page, prefixed with 'label' (e.g. the
+    service name) when given. With 'source_text', the page's own text before
+    boilerplate shared with other pages was stripped, the keys depend only on
+    the page and not on which pages were stripped together.
+    """
+    head = f"{label}\n" if label else ""
+    if source_text is None:
+        return [head + chunk for chunk in chunks]
+    if len(chunks) == 1:
+        return [head + source_text]
+    return [f"{head}{source_text}\n[chunk {i + 1}/{len(chunks)}]" for i in range(len(chunks))]
+
+# ---------- Merging ----------
+
+def merge_extractions(results):
+    """
+    Merge structured extractions from several chunks of one page.
+    Nested dicts merge key by key, lists are unioned in order, and for
+    scalars the first real value wins over placeholders like "Not specified".
+    """
+    merged = None
+    for result in results:
+        merged = _merge(merged, result)
+    return merged if merged is not None else {}
+
+def _is_missing(value):
+    return not isinstance(value, (dict, list)) and value in MISSING_VALUES
+
+def _merge(a, b):
+    if _is_missing(a):
+        return b
+    if _is_missing(b):
+        return a
+    if isinstance(a, dict) and isinstance(b, dict):
+        out = dict(a)
+        for key, value in b.items():
+            out[key] = _merge(out.get(key), value)
+        return out
+    if isinstance(a, list) or isinstance(b, list):
+        a_list = a if isinstance(a, list) else [a]
+        b_list = b if isinstance(b, list) else [b]
+        out = list(a_list)
+        for item in b_list:
+            if item not in out and not _is_missing(item):
+                out.append(item)
+        return out
+    return a
@@ -0,0 +1,101 @@
+import re
+
+# Configuration
+HASHED_EMAIL = re.compile(r'^[a-f0-9]{32}@')   # Obfuscated addresses some sites render instead of the real one
+EMAIL_LOCAL_PART = re.compile(r'[a-z0-9._%+-]{1,64}$', re.I)
+
+_DAY = r'(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?'
+_TIME = r'\d{1,2}(?::\d{2})?\s*(?:a\.?m\.?|p\.?m\.?)'
+_RANGE = r'\s*(?:-|–|to)\s*'
+
+# (kind, leading character class, rest of the token). Every alternative starts
+# with a plain character class outside its group, which lets the regex engine
+# reject an alternative after one character comparison; with several named
+# groups at the front it would enter each group at every position instead.
+# Alternatives that can start at the same position are ordered by priority:
+# toll-free numbers before plain ones (so '1-800-...' keeps its prefix).
+CONTACT_TOKENS = [
+    ("email", "@", r'[a-z0-9.-]+\.[a-z]{2,}\b'),       # Local part is recovered backwards from the '@'
+    ("tollfree_phone", "1", r'-(?:\d{3}[-.)]\s*)+\d{4}'),
+    ("phone", r"[(\d]", r'(?:(?<=\()\d{3}\)|(?<=\d)\d{2})[-.\s]\d{3}[-.\s]\d{4}'),
+    ("hours", "[mtwfs]", r'(?<![a-z].)(?:on|ue|ed|hu|ri|at|un)[a-z]*\.?(?:' + _RANGE + _DAY + r')?,?\s*' + _TIME + _RANGE + _TIME),
+    ("all_day", "2", r'4\s*hours\s*a\s*day(?:,\s*7\s*days\s*a\s*week)?'),
+    ("always_open", "2", r'4/7'),
+    ("alert", "[ec]", r'(?<=e)mergency|(?<=c)risis'),
+    ("tollfree", "t", r'oll[- ]free'),
+]
+
+_SOURCE = "|".join(f"{lead}(?P<{kind}>{rest})" for kind, lead, rest in CONTACT_TOKENS)
+CONTACT_PATTERN = re.compile(_SOURCE)                   # Run over lowercased text
+CONTACT_PATTERN_IGNORECASE = re.compile(_SOURCE, re.I)  # Only when lowercasing changes the text length
+
+def _unique(values):
+    seen = set()
+    return [v for v in values if not (v in seen or seen.add(v))]
+
+def scan_contacts(text, email_domains=None):
+    """
+    Pull phones, emails, an emergency line and opening hours out of 'text'
+    (usually raw page source) in a single pass of CONTACT_PATTERN.
+
+    The emergency line is the span from the first '24/7' / 'emergency' /
+    'crisis' keyword to the next phone number after it, falling back to the
+    span from the first 'toll-free' to the next number. 'email_domains'
+    restricts emails to those domains (and their subdomains).
+
+    Returns {"phones", "emails", "phone", "email", "emergency", "hours"};
+    the single-value fields are '' when nothing was found.
+    """
+    text = text or ''
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        matches = CONTACT_PATTERN.finditer(lowered)
+    else:
+        matches = CONTACT_PATTERN_IGNORECASE.finditer(text)  # Keeps match offsets valid for 'text'
+
+    domains = tuple(d.lower() for d in email_domains) if email_domains else None
+    tollfree_phones, phones, emails, hours = [], [], [], []
+    alert_start = tollfree_start = None
+    emergency = tollfree_line = ''
+    always_open = False
+
+    for match in matches:
+        kind = match.lastgroup
+        start, end = match.span()
+        if kind == 'email':
+            local = EMAIL_LOCAL_PART.search(text, max(0, start - 64), start)
+            domain = text[start + 1:end].lower()
+            if not local or local.group().startswith('.'):
+                continue
+            email = local.group() + text[start:end]
+            if HASHED_EMAIL.match(email):
+                continue
+            if domains and not any(domain == d or domain.endswith('.' + d) for d in domains):
+                continue
+            emails.append(email)
+        elif kind in ('tollfree_phone', 'phone'):
+            (tollfree_phones if kind == 'tollfree_phone' else phones).append(text[start:end])
+            if not emergency and alert_start is not None:
+                emergency = text[alert_start:end]
+            if not tollfree_line and tollfree_start is not None:
+                tollfree_line = text[tollfree_start:end]
+        elif kind in ('hours', 'all_day'):
+            hours.append(text[start:end])
+        elif kind in ('alert', 'always_open'):
+            if alert_start is None:
+                alert_start = start
+            always_open = always_open or kind == 'always_open'
+        elif kind == 'tollfree' and tollfree_start is None:
+            tollfree_start = start
+
+    phones = _unique(tollfree_phones + phones)  # Toll-free numbers are preferred as the main line
+    emails = _unique(emails)
+    hours = _unique(hours)
+    return {
+        'phones': phones,
+        'emails': emails,
+        'phone': phones[0] if phones else '',
+        'email': emails[0] if emails else '',
+        'emergency': (emergency or tollfree_line).strip(),
+        'hours': hours[0] if hours else ('24/7' if always_open else ''),
+    }
@@ -0,0 +1,93 @@
+import json
+import os
+from datetime import datetime, timedelta
+from urllib.parse import urlparse, parse_qs
+
+# Configuration
+PLAN_FILE = "crawl_plan.json"
+PLAN_TTL_HOURS = 24 * 7  # Re-discover the 211 taxonomy once a week
+
+# ---------- Helper Functions ----------
+
+def topic_path_from_url(url):
+    """Return the topicPath query parameter of a 211 results URL, or None"""
+    if not url:
+        return None
+    values = parse_qs(urlparse(url).query).get("topicPath")
+    return values[0] if values else None
+
+def plan_is_fresh(plan, location, ttl_hours=PLAN_TTL_HOURS):
+    """Check that a cached plan matches the location and has not expired"""
+    if not plan or plan.get("location") != location:
+        return False
+    try:
+        created_at = datetime.fromisoformat(plan["created_at"])
+    except (KeyError, ValueError):
+        return False
+    return datetime.now() - created_at < timedelta(hours=ttl_hours)
+
+def load_plan(path=PLAN_FILE):
+    """Load a cached crawl plan, or None if missing/unreadable"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARNING] Could not read crawl plan {path}: {e}")
+        return None
+
+def save_plan(plan, path=PLAN_FILE):
+    """Write the crawl plan atomically so an interrupted save never corrupts the cache"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(plan, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    print(f"[INFO] Crawl plan saved to {path}")
+
+def make_plan(location, topics):
+    """
+    Build a plan dict from discovered topics.
+    'topics' is a list of (topic_name, [(subtopic_name, result_url), ...]).
+    """
+    return {
+        "location": location,
+        "created_at": datetime.now().isoformat(),
+        "topics": [
+            {
+                "topic": topic_name,
+                "subtopics": [
+                    {
+                        "subtopic": subtopic_name,
+                        "topic_path": topic_path_from_url(result_url),
+                        "result_url": result_url,
+                    }
+                    for subtopic_name, result_url in subtopics
+                ],
+            }
+            for topic_name, subtopics in topics
+        ],
+    }
+
+def load_or_build_plan(discover, location="Toronto", path=PLAN_FILE, ttl_hours=PLAN_TTL_HOURS, refresh=False):
+    """
+    Return the cached crawl plan for 'location', calling discover(location) to
+    walk the taxonomy again only when the cache is missing, stale or 'refresh' is set.
+    discover must return the 'topics' list accepted by make_plan.
+    """
+    plan = None if refresh else load_plan(path)
+    if plan_is_fresh(plan, location, ttl_hours):
+        print(f"[INFO] Using cached crawl plan from {plan['created_at']}")
+        return plan
+
+    print("[INFO] Discovering topic/subtopic taxonomy...")
+    plan = make_plan(location, discover(location))
+    save_plan(plan, path)
+    return plan
+
+def iter_jobs(plan):
+    """Yield (topic, subtopic, result_url) for every subtopic in plan order"""
+    for topic in plan.get("topics", []):
+        for sub in topic.get("subtopics", []):
+            if sub.get("result_url"):
+                yield topic["topic"], sub["subtopic"], sub["result_url"]
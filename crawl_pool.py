@@ -0,0 +1,106 @@
+import os
+import queue
+import threading
+import time
+from metrics import span, tags
+
+# Configuration
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", min(4, os.cpu_count() or 1)))
+JOB_RETRIES = 3           # Attempts per (topic, subtopic) job before giving up
+RETRY_BACKOFF = 2         # Seconds, multiplied by the attempt number
+
+# ---------- Worker ----------
+
+def _worker(worker_id, jobs, results, failures, make_driver, scrape, retries):
+    """
+    Pulls (index, topic, subtopic, url) jobs off the shared queue with its own
+    browser. The browser is only started the first time scrape() asks for it.
+    A failed job is retried by the same worker on a fresh browser, since most
+    failures are a crashed or wedged Chrome session.
+    """
+    driver = None
+
+    def get_driver():
+        nonlocal driver
+        if driver is None:
+            driver = make_driver()
+        return driver
+
+    try:
+        while True:
+            try:
+                index, topic_name, subtopic_name, url = jobs.get_nowait()
+            except queue.Empty:
+                return
+
+            for attempt in range(1, retries + 1):
+                try:
+                    print(f"[INFO] Worker {worker_id}: {topic_name} / {subtopic_name} (attempt {attempt})")
+                    with tags(topic=topic_name), span("listing", trace_id=f"{topic_name} / {subtopic_name}",
+                                                      attempt=attempt, url=url) as listing_span:
+                        services = scrape(get_driver, url)
+                        listing_span["attributes"]["services"] = len(services)
+                    for s in services:
+                        s["Topic"] = topic_name
+                        s["Subtopic"] = subtopic_name
+                    results[index] = services
+                    break
+                except Exception as e:
+                    print(f"[ERROR] Worker {worker_id}: attempt {attempt} for '{subtopic_name}' failed: {e}")
+                    if driver is not None:
+                        try:
+                            driver.quit()
+                        except Exception:
+                            pass
+                        driver = None
+                    if attempt == retries:
+                        failures.append((topic_name, subtopic_name, url, str(e)))
+                    else:
+                        time.sleep(RETRY_BACKOFF * attempt)
+    finally:
+        if driver is not None:
+            driver.quit()
+
+# ---------- Pool ----------
+
+def run_pool(jobs, make_driver, scrape, workers=CRAWL_WORKERS, retries=JOB_RETRIES):
+    """
+    Scrapes (topic, subtopic, url) jobs with 'workers' browsers in parallel.
+    make_driver() returns a new WebDriver; scrape(get_driver, url) returns a list
+    of service dicts and calls get_driver() only if it needs a browser. Results
+    are merged in job order, so the output is identical to a serial crawl no
+    matter which worker finished first.
+    Returns (services, failures).
+    """
+    job_queue = queue.Queue()
+    job_list = list(jobs)
+    for index, (topic_name, subtopic_name, url) in enumerate(job_list):
+        job_queue.put((index, topic_name, subtopic_name, url))
+
+    results = {}
+    failures = []
+    workers = max(1, min(workers, len(job_list)))
+    print(f"[INFO] Crawling {len(job_list)} subtopics with {workers} browser(s)...")
+
+    threads = [
+        threading.Thread(
+            target=_worker,
+            args=(i + 1, job_queue, results, failures, make_driver, scrape, retries),
+            daemon=True,
+        )
+        for i in range(workers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    services = []
+    for index in range(len(job_list)):
+        services.extend(results.get(index, []))
+
+    if failures:
+        print(f"[WARNING] {len(failures)} subtopic(s) failed after {retries} attempts:")
+        for topic_name, subtopic_name, url, error in failures:
+            print(f"  {topic_name} / {subtopic_name}: {error}")
+    return services, failures
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import sys
+import time
+import zlib
+import numpy as np
+from matcher import CATALOG_CSV, catalog_documents, tokenize
+from journal import JOURNAL_PATH
+
+# Configuration
+INDEX_DIR = "embedding_index"
+HASH_DIM = 2 ** 15          # Hashed TF-IDF feature space
+EMBEDDING_DIM = 128         # SVD components kept per service
+OVERSAMPLE = 16             # Extra random directions for the randomized SVD
+POWER_ITERATIONS = 2
+CHAR_NGRAMS = (3, 4, 5)     # Sub-word features so 'bullied' and 'bullying' overlap
+CHAR_NGRAM_WEIGHT = 0.5
+NPROBE = 8                  # IVF lists scanned per query
+KMEANS_ITERATIONS = 10
+REFIT_FRACTION = 0.2        # Refit the SVD when more than this share of services is new or changed
+SEED = 13
+
+# ---------- Features ----------
+
+def _bucket(feature):
+    # crc32 rather than hash(): Python's string hash changes between processes
+    return zlib.crc32(feature.encode("utf-8")) % HASH_DIM
+
+def text_features(text):
+    """Sparse hashed term frequencies as (indexes, values) arrays: words plus character n-grams"""
+    counts = {}
+    for token in tokenize(text):
+        bucket = _bucket("w:" + token)
+        counts[bucket] = counts.get(bucket, 0.0) + 1.0
+        padded = f"<{token}>"
+        for n in CHAR_NGRAMS:
+            for i in range(len(padded) - n + 1):
+                bucket = _bucket(padded[i:i + n])
+                counts[bucket] = counts.get(bucket, 0.0) + CHAR_NGRAM_WEIGHT
+    indexes = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    return indexes, np.log1p(values)  # Sublinear tf
+
+def document_text(fields):
+    return "\n".join(text for text in fields.values() if text)
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# ---------- Fitting ----------
+
+def _sparse_times(rows, dense):
+    """X @ dense for sparse rows [(indexes, values)]"""
+    out = np.zeros((len(rows), dense.shape[1]), dtype=np.float32)
+    for i, (indexes, values) in enumerate(rows):
+        out[i] = values @ dense[indexes]
+    return out
+
+def _sparse_t_times(rows, dense):
+    """X.T @ dense for sparse rows [(indexes, values)]"""
+    out = np.zeros((HASH_DIM, dense.shape[1]), dtype=np.float32)
+    for i, (indexes, values) in enumerate(rows):
+        out[indexes] += np.outer(values, dense[i])  # Indexes are unique within a row
+    return out
+
+def fit_components(rows, dim):
+    """
+    Top right-singular vectors of the sparse TF-IDF matrix by randomized SVD
+    (range finder with power iterations), never materializing X densely.
+    Returns a (HASH_DIM, dim) projection matrix.
+    """
+    rng = np.random.default_rng(SEED)
+    width = min(dim + OVERSAMPLE, len(rows))
+    sample = _sparse_times(rows, rng.standard_normal((HASH_DIM, width)).astype(np.float32))
+    for _ in range(POWER_ITERATIONS):
+        sample, _ = np.linalg.qr(sample)
+        sample = _sparse_times(rows, _sparse_t_times(rows, sample))
+    basis, _ = np.linalg.qr(sample)
+    projected = _sparse_t_times(rows, basis)  # X.T @ Q, i.e. B.T
+    components, _, _ = np.linalg.svd(projected, full_matrices=False)
+    return np.ascontiguousarray(components[:, :dim], dtype=np.float32)
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+def kmeans(vectors, lists):
+    """Spherical k-means centroids for the IVF coarse quantizer"""
+    rng = np.random.default_rng(SEED)
+    centroids = vectors[rng.choice(len(vectors), size=lists, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(lists):
+            members = vectors[assignment == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+    return centroids.astype(np.float32)
+
+# ---------- Index ----------
+
+class EmbeddingIndex:
+    """
+    Semantic service search on CPU: hashed TF-IDF vectors reduced by SVD to
+    EMBEDDING_DIM dimensions, with an IVF (inverted file) index on top.
+
+    Vectors are stored grouped by IVF list in one .npy file, so each list is
+    a contiguous slice; the file is memory-mapped on load and a query reads
+    only the NPROBE lists nearest to it.
+    """
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = index_dir
+        path = lambda name: os.path.join(index_dir, name)
+        with open(path("meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.services = meta["services"]           # In vector order: {service_id, service_name, service_url, hash}
+        self.vectors = np.load(path("vectors.npy"), mmap_mode="r")
+        self.components = np.load(path("components.npy"), mmap_mode="r")
+        self.idf = np.load(path("idf.npy"))
+        self.centroids = np.load(path("centroids.npy"))
+        self.offsets = np.load(path("offsets.npy"))  # List c is vectors[offsets[c]:offsets[c + 1]]
+
+    def embed(self, text):
+        """Unit-length embedding of a query or document"""
+        indexes, values = text_features(text)
+        vector = (values * self.idf[indexes]) @ self.components[indexes] if len(indexes) else \
+            np.zeros(self.components.shape[1], dtype=np.float32)
+        return _normalize(vector.astype(np.float32))
+
+    def search(self, text, top_k=10, nprobe=NPROBE):
+        """Services most similar to 'text' as dicts with service_id, service_name, service_url and score"""
+        query = self.embed(text)
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        slices = [(int(self.offsets[c]), int(self.offsets[c + 1])) for c in probe]
+        positions = np.concatenate([np.arange(start, end) for start, end in slices])
+        if not len(positions):
+            return []
+        scores = np.concatenate([self.vectors[start:end] @ query for start, end in slices])
+        results = []
+        for i in np.argsort(-scores)[:top_k]:
+            service = self.services[positions[i]]
+            results.append({"service_id": service["service_id"], "service_name": service["service_name"],
+                            "service_url": service["service_url"], "score": float(scores[i])})
+        return results
+
+def _previous_model(index_dir):
+    """(model arrays, {service_id: (hash, vector)}) from an existing index, or (None, {})"""
+    try:
+        previous = EmbeddingIndex(index_dir)
+    except (OSError, ValueError, KeyError):
+        return None, {}
+    if previous.components.shape[0] != HASH_DIM:
+        return None, {}  # Feature space changed; the old vectors can't be reused
+    vectors = {s["service_id"]: (s["hash"], previous.vectors[i]) for i, s in enumerate(previous.services)}
+    model = {"components": np.asarray(previous.components), "idf": previous.idf, "centroids": previous.centroids}
+    return model, vectors
+
+def build_index(services, fields, index_dir=INDEX_DIR, refit=False):
+    """
+    Build or incrementally update the index for 'services' (with their
+    matcher fields). Services whose text is unchanged keep their stored
+    vectors; new and changed ones are embedded with the existing model. The
+    SVD, IDF and IVF centroids are refit only on the first build, when
+    'refit' is set, or when more than REFIT_FRACTION of the catalog changed.
+    """
+    start = time.perf_counter()
+    texts = [document_text(f) for f in fields]
+    hashes = [content_hash(t) for t in texts]
+    model, previous = _previous_model(index_dir)
+
+    stale = [i for i, s in enumerate(services)
+             if s["service_id"] not in previous or previous[s["service_id"]][0] != hashes[i]]
+    if model is None or refit or len(stale) > REFIT_FRACTION * len(services):
+        print(f"[INFO] Fitting embedding model on {len(services)} services")
+        rows = [text_features(t) for t in texts]
+        df = np.zeros(HASH_DIM, dtype=np.float32)
+        for indexes, _ in rows:
+            df[indexes] += 1
+        idf = (np.log((1 + len(rows)) / (1 + df)) + 1).astype(np.float32)
+        rows = [(indexes, values * idf[indexes]) for indexes, values in rows]
+        rows = [(indexes, values / max(float(np.linalg.norm(values)), 1e-12)) for indexes, values in rows]
+        components = fit_components(rows, min(EMBEDDING_DIM, max(1, len(rows) - 1)))
+        vectors = _normalize(_sparse_times(rows, components))
+        centroids = kmeans(vectors, max(1, int(np.sqrt(len(vectors)))))
+        reused = 0
+    else:
+        components, idf, centroids = model["components"], model["idf"], model["centroids"]
+        vectors = np.zeros((len(services), components.shape[1]), dtype=np.float32)
+        stale_set = set(stale)
+        for i, service in enumerate(services):
+            if i not in stale_set:
+                vectors[i] = previous[service["service_id"]][1]
+        for i in stale:
+            indexes, values = text_features(texts[i])
+            vectors[i] = (values * idf[indexes]) @ components[indexes] if len(indexes) else 0.0
+        if stale:
+            vectors[stale] = _normalize(vectors[stale])
+        reused = len(services) - len(stale)
+
+    # Group vectors by nearest centroid so every IVF list is a contiguous slice
+    assignment = np.argmax(vectors @ centroids.T, axis=1)
+    order = np.argsort(assignment, kind="stable")
+    offsets = np.searchsorted(assignment[order], np.arange(len(centroids) + 1))
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = lambda name: os.path.join(index_dir, name)
+    for name, array in (("vectors.npy", vectors[order]), ("components.npy", components), ("idf.npy", idf),
+                        ("centroids.npy", centroids), ("offsets.npy", offsets)):
+        with open(path(name + ".tmp"), "wb") as f:
+            np.save(f, array)
+        os.replace(path(name + ".tmp"), path(name))
+    meta = {
+        "embedding_dim": int(components.shape[1]),
+        "hash_dim": HASH_DIM,
+        "services": [{"service_id": services[i]["service_id"], "service_name": services[i]["service_name"],
+                      "service_url": services[i]["service_url"], "hash": hashes[i]} for i in order],
+    }
+    with open(path("meta.json.tmp"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(path("meta.json.tmp"), path("meta.json"))
+    print(f"[INFO] Embedding index: {len(services)} services ({reused} reused, {len(services) - reused} embedded), "
+          f"{len(centroids)} IVF lists, built in {time.perf_counter() - start:.1f}s")
+
+def main():
+    if "--search" in sys.argv:
+        query = " ".join(sys.argv[sys.argv.index("--search") + 1:])
+        index = EmbeddingIndex()
+        start = time.perf_counter()
+        results = index.search(query)
+        print(f"[INFO] '{query}' answered in {(time.perf_counter() - start) * 1000:.1f} ms")
+        for rank, result in enumerate(results, 1):
+            print(f"{rank:2d}. {result['score']:.3f}  {result['service_name']}  ({result['service_url']})")
+        return
+    services, fields = catalog_documents(CATALOG_CSV, JOURNAL_PATH)
+    build_index(services, fields, refit="--refit" in sys.argv)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import contextvars
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from chunking import MISSING_VALUES
+from llm_client import LLMClient, LLM_CONCURRENCY, parse_json_content
+from metrics import ENSEMBLE_VOTES, JSON_PARSE_FAILURES, span, tracer
+
+# Configuration
+# Comma-separated provider:model pairs, in priority order (ties go to the earlier model).
+# Fewer than two disables the ensemble and the single-model path is used.
+ENSEMBLE_MODELS = os.getenv("ENSEMBLE_MODELS", "")
+# Agreeing models needed to settle a field; defaults to a majority of the ensemble
+ENSEMBLE_QUORUM = int(os.getenv("ENSEMBLE_QUORUM", 0))
+
+PHONE_PATTERN = re.compile(r"^[\d\s().+\-]{7,}$")
+
+# ---------- Helper Functions ----------
+
+def parse_models(spec):
+    """'deepseek:deepseek-chat,openai:gpt-4o-mini' -> [("deepseek", "deepseek-chat"), ("openai", "gpt-4o-mini")]"""
+    models = []
+    for item in (spec or "").split(","):
+        provider, _, model = item.strip().partition(":")
+        if provider and model:
+            models.append((provider, model))
+    return models
+
+def flatten(data, prefix=""):
+    """Nested extraction -> {"contact.phone": ..., "hours.regular_hours": ...}; lists stay whole"""
+    if not isinstance(data, dict):
+        return {prefix: data} if prefix else {}
+    fields = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, dict) and value:
+            fields.update(flatten(value, path))
+        else:
+            fields[path] = value
+    return fields
+
+def unflatten(fields):
+    data = {}
+    for path, value in fields.items():
+        *parents, leaf = path.split(".")
+        node = data
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = value
+    return data
+
+def normalize(value):
+    """
+    Voting key for a scalar: placeholders like "Not specified" become None,
+    text is case- and whitespace-folded, phone numbers reduced to their digits.
+    """
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    if value in MISSING_VALUES:
+        return None
+    text = " ".join(str(value).split()).casefold().strip(" .,;:")
+    if PHONE_PATTERN.match(text):
+        digits = re.sub(r"\D", "", text)
+        return digits[-10:] if len(digits) >= 10 else digits
+    return text
+
+# ---------- Voting ----------
+
+def _vote_scalar(answers, quorum):
+    """
+    answers: [(member index, value)] in priority order -> (value, agreeing members, (votes, runner-up votes)).
+    Placeholders don't vote; they are returned only when no model gave a real
+    value, and then with no votes, so a field is never settled on them.
+    """
+    groups = {}
+    for member, value in answers:
+        groups.setdefault(normalize(value), []).append((member, value))
+    missing = groups.pop(None, None)
+    if not groups:
+        return missing[0][1], [member for member, _ in missing], (0, 0)
+    # Most votes wins; on a tie the group holding the highest-priority model
+    ranked = sorted(groups.values(), key=lambda g: (-len(g), g[0][0]))
+    winner = ranked[0]
+    runner_up = len(ranked[1]) if len(ranked) > 1 else 0
+    return winner[0][1], [member for member, _ in winner], (len(winner), runner_up)
+
+def _vote_list(answers, quorum):
+    """Lists are voted per item; items named by a quorum of the answering models are kept"""
+    needed = min(quorum, len(answers))
+    support, first_seen = {}, {}
+    for member, value in answers:
+        items = value if isinstance(value, list) else ([] if normalize(value) is None else [value])
+        for item in items:
+            key = normalize(item)
+            if key is None:
+                continue
+            support.setdefault(key, set()).add(member)
+            first_seen.setdefault(key, item)
+    kept = [key for key in first_seen if len(support[key]) >= needed]
+    if not kept:
+        # No item has enough support: fall back to the highest-priority answer that names any
+        named = [(member, value) for member, value in answers if normalize(value) not in (None, "[]")]
+        member, value = (named or answers)[0]
+        return value, [member], (1, 0)
+    agreeing = sorted(set.intersection(*(support[key] for key in kept)))
+    return [first_seen[key] for key in kept], agreeing, (len(agreeing), 0)
+
+def vote(answers, quorum, pending=0):
+    """
+    Vote each field across model answers.
+    answers: [(member index, flattened extraction)] in priority order.
+    Returns ({path: value}, {path: (agreeing members, settled)}); a field is
+    settled once a quorum agrees, or when the models still pending could not
+    overturn the leader.
+    """
+    paths = []
+    for _, fields in answers:
+        paths += [path for path in fields if path not in paths]
+    values, outcome = {}, {}
+    for path in paths:
+        field_answers = [(member, fields.get(path)) for member, fields in answers]
+        is_list = any(isinstance(value, list) for _, value in field_answers)
+        value, agreeing, (top, runner_up) = (_vote_list if is_list else _vote_scalar)(field_answers, quorum)
+        if is_list:
+            settled = len(answers) >= quorum or pending == 0
+        else:
+            settled = top >= quorum or top > runner_up + pending
+        values[path] = value
+        outcome[path] = (agreeing, settled)
+    return values, outcome
+
+def merge_voted(results):
+    """
+    Merge (extraction, confidence) pairs from several chunks of one page.
+    For each field the first chunk with a real value supplies both the value
+    and its confidence, matching how chunking.merge_extractions merges scalars.
+    """
+    fields, confidence = {}, {}
+    for data, field_confidence in results:
+        for path, value in flatten(data).items():
+            if path not in fields or (normalize(fields[path]) is None and normalize(value) is not None):
+                fields[path] = value
+                if path in field_confidence:
+                    confidence[path] = field_confidence[path]
+    return unflatten(fields), confidence
+
+# ---------- Ensemble ----------
+
+class ModelEnsemble:
+    """
+    Sends one extraction prompt to several models at once and votes field by
+    field. extract() returns as soon as every field is settled, without
+    waiting for slower models; their calls finish in the background and are
+    still cached. Field confidence is the share of answering models that
+    agree with the chosen value. 'schema' (field names or a JSON skeleton)
+    decides which answers are complete enough to cache.
+    """
+    def __init__(self, models, template, version, cache, schema, clients=None, quorum=ENSEMBLE_QUORUM):
+        self.models = models
+        self.template = template
+        self.version = version
+        self.cache = cache
+        self.schema = schema
+        self.quorum = quorum or len(models) // 2 + 1
+        self.clients = dict(clients or {})
+        for provider, _ in models:
+            if provider not in self.clients:
+                self.clients[provider] = LLMClient(provider)
+        # Separate from the clients' own pools: callers run extract() on those threads
+        self.executor = ThreadPoolExecutor(max_workers=len(models) * LLM_CONCURRENCY)
+
+    @classmethod
+    def from_env(cls, template, version, cache, schema, clients=None, spec=ENSEMBLE_MODELS):
+        """The ensemble configured by ENSEMBLE_MODELS, or None when fewer than two models are listed"""
+        models = parse_models(spec)
+        if len(models) < 2:
+            return None
+        print(f"[INFO] Extraction ensemble: {', '.join(f'{p}:{m}' for p, m in models)}")
+        return cls(models, template, version, cache, schema, clients)
+
+    def name(self, member):
+        return "{}:{}".format(*self.models[member])
+
+    def _ask(self, member, messages, cache_text, temperature, max_tokens):
+        """One member's answer as a flattened extraction, or None if the call or the JSON failed"""
+        provider, model = self.models[member]
+        content = self.cache.get(model, temperature, self.template, self.version, cache_text)
+        if content is not None:
+            data = parse_json_content(content)
+        else:
+            # Streamed and repaired if cut off; fields that never closed simply vote as missing
+            parser = self.clients[provider].complete_json(messages, model, temperature, max_tokens)
+            data = parser.result()
+            # Cache only whole answers, so a partial one is asked again next run
+            if isinstance(data, dict) and not parser.missing(self.schema):
+                self.cache.put(model, temperature, self.template, self.version, cache_text, parser.text)
+        if not isinstance(data, dict):
+            JSON_PARSE_FAILURES.inc(source=self.template)
+            return None
+        return flatten(data)
+
+    def extract(self, messages, cache_text, temperature=0, max_tokens=None):
+        """
+        Returns (extraction, confidence) where confidence maps each dotted field
+        path to {"confidence", "votes", "models"}, or ({}, {}) if no model answered.
+        """
+        with span("ensemble_vote", source=self.template):
+            futures = {}
+            for member in range(len(self.models)):
+                # Copy the context so the members' LLM spans nest under this one
+                future = self.executor.submit(contextvars.copy_context().run, self._ask, member,
+                                              messages, cache_text, temperature, max_tokens)
+                futures[future] = member
+
+            answers, asked = [], len(futures)
+            values, outcome = {}, {}
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        fields = future.result()
+                    except Exception as e:
+                        print(f"[WARNING] {self.name(futures[future])} failed in the {self.template} ensemble: {e}")
+                        fields = None
+                    if fields is not None:
+                        answers.append((futures[future], fields))
+                if not answers:
+                    continue
+                answers.sort(key=lambda answer: answer[0])
+                values, outcome = vote(answers, self.quorum, len(pending))
+                if pending and all(settled for _, settled in outcome.values()):
+                    break
+            for future in pending:
+                future.cancel()  # Only stops members that have not started; running calls complete and are cached
+
+            exit_kind = "early" if pending else ("complete" if answers else "failed")
+            ENSEMBLE_VOTES.inc(source=self.template, exit=exit_kind)
+            tracer.annotate(asked=asked, answered=len(answers), exit=exit_kind)
+            confidence = {
+                path: {
+                    "confidence": round(len(agreeing) / len(answers), 3),
+                    "votes": f"{len(agreeing)}/{len(answers)}",
+                    "models": [self.name(member) for member in agreeing],
+                }
+                for path, (agreeing, _) in outcome.items()
+            }
+            return unflatten(values), confidence
@@ -0,0 +1,213 @@
+import re
+import threading
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup
+from http_cache import cached_get
+from metrics import FETCHED_BYTES, HTTP_RESPONSES, PAGE_LOAD_SECONDS, domain_of
+
+try:
+    import lxml  # noqa: F401  (C-backed parser for BeautifulSoup)
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+# Configuration
+POOL_SIZE = 16             # Keep-alive connections per host
+REQUEST_TIMEOUT = 15       # Seconds
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+MAX_PAGES = 200            # Safety stop for runaway pagination
+
+# Selectors mirroring the Selenium locators in all.py / services_url.py
+RESULT_SELECTOR = ".title"
+NEXT_PAGE_SELECTOR = "span[aria-label='Next Page']"
+DETAIL_RECORD_SELECTOR = ".record-detail-content"
+PROVIDER_LINK_SELECTOR = ".record-detail-content a[target='_blank']"
+
+# Where a detail page can carry the service's own location. The latitude/longitude
+# in 211 URLs are the search origin, not the service, so query strings are not used.
+COORDINATE_PATTERNS = [
+    # schema.org GeoCoordinates in JSON-LD
+    re.compile(r'"latitude"\s*:\s*"?(-?\d{1,3}\.\d+)"?\s*,\s*"longitude"\s*:\s*"?(-?\d{1,3}\.\d+)'),
+    # Map widgets: data-lat="..." data-lng="..."
+    re.compile(r'data-lat(?:itude)?="(-?\d{1,3}\.\d+)"[^>]*?data-(?:lng|lon|longitude)="(-?\d{1,3}\.\d+)"'),
+    # Map links: ...maps?q=43.6,-79.4 / &ll=... / &destination=...
+    re.compile(r'maps[^"\'\s]*?[?&](?:q|ll|query|destination)=(-?\d{1,3}\.\d+)(?:,|%2C)\s*(-?\d{1,3}\.\d+)'),
+]
+
+# ---------- Fetch Statistics ----------
+
+class FetchStats:
+    """Counts how many pages of each kind were served by HTTP vs. the Selenium fallback"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}  # kind -> {"http": n, "selenium": n}
+
+    def record(self, kind, path):
+        with self.lock:
+            self.counts.setdefault(kind, {"http": 0, "selenium": 0})[path] += 1
+
+    def hit_rate(self, kind):
+        c = self.counts.get(kind, {"http": 0, "selenium": 0})
+        total = c["http"] + c["selenium"]
+        return c["http"] / total if total else 0.0
+
+    def print_summary(self):
+        if not self.counts:
+            return
+        print("\n[INFO] Fetch path summary (HTTP fast path vs. Selenium fallback)")
+        for kind, c in sorted(self.counts.items()):
+            print(f"  {kind}: {c['http']} http, {c['selenium']} selenium "
+                  f"({self.hit_rate(kind):.0%} fast-path hit rate)")
+
+# Shared statistics for the whole run
+stats = FetchStats()
+
+# ---------- Session Pool ----------
+
+_local = threading.local()
+
+def get_session():
+    """
+    Returns this thread's pooled requests.Session. Sessions are per thread so the
+    crawl pool workers never share one, while each keeps its connections alive.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"User-Agent": USER_AGENT})
+        _local.session = session
+    return session
+
+def fetch_html(url, use_cache=False, revalidate=False, kind="page"):
+    """
+    GET a page over plain HTTP; returns the HTML text or None on any failure.
+    With use_cache, the page goes through the on-disk conditional-GET cache;
+    'revalidate' makes even fresh cache entries check back with the server.
+    'kind' ("listing", "detail", ...) labels the request in the metrics.
+    """
+    try:
+        if use_cache:
+            return cached_get(get_session(), url, timeout=REQUEST_TIMEOUT, revalidate=revalidate, kind=kind)
+        with PAGE_LOAD_SECONDS.time(kind=kind, domain=domain_of(url)):
+            response = get_session().get(url, timeout=REQUEST_TIMEOUT)
+        HTTP_RESPONSES.inc(kind=kind, status=response.status_code, domain=domain_of(url))
+        FETCHED_BYTES.inc(len(response.content), kind=kind, domain=domain_of(url))
+        response.raise_for_status()
+        return response.text
+    except Exception as e:
+        if getattr(e, "response", None) is None:  # No response at all: DNS, connect or timeout
+            HTTP_RESPONSES.inc(kind=kind, status="error", domain=domain_of(url))
+        print(f"[WARNING] HTTP fetch failed for {url}: {e}")
+        return None
+
+# ---------- Parsers ----------
+
+def parse_listing(html, base_url):
+    """
+    Extracts services and the next-page href from a 211 listing page.
+    Returns (services, next_href), or None when the result markup is missing
+    (e.g. the list is rendered client-side) so the caller can fall back.
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    title_elements = soup.select(RESULT_SELECTOR)
+    services = []
+    for title_elem in title_elements:
+        service_name = title_elem.get_text(" ", strip=True)
+        link_elem = title_elem.find("a", href=True)
+        service_url = urljoin(base_url, link_elem["href"]) if link_elem else None
+
+        # Skip unwanted entries
+        if not service_name or "SEARCHING FOR" in service_name.upper():
+            continue
+        services.append({"service_name": service_name, "service_url": service_url})
+
+    # A listing without any linked service is treated as incomplete markup
+    if not any(s["service_url"] for s in services):
+        return None
+
+    next_href = None
+    next_span = soup.select_one(NEXT_PAGE_SELECTOR)
+    if next_span is not None:
+        next_link = next_span.find_parent("a", href=True)
+        if next_link is not None:
+            next_href = urljoin(base_url, next_link["href"])
+    return services, next_href
+
+def parse_provider_url(html, base_url):
+    """Returns the provider website linked from a 211 service detail page, or None"""
+    return parse_provider_link(html, base_url)[1]
+
+def parse_provider_link(html, base_url):
+    """
+    Returns (rendered, provider URL or None) for a 211 service detail page.
+    'rendered' says whether the detail record is in the markup at all: a
+    rendered record without a link is a service with no website, while a
+    missing record means the page is rendered client-side.
+    """
+    soup = BeautifulSoup(html, HTML_PARSER)
+    if soup.select_one(DETAIL_RECORD_SELECTOR) is None:
+        return False, None
+    for link in soup.select(PROVIDER_LINK_SELECTOR):
+        if link.get("href"):
+            return True, urljoin(base_url, link["href"])
+    return True, None
+
+def parse_detail_text(html):
+    """Returns the text of a 211 service detail record (the whole page if the record isn't found)"""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    records = soup.select(".record-detail-content")
+    nodes = records or [soup]
+    return "\n".join(node.get_text("\n", strip=True) for node in nodes)
+
+def parse_coordinates(html):
+    """Returns the (latitude, longitude) a 211 service detail page locates the service at, or None"""
+    for pattern in COORDINATE_PATTERNS:
+        for lat, lon in pattern.findall(html):
+            lat, lon = float(lat), float(lon)
+            if -90 <= lat <= 90 and -180 <= lon <= 180 and (lat, lon) != (0.0, 0.0):
+                return lat, lon
+    return None
+
+# ---------- Fetch With Fallback ----------
+
+def fetch_listing(url, fallback):
+    """
+    Scrapes every page of a listing over HTTP. If a page's markup is missing or
+    incomplete, the rest of the listing is handed to fallback(url), which should
+    drive Selenium from that page on.
+    """
+    all_services = []
+    seen_pages = set()
+    while url and url not in seen_pages and len(seen_pages) < MAX_PAGES:
+        seen_pages.add(url)
+        html = fetch_html(url, kind="listing")
+        parsed = parse_listing(html, url) if html else None
+        if parsed is None:
+            stats.record("listing", "selenium")
+            print(f"[INFO] Listing markup incomplete, falling back to Selenium: {url}")
+            all_services.extend(fallback(url))
+            return all_services
+        services, url = parsed
+        stats.record("listing", "http")
+        all_services.extend(services)
+    return all_services
+
+def fetch_provider_url(service_url, fallback):
+    """
+    Resolves the provider website for a 211 service page over HTTP, calling
+    fallback(service_url) (the Selenium path) only when the detail record isn't
+    in the markup. A rendered record without a link returns None: many
+    services have no website of their own.
+    """
+    html = fetch_html(service_url, use_cache=True, kind="detail")
+    rendered, provider_url = parse_provider_link(html, service_url) if html else (False, None)
+    if rendered:
+        stats.record("detail", "http")
+        return provider_url
+    stats.record("detail", "selenium")
+    return fallback(service_url)
@@ -0,0 +1,147 @@
+import json
+import math
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Configuration
+COORDINATES_PATH = "service_coordinates.json"
+GRID_CELL_DEG = 0.05          # Cell edge in degrees (~5.5 km north-south, ~4 km east-west in Toronto)
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG_LAT = 111.32
+COORDINATE_FETCH_WORKERS = 16
+
+# ---------- Distance ----------
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; any argument may be a NumPy array"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+# ---------- Grid Index ----------
+
+class GridIndex:
+    """
+    Uniform lat/lon grid over points (service document numbers).
+    A radius query only visits the cells overlapping the circle's bounding
+    box and computes exact distances for the points in them; nearest()
+    widens the box ring by ring until the k-th hit is provably the closest.
+    """
+    def __init__(self, cell_deg=GRID_CELL_DEG):
+        self.cell_deg = cell_deg
+        self.cells = {}    # (row, col) -> [doc, ...]
+        self.points = {}   # doc -> (lat, lon)
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def add(self, doc, lat, lon):
+        self.points[doc] = (lat, lon)
+        self.cells.setdefault(self._cell(lat, lon), []).append(doc)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _box_docs(self, lat, lon, lat_span, lon_span):
+        """Docs in every cell overlapping [lat ± lat_span] x [lon ± lon_span]"""
+        row_min, col_min = self._cell(lat - lat_span, lon - lon_span)
+        row_max, col_max = self._cell(lat + lat_span, lon + lon_span)
+        docs = []
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self.cells):
+            # Box bigger than the populated grid: walk the populated cells instead
+            for (row, col), cell_docs in self.cells.items():
+                if row_min <= row <= row_max and col_min <= col <= col_max:
+                    docs.extend(cell_docs)
+            return docs
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                docs.extend(self.cells.get((row, col), ()))
+        return docs
+
+    def _spans(self, lat, radius_km):
+        lat_span = radius_km / KM_PER_DEG_LAT
+        # Longitude degrees shrink toward the poles; size the box for its widest-latitude edge
+        edge = min(89.0, abs(lat) + lat_span)
+        lon_span = min(180.0, radius_km / (KM_PER_DEG_LAT * math.cos(math.radians(edge))))
+        return lat_span, lon_span
+
+    def _distances(self, docs, lat, lon):
+        docs = np.asarray(docs, dtype=np.int64)
+        coords = np.array([self.points[d] for d in docs], dtype=np.float64).reshape(-1, 2)
+        return docs, haversine_km(lat, lon, coords[:, 0], coords[:, 1])
+
+    def within(self, lat, lon, radius_km):
+        """(docs, distances_km) inside 'radius_km', nearest first, as NumPy arrays"""
+        docs, distances = self._distances(self._box_docs(lat, lon, *self._spans(lat, radius_km)), lat, lon)
+        keep = distances <= radius_km
+        docs, distances = docs[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return docs[order], distances[order]
+
+    def nearest(self, lat, lon, k, max_km=None):
+        """(docs, distances_km) of the k nearest points, optionally capped at 'max_km'"""
+        radius = self.cell_deg * KM_PER_DEG_LAT
+        limit = max_km if max_km is not None else math.pi * EARTH_RADIUS_KM
+        while True:
+            radius = min(radius, limit)
+            docs, distances = self.within(lat, lon, radius)
+            if len(docs) >= k or radius >= limit or len(docs) == len(self.points):
+                return docs[:k], distances[:k]
+            radius *= 2
+
+# ---------- Service Coordinates ----------
+
+def load_coordinates(path=COORDINATES_PATH):
+    """{service_id: (lat, lon)} from the coordinates file, or {} if it hasn't been built"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {service_id: tuple(point) for service_id, point in json.load(f).items()}
+
+def save_coordinates(coordinates, path=COORDINATES_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(coordinates, f)
+    os.replace(tmp_path, path)
+    print(f"Coordinates for {len(coordinates)} services saved to {path}")
+
+def collect_coordinates(services, known=None):
+    """
+    Read each service's location off its 211 detail page (through the HTTP
+    cache) for services not in 'known'. Returns {service_id: (lat, lon)}.
+    """
+    from fast_fetch import fetch_html, parse_coordinates
+
+    coordinates = dict(known or {})
+    todo = [s for s in services if s["service_id"] not in coordinates]
+
+    def locate(service):
+        html = fetch_html(service["service_url"], use_cache=True, kind="detail")
+        return parse_coordinates(html) if html else None
+
+    with ThreadPoolExecutor(max_workers=COORDINATE_FETCH_WORKERS) as executor:
+        for service, point in zip(todo, executor.map(locate, todo)):
+            if point is not None:
+                coordinates[service["service_id"]] = point
+    print(f"[INFO] Located {len(coordinates)} of {len(services)} services "
+          f"({len(todo)} detail pages checked)")
+    return coordinates
+
+def build_grid(services, coordinates, cell_deg=GRID_CELL_DEG):
+    """GridIndex over the positions of 'services' that have coordinates"""
+    grid = GridIndex(cell_deg)
+    for doc, service in enumerate(services):
+        point = coordinates.get(service["service_id"])
+        if point is not None:
+            grid.add(doc, *point)
+    return grid
+
+def main():
+    from catalog_store import CATALOG_CSV, load_services
+    services = load_services(sys.argv[1] if len(sys.argv) > 1 else CATALOG_CSV)
+    save_coordinates(collect_coordinates(services, load_coordinates()))
+
+if __name__ == "__main__":
+    main()
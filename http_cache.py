@@ -0,0 +1,240 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from requests import HTTPError
+from metrics import FETCHED_BYTES, HTTP_RESPONSES, PAGE_LOAD_SECONDS, domain_of
+
+# Configuration
+CACHE_DIR = "http_cache"
+CACHE_TTL = 24 * 3600                  # Seconds a stored page is served without revalidating
+CACHE_MAX_AGE = 30 * 24 * 3600         # Seconds since last use before an entry is purged
+CACHE_MAX_BYTES = 1024 * 1024 * 1024   # Total body bytes kept on disk (1 GB)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    body_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    encoding TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used);
+CREATE INDEX IF NOT EXISTS entries_body_hash ON entries(body_hash);
+"""
+
+class HTTPCache:
+    """
+    On-disk response cache for provider pages.
+    Bodies are stored once per SHA-256 of their content under objects/, and an
+    SQLite index maps each URL to its body plus the ETag / Last-Modified
+    validators used for conditional requests.
+    """
+    def __init__(self, cache_dir=CACHE_DIR, ttl=CACHE_TTL, max_age=CACHE_MAX_AGE, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"fresh": 0, "revalidated": 0, "miss": 0, "stored": 0, "evicted": 0}
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        # Body bytes on disk, summed once here and kept current by store() and evictions
+        self.total_bytes = self._total_bytes()
+
+    # ---------- Lookup ----------
+
+    def lookup(self, url):
+        """Return the index entry for 'url' as a dict, or None"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT url, body_hash, size, encoding, etag, last_modified, fetched_at FROM entries WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ["url", "body_hash", "size", "encoding", "etag", "last_modified", "fetched_at"]
+        entry = dict(zip(keys, row))
+        if not os.path.exists(self._object_path(entry["body_hash"])):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        """True if the entry is inside its TTL and can be served without a request"""
+        return entry is not None and time.time() - entry["fetched_at"] < self.ttl
+
+    def conditional_headers(self, entry):
+        """Headers for revalidating a stored entry with a conditional GET"""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read_text(self, entry):
+        """Read and decode a stored body, marking the entry as used"""
+        with open(self._object_path(entry["body_hash"]), "rb") as f:
+            body = f.read()
+        with self.lock:
+            self.db.execute("UPDATE entries SET last_used = ? WHERE url = ?", (time.time(), entry["url"]))
+            self.db.commit()
+        return body.decode(entry.get("encoding") or "utf-8", errors="replace")
+
+    def reuse(self, entry):
+        """The stored body after a 304 Not Modified, or None if it was evicted since the lookup"""
+        try:
+            text = self.read_text(entry)
+        except FileNotFoundError:
+            return None
+        self.mark_revalidated(entry)
+        return text
+
+    # ---------- Updates ----------
+
+    def mark_revalidated(self, entry):
+        """Record a 304 Not Modified: the stored body is good for another TTL"""
+        now = time.time()
+        with self.lock:
+            self.db.execute("UPDATE entries SET fetched_at = ?, last_used = ? WHERE url = ?",
+                            (now, now, entry["url"]))
+            self.db.commit()
+            self.stats["revalidated"] += 1
+
+    def store(self, url, body, encoding=None, etag=None, last_modified=None):
+        """Store a 200 response body (bytes) and its validators, then evict if over budget"""
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._object_path(body_hash)
+        if not os.path.exists(path):
+            self._write_object(path, body)
+
+        now = time.time()
+        with self.lock:
+            # Deletes happen under the lock, so re-check: an eviction may have removed
+            # an unreferenced object with this hash since it was written above
+            if not os.path.exists(path):
+                self._write_object(path, body)
+            old = self.db.execute("SELECT body_hash, size FROM entries WHERE url = ?", (url,)).fetchone()
+            if not self._is_referenced(body_hash):
+                self.total_bytes += len(body)
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (url, body_hash, size, encoding, etag, last_modified, fetched_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, body_hash, len(body), encoding, etag, last_modified, now, now),
+            )
+            self.db.commit()
+            self.stats["stored"] += 1
+            if old and old[0] != body_hash:
+                self._drop_object_if_unused(*old)
+        self.evict()
+
+    def evict(self):
+        """Purge entries unused for max_age, then least-recently-used entries until under max_bytes"""
+        with self.lock:
+            cutoff = time.time() - self.max_age
+            expired = self.db.execute("SELECT url, body_hash, size FROM entries WHERE last_used < ?", (cutoff,)).fetchall()
+            for url, body_hash, size in expired:
+                self._delete_entry(url, body_hash, size)
+
+            if self.total_bytes > self.max_bytes:
+                for url, body_hash, size in self.db.execute(
+                    "SELECT url, body_hash, size FROM entries ORDER BY last_used ASC"
+                ).fetchall():
+                    self._delete_entry(url, body_hash, size)
+                    if self.total_bytes <= self.max_bytes:
+                        break
+            self.db.commit()
+
+    def print_summary(self):
+        s = self.stats
+        print(f"[INFO] HTTP cache: {s['fresh']} fresh hits, {s['revalidated']} revalidated (304), "
+              f"{s['miss']} misses, {s['stored']} stored, {s['evicted']} evicted")
+
+    # ---------- Internals ----------
+
+    def _object_path(self, body_hash):
+        return os.path.join(self.cache_dir, "objects", body_hash[:2], body_hash)
+
+    def _write_object(self, path, body):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+    def _total_bytes(self):
+        row = self.db.execute("SELECT SUM(size) FROM (SELECT DISTINCT body_hash, size FROM entries)").fetchone()
+        return row[0] or 0
+
+    def _is_referenced(self, body_hash):
+        return self.db.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone() is not None
+
+    def _delete_entry(self, url, body_hash, size):
+        self.db.execute("DELETE FROM entries WHERE url = ?", (url,))
+        self._drop_object_if_unused(body_hash, size)
+        self.stats["evicted"] += 1
+
+    def _drop_object_if_unused(self, body_hash, size):
+        if self._is_referenced(body_hash):
+            return
+        self.total_bytes -= size
+        try:
+            os.remove(self._object_path(body_hash))
+        except FileNotFoundError:
+            pass
+
+# ---------- Synchronous Helper ----------
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_cache():
+    """Return the process-wide cache, opening it on first use"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = HTTPCache()
+    return _default_cache
+
+def cached_get(session, url, timeout=30, cache=None, revalidate=False, kind="provider"):
+    """
+    GET 'url' through the cache with a requests.Session and return the page text.
+    Fresh entries are read from disk (unless 'revalidate' forces a check);
+    stale ones are revalidated with a conditional request, and a 304 reuses
+    the stored body. 'kind' labels the request in the metrics.
+    """
+    cache = cache or get_cache()
+    entry = cache.lookup(url)
+    if not revalidate and cache.is_fresh(entry):
+        cache.stats["fresh"] += 1
+        return cache.read_text(entry)
+
+    domain = domain_of(url)
+    headers = cache.conditional_headers(entry)
+    for _ in range(2):
+        with PAGE_LOAD_SECONDS.time(kind=kind, domain=domain):
+            response = session.get(url, timeout=timeout, headers=headers)
+        HTTP_RESPONSES.inc(kind=kind, status=response.status_code, domain=domain)
+        FETCHED_BYTES.inc(len(response.content), kind=kind, domain=domain)
+        if response.status_code != 304:
+            break
+        text = cache.reuse(entry) if entry is not None else None
+        if text is not None:
+            return text
+        # Nothing stored to reuse: treat it as a miss and ask again unconditionally
+        entry, headers = None, {"Cache-Control": "no-cache"}
+    else:
+        raise HTTPError(f"304 Not Modified for {url} with no stored copy", response=response)
+
+    response.raise_for_status()
+    cache.stats["miss"] += 1
+    cache.store(
+        url, response.content, encoding=response.encoding,
+        etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"),
+    )
+    return response.text
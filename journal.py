@@ -0,0 +1,103 @@
+import json
+import os
+import time
+from datetime import datetime
+
+# Configuration
+JOURNAL_PATH = "services_journal.jsonl"
+FSYNC_EVERY = 20           # Records between fsyncs
+FSYNC_INTERVAL = 5.0       # ...or seconds, whichever comes first
+
+class Journal:
+    """
+    Append-only JSONL journal with one line per completed service:
+    {"service_id": ..., "completed_at": ..., "record": {...}}.
+    Writes are flushed per record and fsynced in batches, so a crash loses at
+    most the last unsynced batch and never corrupts earlier lines.
+    """
+    def __init__(self, path=JOURNAL_PATH, fsync_every=FSYNC_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.file = None
+
+    def open(self, fresh=False):
+        """Open for appending; with 'fresh', move any existing journal aside first"""
+        if fresh and os.path.exists(self.path):
+            rotated = f"{self.path}.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            os.replace(self.path, rotated)
+            print(f"Previous journal moved to {rotated}")
+        self._repair_tail()
+        self.file = open(self.path, "a", encoding="utf-8")
+        return self
+
+    def append(self, service_id, record):
+        """Append one completed service"""
+        line = json.dumps({
+            "service_id": service_id,
+            "completed_at": datetime.now().isoformat(),
+            "record": record,
+        }, ensure_ascii=False, default=str)
+        self.file.write(line + "\n")
+        self.file.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self.file and self.unsynced:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+            self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self if self.file else self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _repair_tail(self):
+        """Truncate a partial last line left by a crash mid-write"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+
+# ---------- Reading ----------
+
+def read_journal(path=JOURNAL_PATH):
+    """Yield (service_id, record) for every intact line; later lines override earlier ones"""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Partial line from an interrupted write
+            yield entry["service_id"], entry["record"]
+
+def completed_ids(path=JOURNAL_PATH):
+    """
+    Service IDs whose latest journal record is a successful analysis, for
+    resuming. Records without an analysis (failed fetch or LLM call, written
+    by older runs) don't count, so those services are tried again.
+    """
+    return {service_id for service_id, record in load_results(path).items() if record.get("ai_analysis")}
+
+def load_results(path=JOURNAL_PATH):
+    """Single pass over the journal into {service_id: record}"""
+    return dict(read_journal(path))
@@ -0,0 +1,177 @@
+import json
+
+# ---------- Streaming Parser ----------
+
+class StreamingJSONParser:
+    """
+    Incremental parser for the JSON object in an LLM completion that arrives
+    in pieces. feed() returns every field whose value closed in that piece as
+    (dotted path, value), e.g. ("contact.phone", "416-555-1234"), so callers
+    can act on fields before the completion ends. Text before the first '{'
+    (prose, a ```json fence) and after the object closes is ignored.
+    result() parses what arrived, repairing a truncated tail.
+    """
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.start = None          # Offset of the top-level '{'
+        self.end = None            # Offset just past the matching '}'
+        self.stack = []            # Open containers, innermost last
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.safe = None           # (offset, closers): a cut point that parses once the closers are appended
+        self.fields = {}
+
+    @property
+    def complete(self):
+        return self.end is not None
+
+    def feed(self, piece):
+        """Consume the next piece of the completion; returns [(path, value)] for fields that closed in it"""
+        self.text += piece
+        closed = []
+        while self.pos < len(self.text) and self.end is None:
+            self._step(self.text[self.pos], self.pos, closed)
+            self.pos += 1
+        return closed
+
+    # ----- Scanner -----
+
+    def _step(self, c, i, closed):
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif c == "\\":
+                self.escape = True
+            elif c == '"':
+                self.in_string = False
+                self._string_closed(i, closed)
+            return
+        if self.start is None:
+            if c == "{":
+                self.start = i
+                self._open("{", i, None)
+            return
+
+        frame = self.stack[-1]
+        if c == '"':
+            self.in_string = True
+            self.string_start = i
+        elif c in "{[":
+            self._open(c, i, self._child_path(frame))
+        elif c in "}]":
+            self._finish_primitive(frame, i, closed)
+            self.stack.pop()
+            self._value_closed(frame["path"], frame["start"], i + 1, closed)
+            if not self.stack:
+                self.end = i + 1
+        elif c == ":" and frame["kind"] == "{":
+            frame["state"] = "value"
+        elif c == ",":
+            self._finish_primitive(frame, i, closed)
+            frame["state"] = "key" if frame["kind"] == "{" else "value"
+        elif not c.isspace() and frame["state"] == "value" and frame["primitive"] is None:
+            frame["primitive"] = i  # number, true, false or null
+
+    def _open(self, kind, i, path):
+        self.stack.append({"kind": kind, "path": path, "start": i, "key": None,
+                           "state": "key" if kind == "{" else "value", "primitive": None})
+        if len(self.stack) == 1:
+            # Only the top-level object may be closed empty; a nested container that
+            # never closed is dropped on repair, like any other half-received value
+            self._mark_safe(i + 1)
+
+    def _child_path(self, frame):
+        """Dotted path of the value being read in 'frame'; None inside arrays, whose items are not emitted"""
+        if frame["kind"] != "{" or frame["key"] is None or (frame["path"] is None and frame is not self.stack[0]):
+            return None
+        return f"{frame['path']}.{frame['key']}" if frame["path"] else frame["key"]
+
+    def _string_closed(self, i, closed):
+        frame = self.stack[-1]
+        if frame["kind"] == "{" and frame["state"] == "key":
+            frame["key"] = self._load(self.string_start, i + 1)
+        else:
+            self._value_closed(self._child_path(frame), self.string_start, i + 1, closed)
+            frame["state"] = "after"
+
+    def _finish_primitive(self, frame, i, closed):
+        if frame["primitive"] is not None:
+            end = len(self.text[:i].rstrip())
+            self._value_closed(self._child_path(frame), frame["primitive"], end, closed)
+            frame["primitive"] = None
+            frame["state"] = "after"
+
+    def _value_closed(self, path, start, end, closed):
+        value = self._load(start, end)
+        if value is _INVALID:
+            return
+        self._mark_safe(end)
+        if path is not None and path not in self.fields:
+            self.fields[path] = value
+            closed.append((path, value))
+
+    def _mark_safe(self, offset):
+        closers = "".join("}" if frame["kind"] == "{" else "]" for frame in reversed(self.stack))
+        self.safe = (offset, closers)
+
+    def _load(self, start, end):
+        try:
+            return json.loads(self.text[start:end])
+        except ValueError:
+            return _INVALID
+
+    def missing(self, schema):
+        """missing_fields() over the values that closed in the stream, so a list or section cut off by truncation is retried"""
+        closed = {path: value for path, value in self.fields.items() if "." not in path}
+        return missing_fields(closed, schema)
+
+    # ----- Result -----
+
+    def result(self):
+        """
+        The parsed object, or None if no object started. A completion cut off
+        mid-way is repaired by cutting it after the last complete value and
+        closing the open containers. A half-received value (a string, number,
+        or a list or object that never closed) is dropped rather than guessed;
+        the list or section that was being filled keeps the items that had
+        arrived, and missing() still reports it.
+        """
+        if self.start is None:
+            return None
+        if self.end is not None:
+            value = self._load(self.start, self.end)
+            if value is not _INVALID:
+                return value
+        if self.safe is None:
+            return None
+        offset, closers = self.safe
+        try:
+            return json.loads(self.text[self.start:offset] + closers)
+        except ValueError:
+            return None
+
+_INVALID = object()
+
+def parse_partial_json(text):
+    """One-shot StreamingJSONParser: the (repaired) object in a complete or truncated completion, or None"""
+    parser = StreamingJSONParser()
+    parser.feed(text or "")
+    return parser.result()
+
+def missing_fields(data, schema):
+    """
+    Top-level fields of 'schema' the parsed completion lacks. 'schema' is a
+    list of field names, or a nested skeleton dict whose sections count as
+    missing when any of their keys is.
+    """
+    data = data if isinstance(data, dict) else {}
+    missing = []
+    for field in schema:
+        if field not in data:
+            missing.append(field)
+        elif isinstance(schema, dict) and isinstance(schema[field], dict) and schema[field]:
+            if not isinstance(data[field], dict) or missing_fields(data[field], schema[field]):
+                missing.append(field)
+    return missing
@@ -0,0 +1,90 @@
+import json
+import os
+from collections import deque
+
+# Configuration
+TOPIC_KEYWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config", "topic_keywords.json")
+
+class KeywordClassifier:
+    """
+    Labels text with every category whose keywords occur in it.
+
+    All keyword -> category tables are compiled into one Aho-Corasick
+    automaton, so a document is labelled in a single pass over its characters
+    however many keywords and categories there are. Matching is on lowercased
+    substrings, the same as "kw in text.lower()".
+    """
+    def __init__(self, categories):
+        """'categories' maps a label to its keywords; label order is kept in results"""
+        self.labels = list(categories)
+        self.goto = [{}]         # state -> {char: next state}, completed with failure transitions
+        self.outputs = [set()]   # state -> indexes of labels whose keyword ends here
+
+        for index, label in enumerate(self.labels):
+            for keyword in categories[label]:
+                keyword = keyword.lower()
+                if not keyword:
+                    continue
+                state = 0
+                for char in keyword:
+                    if char not in self.goto[state]:
+                        self.goto.append({})
+                        self.outputs.append(set())
+                        self.goto[state][char] = len(self.goto) - 1
+                    state = self.goto[state][char]
+                self.outputs[state].add(index)
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        """Breadth-first pass that turns the keyword trie into a deterministic automaton"""
+        fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.goto[fail[state]].get(char, 0) if state else 0
+                fail[child] = fallback if fallback != child else 0
+                self.outputs[child] |= self.outputs[fail[child]]
+            # Inherit the failure state's transitions so matching never has to walk failure links
+            if state:
+                for char, target in self.goto[fail[state]].items():
+                    self.goto[state].setdefault(char, target)
+        self.outputs = [frozenset(found) for found in self.outputs]
+
+    @classmethod
+    def from_json(cls, path=TOPIC_KEYWORDS_PATH):
+        """Build a classifier from a JSON file of {label: [keywords]}"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def match_indexes(self, text):
+        """Set of label indexes matched anywhere in 'text'"""
+        goto, outputs = self.goto, self.outputs
+        found = set()
+        state = 0
+        for char in (text or "").lower():
+            state = goto[state].get(char)
+            if state is None:
+                state = goto[0].get(char, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return found
+
+    def classify(self, text):
+        """Every matching label, in the order the categories were given"""
+        found = self.match_indexes(text)
+        return [label for index, label in enumerate(self.labels) if index in found]
+
+    def first(self, text, default=""):
+        """The first matching label in category order, or 'default'"""
+        found = self.match_indexes(text)
+        return self.labels[min(found)] if found else default
+
+    def matches_any(self, text):
+        """True if any keyword occurs in 'text'"""
+        return bool(self.match_indexes(text))
+
+def load_topic_classifier(path=TOPIC_KEYWORDS_PATH):
+    """Classifier over the 211 topics configured in config/topic_keywords.json"""
+    return KeywordClassifier.from_json(path)
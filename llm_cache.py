@@ -0,0 +1,110 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Configuration
+LLM_CACHE_PATH = "llm_cache.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    temperature REAL NOT NULL,
+    template TEXT NOT NULL,
+    template_version TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    completion TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS completions_template ON completions(template, template_version);
+"""
+
+# ---------- Helper Functions ----------
+
+def text_hash(text):
+    """SHA-256 of the text sent to the model"""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+def template_version(version, template_text):
+    """
+    Combine a hand-bumped version with a fingerprint of the template text,
+    so editing a prompt invalidates its cached completions even if nobody
+    remembers to bump the version.
+    """
+    return f"{version}:{text_hash(template_text)[:12]}"
+
+# ---------- Cache ----------
+
+class LLMCache:
+    """
+    Persistent store of LLM completions keyed by
+    (model, temperature, prompt template + version, hash of the input text).
+    """
+    def __init__(self, path=LLM_CACHE_PATH):
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def make_key(self, model, temperature, template, version, text):
+        payload = json.dumps([model, float(temperature), template, version, text_hash(text)])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model, temperature, template, version, text):
+        """Return the stored completion or None, counting hits and misses"""
+        key = self.make_key(model, temperature, template, version, text)
+        with self.lock:
+            row = self.db.execute("SELECT completion FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, model, temperature, template, version, text, completion):
+        """Store a completion; failed calls (None) are never cached"""
+        if completion is None:
+            return
+        key = self.make_key(model, temperature, template, version, text)
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO completions "
+                "(key, model, temperature, template, template_version, input_hash, completion, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model, float(temperature), template, version, text_hash(text), completion, time.time()),
+            )
+            self.db.commit()
+
+    def register_template(self, template, version):
+        """
+        Declare the current version of a prompt template and drop completions
+        cached under any other version of it. Returns the number removed.
+        """
+        with self.lock:
+            cursor = self.db.execute(
+                "DELETE FROM completions WHERE template = ? AND template_version != ?", (template, version)
+            )
+            self.db.commit()
+        if cursor.rowcount:
+            print(f"[INFO] LLM cache: invalidated {cursor.rowcount} completions from old '{template}' prompts")
+        return cursor.rowcount
+
+    def invalidate(self, template=None):
+        """Drop every completion for one template, or the whole cache if none is given"""
+        with self.lock:
+            if template is None:
+                cursor = self.db.execute("DELETE FROM completions")
+            else:
+                cursor = self.db.execute("DELETE FROM completions WHERE template = ?", (template,))
+            self.db.commit()
+        return cursor.rowcount
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def print_summary(self):
+        print(f"[INFO] LLM cache: {self.hits} hits, {self.misses} misses ({self.hit_rate():.0%} hit rate)")
@@ -0,0 +1,310 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from chunking import count_tokens
+from json_stream import StreamingJSONParser
+from metrics import LLM_FIRST_FIELD_SECONDS, LLM_SECONDS, LLM_TOKENS, span
+
+# Configuration
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", 60))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 200000))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 8))
+LLM_MAX_RETRIES = 5
+LLM_TIMEOUT = 120          # Seconds per request
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MIN_RATE_FRACTION = 0.1    # Adaptive throttling never drops below 10% of the configured budget
+
+# Both providers speak the OpenAI chat-completions protocol
+PROVIDERS = {
+    "deepseek": {"url": "https://api.deepseek.com/v1/chat/completions", "key_env": "DEEPSEEK_API_KEY"},
+    "openai": {"url": "https://api.openai.com/v1/chat/completions", "key_env": "OPENAI_API_KEY"},
+}
+
+class LLMError(Exception):
+    """Raised when a completion fails after all retries"""
+
+class LLMStreamInterrupted(LLMError):
+    """Raised when a streamed completion breaks off; 'partial' holds the text received so far"""
+    def __init__(self, message, partial):
+        super().__init__(message)
+        self.partial = partial
+
+# ---------- Helper Functions ----------
+
+def parse_json_content(content):
+    """
+    Parse the JSON object in a completion, tolerating markdown code fences and
+    text around the object. Returns a dict/list, or None if nothing parses.
+    """
+    if not content:
+        return None
+    text = content.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        try:
+            return json.loads(text[start:end + 1])
+        except ValueError:
+            pass
+    return None
+
+# ---------- Rate Limiting ----------
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at 'per_minute' units per minute.
+    acquire() blocks until enough units are available.
+    """
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.base_rate = per_minute / 60.0
+        self.rate = self.base_rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        amount = min(float(amount), self.capacity)  # A single oversized request must still fit
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(min(wait, 1.0))
+
+    def adjust(self, amount):
+        """Refund (positive) or charge (negative) units once the real cost is known"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+    def slow_down(self, factor=0.5):
+        """Multiplicative decrease after the provider pushes back"""
+        with self.lock:
+            self._refill()
+            self.rate = max(self.base_rate * MIN_RATE_FRACTION, self.rate * factor)
+
+    def recover(self, step=0.05):
+        """Additive increase back toward the configured rate after a success"""
+        with self.lock:
+            self._refill()
+            self.rate = min(self.base_rate, self.rate + self.base_rate * step)
+
+# ---------- Client ----------
+
+class LLMClient:
+    """
+    Shared chat-completion client for DeepSeek and OpenAI.
+    complete() is safe to call from many threads: requests-per-minute and
+    tokens-per-minute budgets are enforced with token buckets, at most
+    'max_concurrency' calls are in flight, and 429/5xx responses are retried
+    with backoff while the request rate adapts downwards.
+    """
+    def __init__(self, provider="deepseek", api_key=None, requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=LLM_TOKENS_PER_MINUTE, max_concurrency=LLM_CONCURRENCY,
+                 max_retries=LLM_MAX_RETRIES):
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown LLM provider '{provider}', expected one of {sorted(PROVIDERS)}")
+        self.provider = provider
+        self.url = PROVIDERS[provider]["url"]
+        self.api_key = api_key or os.getenv(PROVIDERS[provider]["key_env"])
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.in_flight = threading.Semaphore(max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+
+    def _retry_delay(self, attempt, response=None):
+        """Honor Retry-After when given, otherwise exponential backoff with jitter"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return min(60, 2 ** attempt) + random.uniform(0, 1)
+
+    def complete(self, messages, model, temperature=0, max_tokens=None, on_delta=None):
+        """
+        Send one chat completion and return the message content.
+        With 'on_delta' the completion is streamed and on_delta(text) is called
+        for each piece as it arrives. Raises LLMError if every attempt fails,
+        or LLMStreamInterrupted if a stream breaks off after text was delivered.
+        """
+        start = time.perf_counter()
+        outcome = "error"
+        with span("llm_call", provider=self.provider, model=model):
+            try:
+                content = self._complete(messages, model, temperature, max_tokens, on_delta)
+                outcome = "ok"
+                return content
+            finally:
+                LLM_SECONDS.observe(time.perf_counter() - start, provider=self.provider, model=model, outcome=outcome)
+
+    def complete_json(self, messages, model, temperature=0, max_tokens=None):
+        """
+        Stream a completion through a StreamingJSONParser. Returns the parser:
+        parser.result() is the parsed object (repaired if the completion was
+        truncated or broke off) or None, parser.text the raw completion.
+        Raises LLMError only when no text arrived at all.
+        """
+        parser = StreamingJSONParser()
+        start = time.perf_counter()
+        first_field_seen = False
+
+        def on_delta(text):
+            nonlocal first_field_seen
+            closed = parser.feed(text)
+            # Once per completion, even when the first piece closes several fields
+            if closed and not first_field_seen:
+                first_field_seen = True
+                LLM_FIRST_FIELD_SECONDS.observe(time.perf_counter() - start, provider=self.provider, model=model)
+
+        try:
+            self.complete(messages, model, temperature, max_tokens, on_delta=on_delta)
+        except LLMStreamInterrupted as e:
+            print(f"[WARNING] {e}; keeping the {len(parser.fields)} fields received")
+        return parser
+
+    def extract_json(self, make_messages, schema, model, temperature=0, max_tokens=None):
+        """
+        Streamed JSON extraction against 'schema', a list of field names or a
+        nested skeleton dict. make_messages(schema) builds the prompt for a
+        schema. Fields the completion lacks, or that were cut off, are asked
+        for once more on their own instead of repeating the whole call.
+        Returns (data, fields still missing); data is {} if nothing parsed.
+        """
+        parser = self.complete_json(make_messages(schema), model, temperature, max_tokens)
+        data = parser.result()
+        data = data if isinstance(data, dict) else {}
+        missing = parser.missing(schema)
+        if not missing:
+            return data, missing
+
+        subset = {field: schema[field] for field in missing} if isinstance(schema, dict) else missing
+        print(f"[INFO] Asking {model} again for {len(missing)} missing fields: {', '.join(missing)}")
+        try:
+            retry = self.complete_json(make_messages(subset), model, temperature, max_tokens)
+        except LLMError as e:
+            print(f"[WARNING] Retry for missing fields failed: {e}")
+            return data, missing
+        retried = retry.result()
+        if isinstance(retried, dict):
+            data.update({field: retried[field] for field in missing if field in retried})
+        return data, retry.missing(subset)
+
+    def _complete(self, messages, model, temperature, max_tokens, on_delta=None):
+        payload = {"model": model, "messages": messages, "temperature": temperature}
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        if on_delta is not None:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}  # Usage arrives in the last event
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
+        estimate = sum(count_tokens(m.get("content"), model) for m in messages) + (max_tokens or 0)
+
+        last_error = None
+        for attempt in range(self.max_retries):
+            self.request_bucket.acquire(1)
+            self.token_bucket.acquire(estimate)
+            response = None
+            try:
+                with self.in_flight:
+                    # A streamed body is read while holding the slot; the connection is busy until it ends
+                    response = self.session.post(self.url, headers=headers, json=payload, timeout=LLM_TIMEOUT,
+                                                 stream=on_delta is not None)
+                    if response.status_code in RETRY_STATUSES:
+                        raise LLMError(f"{self.provider} returned HTTP {response.status_code}")
+                    response.raise_for_status()
+                    data = response.json() if on_delta is None else self._read_stream(response, on_delta)
+            except LLMStreamInterrupted:
+                raise  # The caller already has part of the text; starting over would repeat it
+            except (requests.RequestException, LLMError, ValueError) as e:
+                last_error = e
+                # Nothing was consumed by a rejected call, so give the tokens back
+                self.token_bucket.adjust(estimate)
+                if response is not None and response.status_code == 429:
+                    self.request_bucket.slow_down()
+                    self.token_bucket.slow_down()
+                if response is not None and response.status_code not in RETRY_STATUSES and response.status_code < 500:
+                    break  # Client errors (bad key, bad request) won't succeed on retry
+                delay = self._retry_delay(attempt, response)
+                print(f"[WARNING] {self.provider} attempt {attempt + 1} failed ({e}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            usage = data.get("usage") or {}
+            for kind in ("prompt", "completion"):
+                if usage.get(f"{kind}_tokens") is not None:
+                    LLM_TOKENS.inc(usage[f"{kind}_tokens"], provider=self.provider, model=model, type=kind)
+            used = usage.get("total_tokens")
+            if used is not None:
+                self.token_bucket.adjust(estimate - used)
+            self.request_bucket.recover()
+            self.token_bucket.recover()
+            return data["choices"][0]["message"]["content"]
+
+        raise LLMError(f"{self.provider} completion failed after {self.max_retries} attempts: {last_error}")
+
+    def _read_stream(self, response, on_delta):
+        """
+        Read a server-sent-events completion, passing each content piece to
+        on_delta as it arrives. Returns the same shape as a non-streamed response.
+        """
+        if "text/event-stream" not in response.headers.get("Content-Type", ""):
+            data = response.json()  # Server ignored "stream"; deliver the whole completion at once
+            on_delta(data["choices"][0]["message"]["content"] or "")
+            return data
+        pieces, usage = [], None
+        try:
+            for line in response.iter_lines():
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                event = line[len("data:"):].strip()
+                if event == "[DONE]":
+                    break
+                event = json.loads(event)
+                usage = event.get("usage") or usage
+                for choice in event.get("choices") or []:
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        pieces.append(text)
+                        on_delta(text)
+        except (requests.RequestException, ValueError) as e:
+            if not pieces:
+                raise  # Nothing delivered yet, so the request is retried as usual
+            raise LLMStreamInterrupted(f"{self.provider} stream broke off after {len(pieces)} pieces: {e}",
+                                       "".join(pieces))
+        return {"usage": usage or {}, "choices": [{"message": {"content": "".join(pieces)}}]}
+
+    def map(self, fn, items):
+        """
+        Run fn(item) for every item on the client's worker threads and return
+        the results in input order. fn is expected to call complete().
+        """
+        return list(self.executor.map(fn, items))
@@ -0,0 +1,283 @@
+import re
+import sys
+import time
+from urllib.parse import urlparse
+import numpy as np
+from catalog_store import CATALOG_CSV, load_services
+from chunking import MISSING_VALUES
+from journal import JOURNAL_PATH, load_results
+from geo_index import build_grid, load_coordinates
+from keyword_classifier import load_topic_classifier
+from llm_client import parse_json_content
+
+# Configuration
+BM25_K1 = 1.2
+BM25_B = 0.75
+TOP_K = 10
+DEFAULT_RADIUS_KM = 25     # Same as the 211 site's default search distance (sd=25)
+
+# Field weights: a term in the service name counts three times as much as one in the description
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "program": 1.5,
+    "categories": 2.0,
+    "eligibility": 1.5,
+    "description": 1.0,
+    "languages": 1.0,
+}
+
+# Profile parts other than the stated needs only nudge the ranking
+NEED_WEIGHT = 1.0
+TOPIC_WEIGHT = 0.5
+DEMOGRAPHIC_WEIGHT = 0.5
+YOUTH_MAX_AGE = 24
+SENIOR_MIN_AGE = 60
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of",
+    "on", "or", "the", "to", "with", "who", "you", "your", "our", "we", "i", "me", "my", "need",
+    "needs", "help", "services", "service", "not", "specified",
+}
+
+# ---------- Text Processing ----------
+
+def tokenize(text):
+    """Lowercase word tokens with stopwords dropped and plurals folded ('seniors' -> 'senior')"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall((text or "").lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+def _flatten(value):
+    """All non-missing strings inside an extracted JSON value"""
+    if isinstance(value, dict):
+        return [s for v in value.values() for s in _flatten(v)]
+    if isinstance(value, list):
+        return [s for v in value for s in _flatten(v)]
+    if value in MISSING_VALUES or not isinstance(value, (str, int, float)):
+        return []
+    return [str(value)]
+
+def service_fields(service, analysis=None):
+    """
+    Searchable text per field for one deduplicated service. 'analysis' is the
+    parsed LLM extraction (the services_url.py schema) when one is available.
+    """
+    analysis = analysis if isinstance(analysis, dict) else {}
+    categories = [part for topic in service.get("topics", []) for part in topic if isinstance(part, str)]
+    # The URL slug carries the program name, e.g. /service/<id>/<organization>-<program>/
+    slug = urlparse(service.get("service_url") or "").path.rstrip("/").rsplit("/", 1)[-1]
+    return {
+        "name": service.get("service_name") or "",
+        "program": slug.replace("-", " ") if not slug.isdigit() else "",
+        "categories": " ".join(categories),
+        "eligibility": " ".join(_flatten(analysis.get("eligibility"))),
+        "description": " ".join(_flatten(analysis.get("services"))),
+        "languages": " ".join(_flatten(analysis.get("languages"))),
+    }
+
+def catalog_documents(catalog_csv=CATALOG_CSV, journal_path=JOURNAL_PATH):
+    """
+    The deduplicated 211 catalog as (services, fields), with each service's
+    fields enriched by its journaled LLM extraction when there is one.
+    """
+    services = load_services(catalog_csv)
+    extractions = load_results(journal_path)
+    fields = []
+    for service in services:
+        record = extractions.get(service["service_id"]) or {}
+        fields.append(service_fields(service, parse_json_content(record.get("ai_analysis"))))
+    return services, fields
+
+# ---------- Index ----------
+
+class ServiceIndex:
+    """
+    BM25 inverted index over services.
+    Each term's postings are stored as parallel NumPy arrays of document
+    numbers and precomputed BM25 weights, so a query is a handful of
+    vectorized adds into one score array plus a partial sort.
+    Services with known coordinates are also kept in a grid index, so a
+    location-bound query only scores the services inside its radius.
+    """
+    def __init__(self, services, fields, coordinates=None, k1=BM25_K1, b=BM25_B):
+        """
+        'services' is a list of service dicts, 'fields' the matching list of
+        field-text dicts and 'coordinates' an optional {service_id: (lat, lon)}.
+        """
+        self.services = services
+        self.geo = build_grid(services, coordinates) if coordinates else None
+        term_freqs = []
+        lengths = np.zeros(len(services), dtype=np.float32)
+        for doc, doc_fields in enumerate(fields):
+            freqs = {}
+            for field, text in doc_fields.items():
+                weight = FIELD_WEIGHTS.get(field, 1.0)
+                for token in tokenize(text):
+                    freqs[token] = freqs.get(token, 0.0) + weight
+            term_freqs.append(freqs)
+            lengths[doc] = sum(freqs.values())
+
+        average = float(lengths.mean()) if len(services) else 0.0
+        norms = k1 * (1 - b + b * lengths / average) if average else np.full(len(services), k1, dtype=np.float32)
+
+        postings = {}
+        for doc, freqs in enumerate(term_freqs):
+            for term, tf in freqs.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(doc)
+                postings[term][1].append(tf)
+
+        self.postings = {}
+        n = len(services)
+        for term, (docs, tfs) in postings.items():
+            docs = np.asarray(docs, dtype=np.int32)
+            tfs = np.asarray(tfs, dtype=np.float32)
+            idf = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            self.postings[term] = (docs, (idf * tfs * (k1 + 1) / (tfs + norms[docs])).astype(np.float32))
+
+    @classmethod
+    def from_catalog(cls, catalog_csv=CATALOG_CSV, journal_path=JOURNAL_PATH):
+        """Index the deduplicated 211 catalog, enriched with any journaled LLM extractions"""
+        services, fields = catalog_documents(catalog_csv, journal_path)
+        return cls(services, fields, load_coordinates())
+
+    def __len__(self):
+        return len(self.services)
+
+    def score(self, weighted_terms, candidates=None):
+        """
+        BM25 scores as (docs, scores) NumPy arrays. Without 'candidates' every
+        service is scored; with a sorted array of document numbers only those
+        are, by binary search into each posting list, so the cost follows the
+        number of candidates rather than the catalog size.
+        """
+        if candidates is None:
+            scores = np.zeros(len(self.services), dtype=np.float32)
+            for term, query_weight in weighted_terms.items():
+                posting = self.postings.get(term)
+                if posting is not None:
+                    docs, weights = posting
+                    scores[docs] += query_weight * weights
+            return np.arange(len(self.services)), scores
+
+        scores = np.zeros(len(candidates), dtype=np.float32)
+        for term, query_weight in weighted_terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            docs, weights = posting  # Postings are in ascending document order
+            positions = np.minimum(np.searchsorted(docs, candidates), len(docs) - 1)
+            hits = docs[positions] == candidates
+            scores[hits] += query_weight * weights[positions[hits]]
+        return candidates, scores
+
+    def search(self, query, top_k=TOP_K, near=None):
+        """
+        Rank services for a query string or client profile (see profile_query).
+        'near' (or a profile's "location") is {"lat", "lon", "radius_km"}: only
+        services within the radius are scored and results carry distance_km.
+        A place name such as "Toronto" is not geocoded and adds no constraint;
+        the catalog is already crawled for one 211 search location.
+        Returns up to 'top_k' dicts with service_id, service_name, service_url,
+        topics and score, best first.
+        """
+        if near is None and isinstance(query, dict):
+            near = query.get("location")
+        if near is not None and not (isinstance(near, dict) and "lat" in near and "lon" in near):
+            print(f"[INFO] Location {near!r} has no coordinates; ranking without a distance limit")
+            near = None
+
+        distances = {}
+        candidates = None
+        if near is not None:
+            if self.geo is None:
+                print("[WARNING] No service coordinates loaded; ignoring the location constraint "
+                      "(build them with: python geo_index.py)")
+            else:
+                docs, km = self.geo.within(near["lat"], near["lon"], near.get("radius_km", DEFAULT_RADIUS_KM))
+                distances = dict(zip(docs.tolist(), km.tolist()))
+                candidates = np.sort(docs)
+
+        docs, scores = self.score(query_terms(query), candidates)
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        ranked = matched[np.argsort(-scores[matched], kind="stable")]
+
+        results = []
+        for i in ranked:
+            doc = int(docs[i])
+            result = {**self.services[doc], "score": float(scores[i])}
+            if doc in distances:
+                result["distance_km"] = round(distances[doc], 2)
+            results.append(result)
+        return results
+
+# ---------- Queries ----------
+
+_topic_classifier = None
+
+def _topics(text):
+    global _topic_classifier
+    if _topic_classifier is None:
+        _topic_classifier = load_topic_classifier()
+    return _topic_classifier.classify(text)
+
+def profile_query(profile):
+    """
+    Weighted query terms for a client profile:
+    {"needs": str or [str], "age": int, "languages": [str], "demographics": [str]}.
+    Needs carry full weight; the 211 topics they imply, age group, languages
+    and demographics (e.g. "newcomer", "indigenous") are added at lower weight.
+    """
+    needs = profile.get("needs") or ""
+    if isinstance(needs, (list, tuple)):
+        needs = " ".join(needs)
+
+    weighted = {}
+    def add(text, weight):
+        for token in tokenize(text):
+            weighted[token] = weighted.get(token, 0.0) + weight
+
+    add(needs, NEED_WEIGHT)
+    for topic in _topics(needs):
+        add(topic, TOPIC_WEIGHT)
+
+    age = profile.get("age")
+    if isinstance(age, (int, float)):
+        if age <= YOUTH_MAX_AGE:
+            add("youth young", DEMOGRAPHIC_WEIGHT)
+        elif age >= SENIOR_MIN_AGE:
+            add("seniors older adults", DEMOGRAPHIC_WEIGHT)
+    for value in list(profile.get("languages") or []) + list(profile.get("demographics") or []):
+        add(value, DEMOGRAPHIC_WEIGHT)
+    return weighted
+
+def query_terms(query):
+    """Weighted terms for a plain query string or a profile dict"""
+    if isinstance(query, dict):
+        return profile_query(query)
+    return profile_query({"needs": query})
+
+def main():
+    query = " ".join(sys.argv[1:]) or "food bank for seniors"
+    start = time.perf_counter()
+    index = ServiceIndex.from_catalog()
+    print(f"[INFO] Indexed {len(index)} services with {len(index.postings)} terms in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    results = index.search(query)
+    print(f"[INFO] '{query}' answered in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for rank, result in enumerate(results, 1):
+        print(f"{rank:2d}. {result['score']:6.2f}  {result['service_name']}  ({result['service_url']})")
+
+if __name__ == "__main__":
+    main()
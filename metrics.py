@@ -0,0 +1,261 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# Configuration
+METRICS_PATH = "metrics.prom"
+TRACE_PATH = "traces.jsonl"
+TRACE_FLUSH_EVERY = 200    # Finished spans buffered before they are appended to the trace file
+
+SECONDS_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# Labels every metric accepts; values come from the call or from the enclosing tags() block
+CONTEXT_LABELS = ("topic", "domain")
+
+_tags = contextvars.ContextVar("metric_tags", default={})
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+def domain_of(url):
+    """Host of a URL without 'www.', the provider domain label"""
+    host = urlparse(url or "").netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+@contextmanager
+def tags(**labels):
+    """
+    Default labels (topic=, domain=) for every metric observed inside the
+    block on this thread, so deep call sites don't need the service passed in.
+    """
+    token = _tags.set({**_tags.get(), **{k: v for k, v in labels.items() if v}})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(pairs, extra=()):
+    items = [(k, v) for k, v in pairs if v not in (None, "")] + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+# ---------- Metrics ----------
+
+class _Metric:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels) + tuple(l for l in CONTEXT_LABELS if l not in labels)
+        self.lock = threading.Lock()
+        self.series = {}
+
+    def _key(self, labels):
+        context = _tags.get()
+        return tuple((name, labels.get(name, context.get(name, ""))) for name in self.labels)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            return [f"{self.name}{_format_labels(key)} {value:g}" for key, value in sorted(self.series.items())]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for key, s in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, s["counts"]):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', f'{bound:g}')])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {s['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {s['sum']:g}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {s['count']}")
+        return lines
+
+class Registry:
+    """Process-wide set of metrics, written out in the Prometheus text format"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self._get(Counter, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=SECONDS_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            body = metric.render()
+            if body:
+                lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"] + body
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=METRICS_PATH):
+        """Replace the metrics file atomically, so a node_exporter textfile collector never reads half of it"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+registry = Registry()
+
+# The instrumented quantities, shared by every module that observes them
+PAGE_LOAD_SECONDS = registry.histogram("snm_page_load_seconds", "Time to load one page", ("kind",))
+WAIT_SECONDS = registry.histogram("snm_wait_seconds", "Time spent in a readiness wait", ("step", "outcome"))
+WEBDRIVER_CALLS = registry.counter("snm_webdriver_calls_total", "WebDriver commands sent", ("command",))
+HTTP_RESPONSES = registry.counter("snm_http_responses_total", "HTTP responses received", ("kind", "status"))
+FETCHED_BYTES = registry.counter("snm_fetched_bytes_total", "Response body bytes downloaded", ("kind",))
+CLEANED_TEXT_CHARS = registry.histogram("snm_cleaned_text_chars", "Characters of text left after cleaning a page",
+                                        buckets=BYTES_BUCKETS)
+LLM_SECONDS = registry.histogram("snm_llm_request_seconds", "LLM completion latency, retries included",
+                                 ("provider", "model", "outcome"))
+LLM_FIRST_FIELD_SECONDS = registry.histogram("snm_llm_first_field_seconds",
+                                             "Time from sending a streamed completion to its first closed JSON field",
+                                             ("provider", "model"))
+LLM_TOKENS = registry.counter("snm_llm_tokens_total", "Tokens reported by the LLM provider", ("provider", "model", "type"))
+JSON_PARSE_FAILURES = registry.counter("snm_llm_json_parse_failures_total", "Completions that did not parse as JSON",
+                                       ("source",))
+ENSEMBLE_VOTES = registry.counter("snm_ensemble_votes_total", "Ensemble extractions, by whether slower models were skipped",
+                                  ("source", "exit"))
+
+# ---------- Tracing ----------
+
+class Tracer:
+    """
+    Per-service trace spans, appended to a JSONL file one finished span per
+    line: {"trace_id", "span_id", "parent_id", "name", "start", "duration_ms",
+    "attributes"}. The trace ID is the 211 service ID, so all the work done
+    for one service can be pulled out with a single filter.
+    """
+    def __init__(self, path=TRACE_PATH, flush_every=TRACE_FLUSH_EVERY):
+        self.path = path
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.buffer = []
+
+    @contextmanager
+    def span(self, name, trace_id=None, **attributes):
+        """
+        Time the block as a span. Spans opened inside it on the same thread
+        inherit its trace ID and become its children.
+        """
+        parent = _current_span.get()
+        trace_id = str(trace_id or (parent and parent["trace_id"]) or uuid.uuid4().hex)
+        span = {
+            "trace_id": trace_id,
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent["span_id"] if parent and parent["trace_id"] == trace_id else None,
+            "name": name,
+            "start": time.time(),
+            "attributes": attributes,
+        }
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span["attributes"]["error"] = repr(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            with self.lock:
+                self.buffer.append(span)
+                if len(self.buffer) >= self.flush_every:
+                    self._flush_locked()
+
+    def annotate(self, **attributes):
+        """Add attributes to the innermost open span on this thread, if any"""
+        span = _current_span.get()
+        if span is not None:
+            span["attributes"].update(attributes)
+
+    def _flush_locked(self):
+        if not self.buffer:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in self.buffer:
+                f.write(json.dumps(span, ensure_ascii=False, default=str) + "\n")
+        self.buffer = []
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+tracer = Tracer()
+
+def span(name, trace_id=None, **attributes):
+    return tracer.span(name, trace_id, **attributes)
+
+def export(metrics_path=METRICS_PATH):
+    """Write the metrics file and flush buffered spans; called at the end of each run"""
+    registry.write(metrics_path)
+    tracer.flush()
+    print(f"[INFO] Metrics written to {metrics_path}, trace spans to {tracer.path}")
+
+# ---------- WebDriver ----------
+
+def instrument_driver(driver):
+    """
+    Count every WebDriver command and time page loads. All commands go
+    through driver.execute, so wrapping it on the instance sees them all.
+    """
+    execute = driver.execute
+
+    def counted_execute(command, params=None):
+        WEBDRIVER_CALLS.inc(command=command)
+        if command != "get":
+            return execute(command, params)
+        with PAGE_LOAD_SECONDS.time(kind="selenium", domain=domain_of((params or {}).get("url"))):
+            return execute(command, params)
+
+    driver.execute = counted_execute
+    return driver
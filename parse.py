@@ -1,10 +1,15 @@
 import time
 import json
-import openai
 import os
 from dotenv import load_dotenv
-
-# Install: pip install selenium webdriver-manager openai python-dotenv
+from llm_cache import LLMCache, template_version
+from llm_client import LLMClient
+import metrics
+from metrics import JSON_PARSE_FAILURES
+from chunking import chunk_cache_texts, chunk_text, merge_extractions, strip_site_boilerplate
+from ensemble import ModelEnsemble, merge_voted
+
+# Install: pip install selenium webdriver-manager requests python-dotenv
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
@@ -17,7 +22,9 @@ from webdriver_manager.chrome import ChromeDriverManager
 
 # Load environment variables
 load_dotenv()
-openai.api_key = os.getenv('OPENAI_API_KEY')
+
+# Shared, rate-limited client (budgets come from LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE)
+llm_client = LLMClient("openai", api_key=os.getenv('OPENAI_API_KEY'))
 
 # List of URLs to scrape
 URLS = [
@@ -38,20 +45,15 @@ FIELDS = [
     "capacity"
 ]
 
-############################
-# 2) LLM Extraction Function
-############################
+MODEL = "gpt-3.5-turbo"  # or "gpt-4"
+TEMPERATURE = 0
+CHUNK_TOKENS = 3000  # Page tokens per call; gpt-3.5-turbo's 4k context also holds the prompt and answer
 
-def llm_extract_text_to_json(page_text: str) -> dict:
-    """
-    Sends 'page_text' to an LLM with a prompt that requests a JSON extraction.
-    Returns a Python dict from the parsed JSON.
-    """
-    prompt = f"""
+PROMPT_TEMPLATE = """
 You are an expert information extraction assistant. 
 Given the text below, extract these fields in valid JSON ONLY:
 
-{FIELDS}
+{fields}
 
 RULES:
 - Output ONLY JSON, no extra text
@@ -62,23 +64,77 @@ RULES:
 Text:
 \"\"\"{page_text}\"\"\"
 """
+# Bump when the prompt's meaning changes; text edits also change the fingerprint
+PROMPT_BASE_VERSION = "1"
+PROMPT_VERSION = template_version(PROMPT_BASE_VERSION, PROMPT_TEMPLATE + str(FIELDS))
+
+# Completions cache; drops entries from older versions of this prompt
+llm_cache = LLMCache()
+llm_cache.register_template("parse_extraction", PROMPT_VERSION)
+
+# Multi-model voting when ENSEMBLE_MODELS lists two or more models (e.g. "openai:gpt-4o-mini,deepseek:deepseek-chat")
+ensemble = ModelEnsemble.from_env("parse_extraction", PROMPT_VERSION, llm_cache, FIELDS, clients={"openai": llm_client})
+
+############################
+# 2) LLM Extraction Function
+############################
+
+def llm_extract_text_to_json(page_text: str, source_text: str = None) -> dict:
+    """
+    Sends 'page_text' to an LLM with a prompt that requests a JSON extraction.
+    Long pages are split into token-budget chunks and the extractions merged.
+    source_text is the page before cross-page boilerplate stripping; cache
+    keys come from it (see chunking.chunk_cache_texts).
+    Returns a Python dict from the parsed JSON.
+    """
+    chunks = chunk_text(page_text, CHUNK_TOKENS, MODEL)
+    cache_texts = chunk_cache_texts(None, chunks, source_text)
+    if len(chunks) <= 1:
+        return extract_chunk(page_text, cache_texts[0] if cache_texts else None)
+    return merge_extractions([extract_chunk(chunk, cache_text) for chunk, cache_text in zip(chunks, cache_texts)])
+
+def llm_extract_with_confidence(page_text: str, source_text: str = None) -> tuple:
+    """
+    Like llm_extract_text_to_json, but voted across the ensemble models.
+    Returns (data, confidence) with confidence keyed by field; {} without an ensemble.
+    """
+    if ensemble is None:
+        return llm_extract_text_to_json(page_text, source_text), {}
+    results = []
+    chunks = chunk_text(page_text, CHUNK_TOKENS, MODEL)
+    for chunk, cache_text in zip(chunks, chunk_cache_texts(None, chunks, source_text)):
+        prompt = PROMPT_TEMPLATE.format(fields=FIELDS, page_text=chunk)
+        results.append(ensemble.extract([{"role": "user", "content": prompt}], cache_text, temperature=TEMPERATURE))
+    return merge_voted(results)
+
+def extract_chunk(page_text: str, cache_text: str = None) -> dict:
+    """
+    Runs one extraction call for text that fits the input budget. The
+    completion is streamed and parsed as it arrives; malformed or truncated
+    JSON is repaired, and fields it lacks are asked for once more on their own.
+    The completion is cached under 'cache_text' (default: the text itself).
+    """
+    # Reuse the stored completion when this page was already extracted
+    cache_text = cache_text or page_text
+    content = llm_cache.get(MODEL, TEMPERATURE, "parse_extraction", PROMPT_VERSION, cache_text)
+    if content is not None:
+        return json.loads(content)
+
+    def make_messages(fields):
+        return [{"role": "user", "content": PROMPT_TEMPLATE.format(fields=fields, page_text=page_text)}]
 
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",  # or "gpt-4"
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-        )
-        content = response["choices"][0]["message"]["content"]
-        
-        # Attempt to parse JSON from LLM output
-        data = json.loads(content)
+        data, missing = llm_client.extract_json(make_messages, FIELDS, model=MODEL, temperature=TEMPERATURE)
+        if not data:
+            JSON_PARSE_FAILURES.inc(source="parse_extraction")
+            print("LLM returned no usable JSON")
+        elif missing:
+            print(f"LLM left out {', '.join(missing)}")
+        else:
+            # Only complete extractions are cached
+            llm_cache.put(MODEL, TEMPERATURE, "parse_extraction", PROMPT_VERSION, cache_text, json.dumps(data))
         return data
     
-    except json.JSONDecodeError:
-        print("LLM returned invalid JSON. Full content was:")
-        print(content)
-        return {}
     except Exception as e:
         print("Error calling LLM:", e)
         return {}
@@ -95,9 +151,9 @@ def main():
     
     # Initialize the Chrome driver (automatically downloaded by webdriver_manager)
     service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
+    driver = metrics.instrument_driver(webdriver.Chrome(service=service, options=chrome_options))
 
-    all_results = []
+    page_texts = []
 
     for url in URLS:
         print(f"\nScraping URL: {url}")
@@ -122,18 +178,7 @@ def main():
             
             # 3) Now get the visible text from the page
             body_element = driver.find_element(By.TAG_NAME, "body")
-            page_text = body_element.text
-            
-            # 4) Send the text to the LLM for structured extraction
-            extracted = llm_extract_text_to_json(page_text)
-            
-            # 5) Store the result
-            row = {"url": url}
-            row.update(extracted)
-            all_results.append(row)
-            
-            # Sleep a bit to avoid rate-limiting
-            time.sleep(2)
+            page_texts.append((url, body_element.text))
             
         except Exception as e:
             print(f"Error scraping {url}: {e}")
@@ -141,6 +186,24 @@ def main():
     # Close the browser
     driver.quit()
 
+    # 4) Drop lines repeated across pages of the same site, then send all texts
+    #    to the LLM concurrently; the client enforces the rate budgets. Cache keys
+    #    use each page's own text, so they don't change with the other pages scraped
+    cleaned = strip_site_boilerplate(dict(page_texts))
+    extracted = llm_client.map(lambda item: llm_extract_with_confidence(cleaned[item[0]], item[1]), page_texts)
+
+    # 5) Store the results
+    all_results = []
+    for (url, _), (data, confidence) in zip(page_texts, extracted):
+        row = {"url": url}
+        row.update(data)
+        if confidence:
+            row["field_confidence"] = confidence
+        all_results.append(row)
+
+    llm_cache.print_summary()
+    metrics.export()
+
     # Print out the final JSON
     print("\nALL EXTRACTED DATA:\n")
     print(json.dumps(all_results, indent=2))
@@ -0,0 +1,351 @@
+import csv
+import os
+import queue
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+# Configuration
+QUEUE_SIZE = 64            # Items buffered between two stages; a full queue blocks the producer
+STAGE_WORKERS = {
+    "listing": 4,
+    "provider_url": 8,
+    "fetch": 16,
+    "extract": 8,
+}
+MEMBERSHIPS_CSV = "all_services_output.csv"
+MEMBERSHIP_FIELDS = ["service_name", "service_url", "Topic", "Subtopic"]
+
+_STOP = object()
+
+# ---------- Runtime ----------
+
+class Pipeline:
+    """
+    Runs a source, a chain of stages and a sink concurrently, connected by
+    bounded queues. Each stage function takes one item and returns an iterable
+    of output items (empty to drop, several to fan out). Because every queue
+    is bounded, a slow stage applies backpressure all the way to the source,
+    so memory stays flat however large the input is.
+    """
+    def __init__(self, queue_size=QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.stages = []  # (name, fn, workers)
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def stage(self, name, fn, workers=1):
+        self.stages.append((name, fn, workers))
+        self.stats[name] = {"in": 0, "out": 0, "errors": 0}
+        return self
+
+    def _count(self, name, key, n=1):
+        with self.lock:
+            self.stats[name][key] += n
+
+    def _put(self, q, item):
+        """Blocking put that gives up once the run is aborted, so no worker hangs on a full queue"""
+        while not self.aborted.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q):
+        """Blocking get that returns _STOP once the run is aborted"""
+        while not self.aborted.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _STOP
+
+    def _run_stage(self, name, fn, inbox, outbox, workers_left, downstream_workers):
+        while True:
+            item = self._get(inbox)
+            if item is _STOP:
+                break
+            self._count(name, "in")
+            try:
+                for out in fn(item) or ():
+                    if not self._put(outbox, out):
+                        break
+                    self._count(name, "out")
+            except Exception as e:
+                self._count(name, "errors")
+                print(f"[ERROR] Pipeline stage '{name}' failed on an item: {e}")
+        # The last worker of a stage to finish tells every downstream worker to stop
+        with self.lock:
+            workers_left[name] -= 1
+            last = workers_left[name] == 0
+        if last:
+            for _ in range(downstream_workers):
+                self._put(outbox, _STOP)
+
+    def run(self, source, sink):
+        """
+        Feed 'source' (an iterable) through the stages into sink(item).
+        Blocks until everything has drained and returns the per-stage stats.
+        An item that fails in a stage is counted and skipped. If the sink
+        raises, every worker is stopped and the exception propagates; if the
+        source raises, the items already read drain and then it is re-raised.
+        """
+        self.aborted = threading.Event()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        workers_left = {name: workers for name, _, workers in self.stages}
+        threads = []
+        for i, (name, fn, workers) in enumerate(self.stages):
+            downstream = self.stages[i + 1][2] if i + 1 < len(self.stages) else 1
+            for _ in range(workers):
+                t = threading.Thread(
+                    target=self._run_stage,
+                    args=(name, fn, queues[i], queues[i + 1], workers_left, downstream),
+                    daemon=True,
+                )
+                t.start()
+                threads.append(t)
+
+        source_error = []
+
+        def feed():
+            try:
+                for item in source:
+                    if not self._put(queues[0], item):
+                        return
+            except BaseException as e:
+                source_error.append(e)
+            finally:
+                for _ in range(self.stages[0][2] if self.stages else 1):
+                    self._put(queues[0], _STOP)
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        threads.append(feeder)
+        feeder.start()
+
+        # The sink runs on the calling thread
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _STOP:
+                    break
+                sink(item)
+        except BaseException:
+            # Stop every worker and drop what is still queued, then let the error through
+            self.aborted.set()
+            for t in threads:
+                t.join()
+            for q in queues:
+                while not q.empty():
+                    q.get_nowait()
+            raise
+
+        for t in threads:
+            t.join()
+        if source_error:
+            raise source_error[0]
+        return self.stats
+
+    def print_summary(self):
+        print("\n[INFO] Pipeline stages (in / out / errors)")
+        for name, _, workers in self.stages:
+            s = self.stats[name]
+            print(f"  {name} x{workers}: {s['in']} / {s['out']} / {s['errors']}")
+
+# ---------- Service Pipeline ----------
+
+class SeenKeys:
+    """
+    Service keys already sent downstream, held in a private temporary SQLite
+    database so they spill to disk instead of growing in memory with the catalog.
+    """
+    def __init__(self, keys=()):
+        self.db = sqlite3.connect("", check_same_thread=False)  # "" = temporary on-disk database
+        self.db.execute("CREATE TABLE seen (key TEXT PRIMARY KEY)")
+        self.db.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((key,) for key in keys))
+
+    def add(self, key):
+        """Record 'key'; True if it had not been seen before"""
+        return self.db.execute("INSERT OR IGNORE INTO seen VALUES (?)", (key,)).rowcount == 1
+
+    def close(self):
+        self.db.close()
+
+def write_memberships(rows, path=MEMBERSHIPS_CSV, header=True):
+    """Write topic rows to a temp file and swap it in, so a crash never leaves a truncated file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=MEMBERSHIP_FIELDS, extrasaction="ignore")
+        if header:
+            writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+def merge_memberships(parts_dir, path=MEMBERSHIPS_CSV):
+    """
+    Concatenate the per-subtopic spill files in plan order into 'path' and
+    swap it in, so the result matches a serial crawl without holding the rows.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as out:
+        csv.DictWriter(out, fieldnames=MEMBERSHIP_FIELDS).writeheader()
+        for name in sorted(os.listdir(parts_dir)):
+            with open(os.path.join(parts_dir, name), newline="", encoding="utf-8") as part:
+                shutil.copyfileobj(part, out)
+    os.replace(tmp_path, path)
+    shutil.rmtree(parts_dir)
+
+def run_service_pipeline(location="Toronto", resume=True, memberships_csv=MEMBERSHIPS_CSV):
+    """
+    Listing crawl -> dedupe -> 211 detail fetch -> provider fetch + clean ->
+    LLM extraction -> journal, all running at once. Extractions go to the
+    journal as they finish. Topic rows are streamed to one spill file per
+    subtopic as they are crawled and merged into 'memberships_csv' in plan
+    order (the order a serial crawl would produce, as in crawl_pool) once the
+    run completes, so the previous file survives a crash. The combined CSV is
+    materialized from both at the end.
+    """
+    # Imported here so the generic runtime above has no scraper dependencies
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from all import discover_with_browser, make_driver, scrape_listing_selenium
+    from crawl_plan import load_or_build_plan, iter_jobs
+    from fast_fetch import fetch_listing, fetch_provider_url
+    from provider_fetch import ProviderFetcher
+    from chunking import dedupe_lines
+    from service_ids import service_id, canonical_service_url
+    from journal import Journal, completed_ids
+    from services_url import ServiceScraper, record_extraction, service_trace
+    import metrics
+    from catalog_store import store_path, write_catalog
+    from service_store import ServiceStore
+
+    # One lazily started browser per worker thread, for Selenium fallbacks only
+    local = threading.local()
+    drivers = []
+    drivers_lock = threading.Lock()
+
+    def get_driver():
+        if getattr(local, "driver", None) is None:
+            local.driver = make_driver()
+            with drivers_lock:
+                drivers.append(local.driver)
+        return local.driver
+
+    def selenium_provider_url(url):
+        driver = get_driver()
+        driver.get(url)
+        links = WebDriverWait(driver, 10).until(
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".record-detail-content a[target='_blank']"))
+        )
+        return next((link.get_attribute('href') for link in links), None)
+
+    scraper = ServiceScraper()
+    fetcher = ProviderFetcher()
+    journal = Journal().open(fresh=not resume)
+    store = ServiceStore()
+    seen = SeenKeys(completed_ids() if resume else ())
+    start = time.monotonic()
+    first_output = []
+
+    # One spill file per subtopic, named by its plan index; leftovers of a crashed run are discarded
+    parts_dir = f"{memberships_csv}.parts"
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    os.makedirs(parts_dir)
+
+    # ----- Stage functions -----
+
+    def listing(job):
+        index, (topic_name, subtopic_name, url) = job
+        with metrics.tags(topic=topic_name):
+            services = fetch_listing(url, lambda u: scrape_listing_selenium(get_driver(), u))
+        for s in services:
+            s["Topic"] = topic_name
+            s["Subtopic"] = subtopic_name
+        write_memberships(services, os.path.join(parts_dir, f"{index:06d}.csv"), header=False)
+        yield from services
+
+    def dedupe(row):
+        store.add_memberships([row])
+        key = service_id(row.get("service_url")) or canonical_service_url(row.get("service_url"))
+        if key and seen.add(key):
+            yield {"service_id": key, "service_name": row["service_name"],
+                   "service_url": canonical_service_url(row["service_url"]),
+                   "topics": [(row["Topic"], row["Subtopic"])]}
+
+    def provider_url(service):
+        with service_trace(service, "resolve_provider"):
+            url = fetch_provider_url(service["service_url"], selenium_provider_url)
+        if url:
+            yield service, url
+        else:
+            print(f"No provider URL found for service: {service['service_name']}")
+
+    def fetch(item):
+        service, url = item
+        # Through the shared async fetcher: cached, retried and capped per host
+        text = fetcher.fetch(url)
+        if text is None:
+            return
+        text = dedupe_lines(text)
+        store.add_provider(service["service_id"], url)
+        store.add_snapshot(url, text)
+        yield service, url, text
+
+    def extract(item):
+        service, url, text = item
+        with service_trace(service, "analyze", url):
+            details = scraper.extract_service_details(service, url, text)
+        if details and details.get("ai_analysis"):
+            yield service, details
+
+    def sink(item):
+        service, details = item
+        journal.append(service["service_id"], details)
+        record_extraction(store, service["service_id"], details)
+        if not first_output:
+            first_output.append(time.monotonic() - start)
+            print(f"[INFO] First extraction after {first_output[0]:.1f}s")
+        print(f"Extracted: {service['service_name']}")
+
+    # ----- Run -----
+
+    plan = load_or_build_plan(discover_with_browser, location=location)
+
+    pipeline = (
+        Pipeline()
+        .stage("listing", listing, STAGE_WORKERS["listing"])
+        .stage("dedupe", dedupe, 1)  # Single worker: owns 'seen'
+        .stage("provider_url", provider_url, STAGE_WORKERS["provider_url"])
+        .stage("fetch", fetch, STAGE_WORKERS["fetch"])
+        .stage("extract", extract, STAGE_WORKERS["extract"])
+    )
+    try:
+        pipeline.run(enumerate(iter_jobs(plan)), sink)
+    finally:
+        journal.close()
+        store.close()
+        seen.close()
+        fetcher.close()
+        metrics.export()
+        for driver in drivers:
+            driver.quit()
+
+    pipeline.print_summary()
+    merge_memberships(parts_dir, memberships_csv)
+    # The final outputs are whole-catalog files, built from the merged CSV after the run
+    with open(memberships_csv, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    write_catalog(rows, store_path(memberships_csv))
+    scraper.write_outputs(rows)
+    print(f"\nPipeline complete in {time.monotonic() - start:.1f}s")
+
+def main():
+    run_service_pipeline(resume="--fresh" not in sys.argv)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import asyncio
+import threading
+import time
+from functools import partial
+from urllib.parse import urlparse
+import aiohttp
+from text_clean import clean_page_text
+from http_cache import get_cache
+from metrics import CLEANED_TEXT_CHARS, FETCHED_BYTES, HTTP_RESPONSES, PAGE_LOAD_SECONDS, domain_of, span
+
+# Configuration
+MAX_CONCURRENCY = 64       # Open connections across all provider hosts
+PER_HOST_LIMIT = 2         # Open connections to any single provider host
+REQUEST_TIMEOUT = 30       # Seconds per request, including the body
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1          # Seconds, doubled after every failed attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+# ---------- Fetching ----------
+
+async def _clean(url, html):
+    # Parsing is CPU-bound, so keep it off the event loop
+    text = await asyncio.get_running_loop().run_in_executor(None, clean_page_text, html)
+    CLEANED_TEXT_CHARS.observe(len(text), domain=domain_of(url))
+    return text
+
+async def _in_thread(func, *args, **kwargs):
+    # The cache does blocking SQLite and file I/O, so keep it off the event loop too
+    return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args, **kwargs))
+
+async def _fetch_one(session, url, retries, cache, revalidate=False):
+    """
+    Fetch one provider page and return (url, cleaned text or None).
+    Pages inside the cache TTL are read from disk; stale ones are revalidated
+    with a conditional GET and reused on 304 Not Modified.
+    """
+    # One fetch can serve several services, so provider spans are traced by URL
+    with span("provider_fetch", trace_id=url, domain=domain_of(url)):
+        return await _fetch_one_attempts(session, url, retries, cache, revalidate)
+
+async def _fetch_one_attempts(session, url, retries, cache, revalidate):
+    domain = domain_of(url)
+    entry = await _in_thread(cache.lookup, url) if cache else None
+    if cache and not revalidate and cache.is_fresh(entry):
+        cache.stats["fresh"] += 1
+        return url, await _clean(url, await _in_thread(cache.read_text, entry))
+
+    headers = cache.conditional_headers(entry) if cache else {}
+    for attempt in range(1, retries + 1):
+        try:
+            start = time.perf_counter()
+            async with session.get(url, headers=headers) as response:
+                HTTP_RESPONSES.inc(kind="provider", status=response.status, domain=domain)
+                if response.status == 304:
+                    html = await _in_thread(cache.reuse, entry) if entry is not None else None
+                    if html is None:
+                        # Nothing stored to reuse: treat it as a miss and ask again unconditionally
+                        entry, headers = None, {"Cache-Control": "no-cache"}
+                        continue
+                else:
+                    response.raise_for_status()
+                    body = await response.read()
+                    FETCHED_BYTES.inc(len(body), kind="provider", domain=domain)
+                    encoding = response.charset or "utf-8"
+                    if cache:
+                        cache.stats["miss"] += 1
+                        await _in_thread(cache.store, url, body, encoding=encoding,
+                                         etag=response.headers.get("ETag"),
+                                         last_modified=response.headers.get("Last-Modified"))
+                    html = body.decode(encoding, errors="replace")
+            PAGE_LOAD_SECONDS.observe(time.perf_counter() - start, kind="provider", domain=domain)
+            return url, await _clean(url, html)
+        except aiohttp.ClientResponseError as e:
+            if e.status not in RETRY_STATUSES or attempt == retries:
+                print(f"Failed to fetch content from {url}: HTTP {e.status}")
+                return url, None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            HTTP_RESPONSES.inc(kind="provider", status="error", domain=domain)
+            if attempt == retries:
+                print(f"Failed to fetch content from {url} after {retries} attempts: {e!r}")
+                return url, None
+        except Exception as e:
+            print(f"Failed to clean content from {url}: {e!r}")
+            return url, None
+        await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+    return url, None
+
+def _open_session(max_concurrency, per_host):
+    connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=per_host, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout, headers={"User-Agent": USER_AGENT})
+
+async def fetch_provider_sites_async(urls, max_concurrency=MAX_CONCURRENCY,
+                                     per_host=PER_HOST_LIMIT, retries=MAX_RETRIES, use_cache=True,
+                                     revalidate=False):
+    """
+    Fetch and clean many provider pages concurrently. The connector caps open
+    connections globally and per host and keeps them alive for reuse, so
+    independent hosts proceed in parallel while no single site is hammered.
+    Responses go through the on-disk HTTP cache unless use_cache is False;
+    'revalidate' sends a conditional GET even for entries inside the TTL.
+    Returns {url: cleaned text or None}.
+    """
+    cache = get_cache() if use_cache else None
+    unique_urls = list(dict.fromkeys(u for u in urls if u))
+    if not unique_urls:
+        return {}
+
+    async with _open_session(max_concurrency, per_host) as session:
+        results = await asyncio.gather(*(_fetch_one(session, url, retries, cache, revalidate) for url in unique_urls))
+    return dict(results)
+
+def fetch_provider_sites(urls, **kwargs):
+    """Synchronous wrapper around fetch_provider_sites_async for the scraper scripts"""
+    hosts = {urlparse(u).netloc for u in urls if u}
+    print(f"Fetching {len(set(u for u in urls if u))} provider pages across {len(hosts)} hosts...")
+    return asyncio.run(fetch_provider_sites_async(urls, **kwargs))
+
+class ProviderFetcher:
+    """
+    fetch_provider_sites for callers that produce URLs one at a time from
+    many threads, like the pipeline's fetch workers. One event loop and
+    aiohttp session run in a background thread for the fetcher's lifetime,
+    so the global and per-host connection caps hold across every caller.
+    """
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, per_host=PER_HOST_LIMIT, retries=MAX_RETRIES,
+                 use_cache=True, revalidate=False):
+        self.retries = retries
+        self.revalidate = revalidate
+        self.cache = get_cache() if use_cache else None
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.session = self._call(self._open(max_concurrency, per_host))
+
+    async def _open(self, max_concurrency, per_host):
+        return _open_session(max_concurrency, per_host)  # Must be created on the fetcher's loop
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def fetch(self, url):
+        """Fetch and clean one provider page; returns the cleaned text or None. Safe to call from any thread"""
+        return self._call(_fetch_one(self.session, url, self.retries, self.cache, self.revalidate))[1]
+
+    def close(self):
+        self._call(self.session.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fast_fetch import fetch_html, parse_detail_text, parse_provider_link
+from all import discover_with_browser, make_driver, scrape_listing
+from crawl_plan import load_or_build_plan, iter_jobs
+from crawl_pool import run_pool
+from provider_fetch import fetch_provider_sites
+from chunking import strip_site_boilerplate
+from service_ids import dedupe_services
+from catalog_store import CATALOG_CSV, load_rows, save_rows
+from journal import Journal, JOURNAL_PATH, completed_ids
+from services_url import ServiceScraper, record_extraction, service_trace
+import metrics
+from service_store import ServiceStore
+
+# Configuration
+SNAPSHOT_PATH = "service_snapshot.json"
+DETAIL_FETCH_WORKERS = 16   # Concurrent 211 detail-page revalidations
+
+# ---------- Snapshots ----------
+
+def content_hash(text):
+    """Stable hash of cleaned page text; None when the page couldn't be fetched"""
+    if text is None:
+        return None
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """Load the last snapshot ({service_id: fingerprint}), or None on the first run"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["services"]
+
+def save_snapshot(snapshot, path=SNAPSHOT_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"created_at": datetime.now().isoformat(), "services": snapshot}, f, indent=1)
+    os.replace(tmp_path, path)
+    print(f"Snapshot saved to {path}")
+
+def diff_snapshots(old, new):
+    """
+    Compare two snapshots by service ID.
+    A service has changed when its 211 detail text or provider page hash differs.
+    Returns {"new": [...], "removed": [...], "changed": [...], "unchanged": [...]}.
+    """
+    delta = {"new": [], "removed": [], "changed": [], "unchanged": []}
+    for service_id, fingerprint in new.items():
+        previous = old.get(service_id)
+        if previous is None:
+            delta["new"].append(service_id)
+        elif (previous.get("detail_hash"), previous.get("provider_hash")) != \
+                (fingerprint.get("detail_hash"), fingerprint.get("provider_hash")):
+            delta["changed"].append(service_id)
+        else:
+            delta["unchanged"].append(service_id)
+    delta["removed"] = [service_id for service_id in old if service_id not in new]
+    return delta
+
+# ---------- Listing ----------
+
+def crawl_listing(location="Toronto", previous_rows=()):
+    """
+    Re-crawl every subtopic in the crawl plan (over HTTP, starting browsers
+    only for incomplete markup) and return the topic rows in plan order.
+    Subtopics that fail keep their rows from 'previous_rows', so a transient
+    error doesn't report their services as removed.
+    """
+    plan = load_or_build_plan(discover_with_browser, location=location)
+    rows, failures = run_pool(iter_jobs(plan), make_driver, scrape_listing)
+    failed = {(topic, subtopic) for topic, subtopic, _, _ in failures}
+    if failed:
+        kept = [row for row in previous_rows if (row.get("Topic"), row.get("Subtopic")) in failed]
+        print(f"[WARNING] Keeping {len(kept)} previous rows for {len(failed)} subtopic(s) that failed to crawl")
+        rows += kept
+    return rows
+
+# ---------- Fingerprinting ----------
+
+def fingerprint_services(services, scraper):
+    """
+    Revalidate every 211 detail page and provider page (mostly 304s through the
+    HTTP cache) and hash their cleaned text. Returns (snapshot, provider_pages),
+    where snapshot maps service_id -> {service_name, detail_hash, provider_url, provider_hash}.
+    Each page is hashed on its own text, before boilerplate shared with other
+    pages of its host is stripped, so adding or dropping one page of a site
+    doesn't make the others look changed.
+    """
+    def detail(service):
+        html = fetch_html(service['service_url'], use_cache=True, revalidate=True, kind="detail")
+        if html is None:
+            return None, None, False
+        rendered, provider_url = parse_provider_link(html, service['service_url'])
+        return content_hash(parse_detail_text(html)), provider_url, rendered
+
+    with ThreadPoolExecutor(max_workers=DETAIL_FETCH_WORKERS) as executor:
+        details = list(executor.map(detail, services))
+
+    provider_urls = {}
+    for service, (detail_hash, provider_url, rendered) in zip(services, details):
+        if detail_hash is not None and not rendered:
+            # Detail record rendered client-side; use the Selenium path for just this page
+            provider_url = scraper.find_provider_url(service)
+        provider_urls[service['service_id']] = provider_url
+
+    pages = fetch_provider_sites(list(provider_urls.values()), revalidate=True)
+
+    snapshot = {}
+    for service, (detail_hash, _, _) in zip(services, details):
+        provider_url = provider_urls[service['service_id']]
+        snapshot[service['service_id']] = {
+            "service_name": service['service_name'],
+            "detail_hash": detail_hash,
+            "provider_url": provider_url,
+            "provider_hash": content_hash(pages.get(provider_url)) if provider_url else None,
+        }
+    return snapshot, pages
+
+# ---------- Refresh ----------
+
+def refresh(input_csv, snapshot_path=SNAPSHOT_PATH, journal_path=JOURNAL_PATH, crawl=True, location="Toronto"):
+    """
+    Incremental update: re-crawl the 211 listing into 'input_csv', then re-run
+    fetch and LLM extraction only for services that are new or whose 211
+    detail page or provider page changed since the last snapshot. Services
+    the listing no longer shows drop out of the outputs and are recorded as
+    removed in the ServiceStore. With crawl=False the CSV is used as it is,
+    so it must come from a fresh crawl.
+    """
+    if crawl:
+        previous_rows = load_rows(input_csv) if os.path.exists(input_csv) else []
+        rows = crawl_listing(location, previous_rows)
+        save_rows(rows, input_csv)
+    else:
+        rows = load_rows(input_csv)
+    services = dedupe_services(rows)
+    by_id = {s['service_id']: s for s in services}
+
+    scraper = ServiceScraper()
+    journal = Journal(journal_path)
+    store = ServiceStore()
+    try:
+        store.add_memberships(rows)
+        old_snapshot = load_snapshot(snapshot_path)
+        new_snapshot, pages = fingerprint_services(services, scraper)
+        contents = strip_site_boilerplate(pages)
+
+        if old_snapshot is None:
+            # First refresh: services already extracted by a full run become the baseline
+            done = completed_ids(journal_path)
+            old_snapshot = {sid: fp for sid, fp in new_snapshot.items() if sid in done}
+            print(f"No snapshot found; using {len(old_snapshot)} journaled services as the baseline")
+
+        delta = diff_snapshots(old_snapshot, new_snapshot)
+        print(f"Refresh: {len(delta['new'])} new, {len(delta['changed'])} changed, "
+              f"{len(delta['removed'])} removed, {len(delta['unchanged'])} unchanged")
+        store.add_removals(delta['removed'])
+
+        todo = [by_id[sid] for sid in delta['new'] + delta['changed']]
+        for sid in delta['new'] + delta['changed']:
+            provider_url = new_snapshot[sid]['provider_url']
+            store.add_provider(sid, provider_url)
+            store.add_snapshot(provider_url, pages.get(provider_url))
+
+        def analyze(service):
+            provider_url = new_snapshot[service['service_id']]['provider_url']
+            if not provider_url:
+                print(f"No provider URL found for service: {service['service_name']}")
+                return None
+            if contents.get(provider_url) is None:
+                return None  # Fetch failed; don't overwrite the last good extraction
+            with service_trace(service, "analyze", provider_url):
+                return scraper.extract_service_details(service, provider_url, contents.get(provider_url),
+                                                       source_text=pages.get(provider_url))
+
+        journal.open()
+        for service, details in zip(todo, scraper.llm_client.map(analyze, todo)):
+            if details and details.get('ai_analysis'):
+                # Later journal lines override earlier ones for the same service
+                journal.append(service['service_id'], details)
+                record_extraction(store, service['service_id'], details)
+            else:
+                # Analysis failed: keep the last good extraction and the old fingerprint,
+                # so the next refresh retries this service
+                if service['service_id'] in old_snapshot:
+                    new_snapshot[service['service_id']] = old_snapshot[service['service_id']]
+                else:
+                    new_snapshot.pop(service['service_id'], None)
+        journal.close()
+
+        scraper.write_outputs(rows, journal_path)
+        save_snapshot(new_snapshot, snapshot_path)
+        return delta
+    finally:
+        journal.close()
+        store.close()
+        metrics.export()
+        if scraper.driver is not None:
+            scraper.driver.quit()
+
+def main():
+    # python refresh.py [catalog_csv]             -> re-crawl the listing, then refresh
+    # python refresh.py --no-crawl [catalog_csv]  -> refresh against a CSV that was just crawled
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    refresh(args[0] if args else CATALOG_CSV, crawl="--no-crawl" not in sys.argv)
+
+if __name__ == "__main__":
+    main()
@@ -1,41 +1,43 @@
-import time
 import pandas as pd
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWaitoko
-from selenium.webdriver.support import expected_conditions as EC
+from waits import (recorder, wait_for_page_ready, wait_for_element, wait_for_staleness,
+                   wait_for_network_idle, wait_for_stable_count)
+import metrics
 
 def open_search_page_and_set_location(driver, location="Toronto"):
     #Go to the main search page
     driver.get("https://211ontario.ca/search/")
-    time.sleep(3)  # Wait for page to load
+    wait_for_page_ready(driver, step="open_search_page", baseline=3)
 
     #Find the location input
-    location_box = driver.find_element(By.ID, "searchLocation")  
+    location_box = wait_for_element(driver, (By.ID, "searchLocation"), step="location_box")
     location_box.clear()
     location_box.send_keys(location)
-    time.sleep(1)
+    wait_for_network_idle(driver, step="set_location", baseline=1)
   
 
 def click_main_topic(driver, topic_name="Abuse / Assault"):
-    time.sleep(3)
-    topic_element = driver.find_element(By.XPATH, f"//a[contains(text(), '{topic_name}')]")
+    topic_element = wait_for_element(
+        driver, (By.XPATH, f"//a[contains(text(), '{topic_name}')]"),
+        step="click_main_topic", clickable=True, baseline=3
+    )
     topic_element.click()
-    time.sleep(3)
+    wait_for_stable_count(driver, (By.XPATH, "//div[@class='subtopic-heading']"), step="topic_loaded", baseline=3)
 
 def click_subtopic(driver, subtopic_name="Child abuse services"):
     """
     Clicks on the subtopic and then clicks "View Resources" to load service listings.
     """
-    time.sleep(3)
     try:
         # Find the subtopic heading by text
-        heading_element = driver.find_element(
-            By.XPATH, 
-            f"//div[@class='subtopic-heading' and contains(text(), '{subtopic_name}')]"
+        heading_element = wait_for_element(
+            driver,
+            (By.XPATH, f"//div[@class='subtopic-heading' and contains(text(), '{subtopic_name}')]"),
+            step="click_subtopic", baseline=3
         )
         print(f"[INFO] Found subtopic heading: {subtopic_name}")
 
@@ -46,7 +48,8 @@ def click_subtopic(driver, subtopic_name="Child abuse services"):
         print("[INFO] Clicking 'View Resources' button...")
         view_resources.click()
 
-        time.sleep(5)
+        wait_for_staleness(driver, heading_element, step="subtopic_navigation", baseline=5)
+        wait_for_page_ready(driver, step="subtopic_loaded")
     except Exception as e:
         print(f"[ERROR] Could not click on subtopic '{subtopic_name}': {e}")
 
@@ -61,7 +64,10 @@ def extract_services(driver):
 
     while True:
         print(f"\n🔍 [INFO] Scraping page {page_count}...\n")
-        time.sleep(3)  
+        # An empty listing shows a "No results" notice instead of titles; don't wait out the timeout on it
+        wait_for_stable_count(driver, (By.CLASS_NAME, "title"), step="extract_services",
+                              empty_locator=(By.XPATH, "//*[contains(translate(text(), 'NORESULTS', 'noresults'), 'no results')]"),
+                              baseline=3)
 
         #Find all <div class="title"> elements
         title_elements = driver.find_elements(By.CLASS_NAME, "title")
@@ -87,13 +93,18 @@ def extract_services(driver):
         try:
             print("[INFO] Checking for 'Next Page' via <span aria-label='Next Page'>...")
 
+            # The result list is already stable, so the pager is rendered if it exists at all
+            if not driver.find_elements(By.XPATH, "//span[@aria-label='Next Page']/parent::a"):
+                print("[INFO] No more pages found.")
+                break
+
             # Scroll down in case the link is off-screen
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
 
             # Wait for <span aria-label="Next Page"> to be clickable, then go to its parent <a>
-            next_span = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.XPATH, "//span[@aria-label='Next Page']/parent::a"))
+            next_span = wait_for_element(
+                driver, (By.XPATH, "//span[@aria-label='Next Page']/parent::a"),
+                step="next_page", clickable=True, baseline=2
             )
             next_page_href = next_span.get_attribute("href")
 
@@ -101,7 +112,7 @@ def extract_services(driver):
                 print(f"[INFO] Found next page ({page_count + 1}): {next_page_href}")
                 driver.get(next_page_href)
                 page_count += 1
-                time.sleep(5) 
+                wait_for_page_ready(driver, step="next_page_loaded", baseline=5)
             else:
                 print("[INFO] No more pages found.")
                 break
@@ -117,7 +128,7 @@ def main():
     options = Options()
     options.add_argument("--headless") 
     service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
+    driver = metrics.instrument_driver(webdriver.Chrome(service=service, options=options))
 
     try:
        
@@ -145,8 +156,10 @@ def main():
         df = pd.DataFrame(services_data)
         df.to_csv("services_output.csv", index=False)
         print("Saved to services_output.csv!")
+        recorder.print_summary()
     finally:
         driver.quit()
+        metrics.export()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,64 @@
+import re
+from urllib.parse import urlparse
+
+# 211 service pages look like https://211ontario.ca/service/<numeric id>/<slug>/?<per-search query>
+SERVICE_ID_PATTERN = re.compile(r"/service/(\d+)(?:/|$)")
+
+# ---------- Helper Functions ----------
+
+def service_id(url):
+    """Return the numeric 211 service ID from a service URL, or None"""
+    if not isinstance(url, str):
+        return None
+    match = SERVICE_ID_PATTERN.search(urlparse(url).path)
+    return match.group(1) if match else None
+
+def canonical_service_url(url):
+    """
+    Strip the per-search query string (searchLocation, topicPath, latitude, ...)
+    and fragment, leaving the stable service page URL.
+    """
+    if not isinstance(url, str):
+        return url
+    parsed = urlparse(url)
+    return parsed._replace(query="", fragment="").geturl()
+
+def dedupe_services(rows):
+    """
+    Collapse topic rows (dicts with service_name, service_url, Topic, Subtopic)
+    into one record per 211 service ID, in first-seen order. Each record keeps
+    the canonical URL and every (Topic, Subtopic) membership. Rows without a
+    recognizable ID are keyed by their URL so they are still processed once.
+    """
+    services = {}
+    for row in rows:
+        url = row.get("service_url")
+        key = service_id(url) or canonical_service_url(url)
+        if not key:
+            continue
+        record = services.get(key)
+        if record is None:
+            record = services[key] = {
+                "service_id": key,
+                "service_name": row.get("service_name"),
+                "service_url": canonical_service_url(url),
+                "topics": [],
+            }
+        membership = (row.get("Topic"), row.get("Subtopic"))
+        if membership not in record["topics"]:
+            record["topics"].append(membership)
+    return list(services.values())
+
+def fan_out(rows, results_by_id):
+    """
+    Attach per-service results back onto the original topic rows.
+    Rows whose service has no result are left out, matching the old per-row output.
+    """
+    merged = []
+    for row in rows:
+        url = row.get("service_url")
+        key = service_id(url) or canonical_service_url(url)
+        result = results_by_id.get(key)
+        if result is not None:
+            merged.append({**row, "service_id": key, **result})
+    return merged
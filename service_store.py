@@ -0,0 +1,279 @@
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from itertools import groupby
+from urllib.parse import urlparse
+from service_ids import service_id, canonical_service_url
+
+# Configuration
+STORE_PATH = "services.sqlite"
+WRITE_BATCH = 500          # Buffered rows per write transaction
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS services (
+    service_id TEXT PRIMARY KEY,
+    service_name TEXT,
+    service_url TEXT,
+    provider_url TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS services_provider_url ON services(provider_url);
+CREATE TABLE IF NOT EXISTS topic_memberships (
+    service_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    subtopic TEXT NOT NULL,
+    search_url TEXT,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (service_id, topic, subtopic)
+);
+CREATE INDEX IF NOT EXISTS topic_memberships_topic ON topic_memberships(topic, subtopic);
+CREATE TABLE IF NOT EXISTS provider_sites (
+    url TEXT PRIMARY KEY,
+    domain TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS provider_sites_domain ON provider_sites(domain);
+CREATE TABLE IF NOT EXISTS page_snapshots (
+    url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    content TEXT NOT NULL,
+    captured_at REAL NOT NULL,
+    PRIMARY KEY (url, content_hash)
+);
+CREATE INDEX IF NOT EXISTS page_snapshots_captured ON page_snapshots(url, captured_at);
+CREATE TABLE IF NOT EXISTS extractions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    service_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    provider_url TEXT,
+    result TEXT,
+    extracted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS extractions_service ON extractions(service_id, source, id);
+CREATE TABLE IF NOT EXISTS service_removals (
+    service_id TEXT PRIMARY KEY,
+    removed_at REAL NOT NULL
+);
+"""
+
+# Upserts keep first_seen and refresh last_seen, so rows double as a crawl history
+UPSERT_SERVICE = (
+    "INSERT INTO services (service_id, service_name, service_url, first_seen, last_seen) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(service_id) DO UPDATE SET service_name = excluded.service_name, "
+    "service_url = excluded.service_url, last_seen = excluded.last_seen"
+)
+UPSERT_MEMBERSHIP = (
+    "INSERT INTO topic_memberships (service_id, topic, subtopic, search_url, last_seen) VALUES (?, ?, ?, ?, ?) "
+    "ON CONFLICT(service_id, topic, subtopic) DO UPDATE SET search_url = excluded.search_url, "
+    "last_seen = excluded.last_seen"
+)
+UPSERT_PROVIDER = (
+    "INSERT INTO provider_sites (url, domain, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(url) DO UPDATE SET last_seen = excluded.last_seen"
+)
+LINK_PROVIDER = "UPDATE services SET provider_url = ? WHERE service_id = ?"
+# An unchanged page only refreshes its timestamp; a changed one adds a new version
+UPSERT_SNAPSHOT = (
+    "INSERT INTO page_snapshots (url, content_hash, content, captured_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(url, content_hash) DO UPDATE SET captured_at = excluded.captured_at"
+)
+UPSERT_REMOVAL = (
+    "INSERT INTO service_removals (service_id, removed_at) VALUES (?, ?) "
+    "ON CONFLICT(service_id) DO UPDATE SET removed_at = excluded.removed_at"
+)
+INSERT_EXTRACTION = (
+    "INSERT INTO extractions (service_id, source, provider_url, result, extracted_at) VALUES (?, ?, ?, ?, ?)"
+)
+
+def provider_domain(url):
+    """Host of a provider URL without 'www.', used to group services run by one organization"""
+    host = urlparse(url or "").netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+# ---------- Store ----------
+
+class ServiceStore:
+    """
+    Embedded SQLite store for the catalog and everything derived from it:
+    services, their topic memberships, provider sites, page snapshots and
+    extraction results. Writes are buffered and committed in one transaction
+    per WRITE_BATCH rows; reads flush the buffer first, so they always see
+    every write made through this store.
+    """
+    def __init__(self, path=STORE_PATH, write_batch=WRITE_BATCH):
+        self.path = path
+        self.write_batch = write_batch
+        self.lock = threading.Lock()
+        self.pending = []  # (sql, params) in the order they were queued
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    # ---------- Writes ----------
+
+    def _queue(self, statements):
+        """Buffer (sql, params) pairs, committing once the batch is full"""
+        with self.lock:
+            self.pending.extend(statements)
+            if len(self.pending) >= self.write_batch:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.pending:
+            return
+        with self.db:  # One transaction; rolled back whole if any statement fails
+            # Runs of the same statement go through one executemany; queue order is kept,
+            # so a provider link never runs before the upsert of its service
+            for sql, run in groupby(self.pending, key=lambda statement: statement[0]):
+                self.db.executemany(sql, [params for _, params in run])
+        self.pending = []
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def add_memberships(self, rows):
+        """Record crawled topic rows (dicts with service_name, service_url, Topic, Subtopic)"""
+        now = time.time()
+        statements = []
+        for row in rows:
+            url = row.get("service_url")
+            key = service_id(url) or canonical_service_url(url)
+            if not key or not isinstance(key, str):
+                continue
+            statements.append((UPSERT_SERVICE, (key, row.get("service_name"), canonical_service_url(url), now, now)))
+            if isinstance(row.get("Topic"), str):
+                subtopic = row.get("Subtopic") if isinstance(row.get("Subtopic"), str) else ""
+                statements.append((UPSERT_MEMBERSHIP, (key, row["Topic"], subtopic, url, now)))
+        self._queue(statements)
+
+    def add_provider(self, service_key, provider_url):
+        """Link a service to the provider website its 211 page points to"""
+        if not provider_url:
+            return
+        now = time.time()
+        self._queue([
+            (UPSERT_PROVIDER, (provider_url, provider_domain(provider_url), now, now)),
+            (LINK_PROVIDER, (provider_url, service_key)),
+        ])
+
+    def add_snapshot(self, url, content):
+        """Keep a page's text; each distinct version of a page is stored once"""
+        if not url or content is None:
+            return
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        self._queue([(UPSERT_SNAPSHOT, (url, digest, content, time.time()))])
+
+    def add_extraction(self, service_key, source, result, provider_url=None):
+        """Append one extraction result; earlier results for the service are kept as history"""
+        if not isinstance(result, str):
+            result = json.dumps(result, ensure_ascii=False, default=str)
+        self._queue([(INSERT_EXTRACTION, (service_key, source, provider_url, result, time.time()))])
+
+    def add_removals(self, service_keys):
+        """Record services that dropped out of the 211 listing; listing them again later supersedes this"""
+        now = time.time()
+        self._queue([(UPSERT_REMOVAL, (key, now)) for key in service_keys])
+
+    def close(self):
+        with self.lock:
+            self._flush_locked()
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- Lookups ----------
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            self._flush_locked()
+            cursor = self.db.execute(sql, params)
+            keys = [column[0] for column in cursor.description]
+            return [dict(zip(keys, row)) for row in cursor.fetchall()]
+
+    def service(self, service_key):
+        """One service with its topics, provider and latest extraction, or None"""
+        rows = self._query("SELECT * FROM services WHERE service_id = ?", (service_key,))
+        if not rows:
+            return None
+        service = rows[0]
+        service["topics"] = [
+            (r["topic"], r["subtopic"]) for r in self._query(
+                "SELECT topic, subtopic FROM topic_memberships WHERE service_id = ? ORDER BY topic, subtopic",
+                (service_key,))
+        ]
+        service["extraction"] = self.latest_extraction(service_key)
+        return service
+
+    def services_in_topic(self, topic, subtopic=None):
+        """Services listed under a topic, or under one of its subtopics"""
+        sql = ("SELECT DISTINCT s.* FROM topic_memberships m JOIN services s USING (service_id) "
+               "WHERE m.topic = ?")
+        params = (topic,)
+        if subtopic is not None:
+            sql += " AND m.subtopic = ?"
+            params += (subtopic,)
+        return self._query(sql + " ORDER BY s.service_name", params)
+
+    def services_for_domain(self, domain):
+        """Services whose provider site is on 'domain' (with or without 'www.')"""
+        return self._query(
+            "SELECT s.* FROM provider_sites p JOIN services s ON s.provider_url = p.url "
+            "WHERE p.domain = ? ORDER BY s.service_name", (provider_domain(f"//{domain}"),))
+
+    def latest_extraction(self, service_key, source=None):
+        """Most recent extraction result for a service as a dict, or None"""
+        sql = "SELECT source, provider_url, result, extracted_at FROM extractions WHERE service_id = ?"
+        params = (service_key,)
+        if source is not None:
+            sql += " AND source = ?"
+            params += (source,)
+        rows = self._query(sql + " ORDER BY id DESC LIMIT 1", params)
+        return rows[0] if rows else None
+
+    def removed_services(self):
+        """IDs of services whose latest crawl no longer listed them"""
+        rows = self._query(
+            "SELECT r.service_id FROM service_removals r LEFT JOIN services s USING (service_id) "
+            "WHERE s.last_seen IS NULL OR r.removed_at > s.last_seen ORDER BY r.service_id")
+        return [row["service_id"] for row in rows]
+
+    def snapshots(self, url):
+        """Every stored version of a page, newest first"""
+        return self._query(
+            "SELECT content_hash, content, captured_at FROM page_snapshots WHERE url = ? ORDER BY captured_at DESC",
+            (url,))
+
+    def counts(self):
+        tables = ["services", "topic_memberships", "provider_sites", "page_snapshots", "extractions"]
+        return {table: self._query(f"SELECT COUNT(*) AS n FROM {table}")[0]["n"] for table in tables}
+
+def main():
+    # python service_store.py                   -> table sizes
+    # python service_store.py <service id>      -> one service with its topics and latest extraction
+    # python service_store.py --topic <topic>   -> services listed under a topic
+    # python service_store.py --domain <domain> -> services run from one provider domain
+    with ServiceStore() as store:
+        args = sys.argv[1:]
+        if not args:
+            print(json.dumps(store.counts(), indent=2))
+        elif args[0] == "--topic":
+            for s in store.services_in_topic(" ".join(args[1:])):
+                print(f"{s['service_id']}  {s['service_name']}")
+        elif args[0] == "--domain":
+            for s in store.services_for_domain(args[1]):
+                print(f"{s['service_id']}  {s['service_name']}  {s['provider_url']}")
+        else:
+            print(json.dumps(store.service(args[0]), indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
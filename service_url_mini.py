@@ -12,7 +12,84 @@ from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 import os
 from urllib.parse import urljoin, urlparse
-import re
+from fast_fetch import fetch_provider_url
+from http_cache import get_cache
+from contact_scan import scan_contacts
+from text_clean import clean_inline_text
+from keyword_classifier import KeywordClassifier
+from service_ids import service_id, canonical_service_url
+from service_store import ServiceStore
+import metrics
+
+# Configuration
+ORG_EMAIL_DOMAINS = ["protectchildren.ca", "missingkids.ca", "cybertip.ca", "needhelpnow.ca"]
+
+# Keyword tables, each compiled once into a single-pass classifier
+SKIP_TERMS = KeywordClassifier({"skip": [
+    # Navigation/Menu
+    'contact us', 'about', 'privacy', 'terms', 'accessibility',
+    'connect with us', 'facebook', 'twitter', 'youtube', 'instagram',
+    'donate', 'français', 'english', 'resources', 'press', 'media',
+    'partners', 'how can we help', 'help us find', 'en bref',
+    'conditions', 'politique', 'suivez-nous', 'zone médias',
+
+    # Generic Actions
+    'download pdf', 'learn more', 'read more', 'click here',
+    'sign up', 'newsletter', 'make a', 'order', 'careers',
+
+    # Common Headers
+    'resources', 'initiatives', 'programs', 'services',
+    'get involved', 'about us', 'contact', 'history',
+    'leadership', 'policies', 'faq', 'donation'
+]})
+
+AUDIENCE_CLASSIFIER = KeywordClassifier({kw: [kw] for kw in ['children', 'families', 'parents', 'youth', 'survivors']})
+
+SERVICE_TYPE_CLASSIFIER = KeywordClassifier({
+    'emergency': ['crisis', 'emergency', '24/7', 'urgent'],
+    'support': ['support', 'assistance', 'help'],
+    'education': ['education', 'prevention', 'training'],
+    'reporting': ['report', 'tipline', 'hotline']
+})
+
+SERVICE_CATEGORY_CLASSIFIER = KeywordClassifier({
+    'Missing Children Services': [
+        'missing', 'amber alert', 'search', 'locate', 'find', 'lost child',
+        'missingkids', 'enfants disparus'
+    ],
+    'Child Protection': [
+        'protect', 'safety', 'prevention', 'safeguard', 'secure',
+        'protection de l\'enfance', 'cybertip'
+    ],
+    'Prevention and Education': [
+        'education', 'training', 'prevention', 'workshop', 'awareness',
+        'learn', 'teach', 'program', 'resource'
+    ],
+    'Family Support Services': [
+        'family', 'support', 'assistance', 'help', 'guidance',
+        'counseling', 'aide', 'soutien'
+    ],
+    'Emergency Response': [
+        'emergency', 'crisis', '24/7', 'hotline', 'urgent', 'immediate',
+        'urgence'
+    ],
+    'Crisis Intervention': [
+        'crisis', 'intervention', 'urgent', 'emergency', 'immediate',
+        'support', 'help'
+    ],
+    'Child Safety Resources': [
+        'safety', 'resources', 'materials', 'guide', 'toolkit',
+        'information', 'tips'
+    ],
+    'Public Awareness': [
+        'awareness', 'public', 'community', 'campaign', 'outreach',
+        'education', 'inform'
+    ],
+    'Law Enforcement Collaboration': [
+        'police', 'law enforcement', 'investigation', 'report',
+        'legal', 'justice'
+    ]
+})
 
 def create_prompt():
     """Create the prompt template for LLM analysis"""
@@ -77,9 +154,18 @@ class ServiceContentExtractor:
         options.add_argument("--disable-gpu")
         options.add_argument("--window-size=1920,1080")
         options.add_argument("--enable-javascript")
-        self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+        self.driver = metrics.instrument_driver(
+            webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options))
         self.driver.set_page_load_timeout(30)
 
+    def find_provider_url_selenium(self, service_url):
+        """Read the provider website link from a 211 service page with Selenium"""
+        self.driver.get(service_url)
+        website_links = WebDriverWait(self.driver, 10).until(
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".record-detail-content a[target='_blank']"))
+        )
+        return next((link.get_attribute('href') for link in website_links), None)
+
     def is_valid_url(self, url, base_domain):
         """Check if URL is valid and belongs to the organization"""
         if not url:
@@ -133,37 +219,14 @@ class ServiceContentExtractor:
         """Remove HTML tags and clean up text"""
         if not text:
             return ""
-        # Remove HTML tags
-        text = re.sub(r'<[^>]+>', '', text)
-        # Clean up whitespace
-        text = ' '.join(text.split())
-        return text.strip()
+        return clean_inline_text(text)
 
     def clean_service_text(self, text):
         """Clean and validate service text"""
         text = text.strip()
-        # Expanded list of terms to skip
-        skip_terms = [
-            # Navigation/Menu
-            'contact us', 'about', 'privacy', 'terms', 'accessibility', 
-            'connect with us', 'facebook', 'twitter', 'youtube', 'instagram',
-            'donate', 'français', 'english', 'resources', 'press', 'media',
-            'partners', 'how can we help', 'help us find', 'en bref',
-            'conditions', 'politique', 'suivez-nous', 'zone médias',
-            
-            # Generic Actions
-            'download pdf', 'learn more', 'read more', 'click here',
-            'sign up', 'newsletter', 'make a', 'order', 'careers',
-            
-            # Common Headers
-            'resources', 'initiatives', 'programs', 'services',
-            'get involved', 'about us', 'contact', 'history',
-            'leadership', 'policies', 'faq', 'donation'
-        ]
-        
         # Skip if any of these conditions are met
         if (len(text) < 5 or  # too short
-            any(term in text.lower() for term in skip_terms) or  # contains skip terms
+            SKIP_TERMS.matches_any(text) or  # contains skip terms
             '\n' in text or  # contains newlines
             text.isupper() or  # all uppercase (likely a header)
             len(text.split()) > 10 or  # too long to be a service name
@@ -189,6 +252,7 @@ class ServiceContentExtractor:
                     'email': '',
                     'emergency_contact': ''
                 },
+                'hours': '',
                 'target_audience': [],
                 'service_type': ''
             }
@@ -204,41 +268,6 @@ class ServiceContentExtractor:
                 except:
                     continue
             
-            # Better service extraction
-            def clean_service_text(text):
-                """Clean and validate service text"""
-                text = text.strip()
-                # Expanded list of terms to skip
-                skip_terms = [
-                    # Navigation/Menu
-                    'contact us', 'about', 'privacy', 'terms', 'accessibility', 
-                    'connect with us', 'facebook', 'twitter', 'youtube', 'instagram',
-                    'donate', 'français', 'english', 'resources', 'press', 'media',
-                    'partners', 'how can we help', 'help us find', 'en bref',
-                    'conditions', 'politique', 'suivez-nous', 'zone médias',
-                    
-                    # Generic Actions
-                    'download pdf', 'learn more', 'read more', 'click here',
-                    'sign up', 'newsletter', 'make a', 'order', 'careers',
-                    
-                    # Common Headers
-                    'resources', 'initiatives', 'programs', 'services',
-                    'get involved', 'about us', 'contact', 'history',
-                    'leadership', 'policies', 'faq', 'donation'
-                ]
-                
-                # Skip if any of these conditions are met
-                if (len(text) < 5 or  # too short
-                    any(term in text.lower() for term in skip_terms) or  # contains skip terms
-                    '\n' in text or  # contains newlines
-                    text.isupper() or  # all uppercase (likely a header)
-                    len(text.split()) > 10 or  # too long to be a service name
-                    text.startswith('http') or  # URLs
-                    not any(c.isalpha() for c in text)):  # no letters
-                    return None
-                
-                return text
-
             # Extract key services from bullet points and lists
             service_selectors = [
                 '.services li', '.programs li', '.initiatives li',
@@ -249,27 +278,17 @@ class ServiceContentExtractor:
             for selector in service_selectors:
                 services = self.driver.find_elements(By.CSS_SELECTOR, selector)
                 for service in services:
-                    text = clean_service_text(service.text)
+                    text = self.clean_service_text(service.text)
                     if text and text not in seen_services:
                         seen_services.add(text)
                         details['key_services'].append(text)
             
             # Extract target audience
-            audience_keywords = ['children', 'families', 'parents', 'youth', 'survivors']
-            page_text = self.driver.page_source.lower()
-            details['target_audience'] = [kw for kw in audience_keywords if kw in page_text]
+            page_source = self.driver.page_source  # One WebDriver round trip for every text scan below
+            details['target_audience'] = AUDIENCE_CLASSIFIER.classify(page_source)
             
             # Determine service type
-            service_types = {
-                'emergency': ['crisis', 'emergency', '24/7', 'urgent'],
-                'support': ['support', 'assistance', 'help'],
-                'education': ['education', 'prevention', 'training'],
-                'reporting': ['report', 'tipline', 'hotline']
-            }
-            for stype, keywords in service_types.items():
-                if any(kw in page_text for kw in keywords):
-                    details['service_type'] = stype
-                    break
+            details['service_type'] = SERVICE_TYPE_CLASSIFIER.first(page_source)
             
             # Get concise description (limit to first 2-3 paragraphs)
             desc_selectors = ['.description', '.content p', '#main-content p', 'article p']
@@ -280,41 +299,12 @@ class ServiceContentExtractor:
                     details['description'] = description
                     break
             
-            # Better email extraction
-            email_pattern = r'\b[A-Za-z0-9._%+-]+@(?:protectchildren|missingkids|cybertip|needhelpnow)\.ca\b'
-            page_text = self.driver.page_source
-            emails = re.findall(email_pattern, page_text)
-            if emails:
-                # Filter out hashed/obfuscated emails
-                valid_emails = [e for e in emails if not re.match(r'^[a-f0-9]{32}@', e)]
-                if valid_emails:
-                    details['contact']['email'] = valid_emails[0]
-
-            # Better phone extraction
-            phone_patterns = [
-                r'1-(?:\d{3}[-.)]\s*)+\d{4}',  # 1-800 style
-                r'(?:\(\d{3}\)|\d{3})[-.\s]\d{3}[-.\s]\d{4}',  # (xxx) xxx-xxxx
-                r'\b\d{3}[-.\s]\d{3}[-.\s]\d{4}\b'  # xxx-xxx-xxxx
-            ]
-            for pattern in phone_patterns:
-                phones = re.findall(pattern, self.driver.page_source)
-                if phones:
-                    details['contact']['phone'] = phones[0]
-                    break
-
-            # Better emergency contact detection
-            emergency_contexts = [
-                (r'(?:24/7|emergency|crisis).*?(?:\d{3}[-.\s]\d{3}[-.\s]\d{4}|\(\d{3}\)[.\s]\d{3}[-.\s]\d{4}|1-\d{3}[-.\s]\d{3}[-.\s]\d{4})',
-                 r'toll[- ]free.*?(?:\d{3}[-.\s]\d{3}[-.\s]\d{4}|\(\d{3}\)[.\s]\d{3}[-.\s]\d{4}|1-\d{3}[-.\s]\d{3}[-.\s]\d{4})')
-            ]
-            for patterns in emergency_contexts:
-                for pattern in patterns:
-                    matches = re.findall(pattern, self.driver.page_source, re.I | re.S)
-                    if matches:
-                        details['contact']['emergency_contact'] = matches[0].strip()
-                        break
-                if details['contact']['emergency_contact']:
-                    break
+            # Phones, emails, emergency line and hours in a single pass over the page
+            contacts = scan_contacts(page_source, email_domains=ORG_EMAIL_DOMAINS)
+            details['contact']['email'] = contacts['email']
+            details['contact']['phone'] = contacts['phone']
+            details['contact']['emergency_contact'] = contacts['emergency']
+            details['hours'] = contacts['hours']
 
             # Clean emergency contact
             if details['contact']['emergency_contact']:
@@ -353,15 +343,8 @@ class ServiceContentExtractor:
             row = df.iloc[0]
             print(f"\nProcessing main service: {row['service_name']}")
             
-            # Get the main service page
-            self.driver.get(row['service_url'])
-            time.sleep(2)
-            
-            # Get the provider website
-            website_links = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".record-detail-content a[target='_blank']"))
-            )
-            provider_url = next((link.get_attribute('href') for link in website_links), None)
+            # Get the provider website from the main service page (HTTP first, Selenium fallback)
+            provider_url = fetch_provider_url(row['service_url'], self.find_provider_url_selenium)
             
             if not provider_url:
                 print("No provider URL found")
@@ -380,53 +363,7 @@ class ServiceContentExtractor:
             # Add service categorization
             def categorize_service(name, description):
                 """Categorize service based on name and description"""
-                categories = set()  # Use set to avoid duplicates
-                category_keywords = {
-                    'Missing Children Services': [
-                        'missing', 'amber alert', 'search', 'locate', 'find', 'lost child',
-                        'missingkids', 'enfants disparus'
-                    ],
-                    'Child Protection': [
-                        'protect', 'safety', 'prevention', 'safeguard', 'secure', 
-                        'protection de l\'enfance', 'cybertip'
-                    ],
-                    'Prevention and Education': [
-                        'education', 'training', 'prevention', 'workshop', 'awareness',
-                        'learn', 'teach', 'program', 'resource'
-                    ],
-                    'Family Support Services': [
-                        'family', 'support', 'assistance', 'help', 'guidance',
-                        'counseling', 'aide', 'soutien'
-                    ],
-                    'Emergency Response': [
-                        'emergency', 'crisis', '24/7', 'hotline', 'urgent', 'immediate',
-                        'urgence', 'crisis'
-                    ],
-                    'Crisis Intervention': [
-                        'crisis', 'intervention', 'urgent', 'emergency', 'immediate',
-                        'support', 'help'
-                    ],
-                    'Child Safety Resources': [
-                        'safety', 'resources', 'materials', 'guide', 'toolkit',
-                        'information', 'tips'
-                    ],
-                    'Public Awareness': [
-                        'awareness', 'public', 'community', 'campaign', 'outreach',
-                        'education', 'inform'
-                    ],
-                    'Law Enforcement Collaboration': [
-                        'police', 'law enforcement', 'investigation', 'report',
-                        'legal', 'justice'
-                    ]
-                }
-                
-                # Combine name and description, convert to lowercase for matching
-                combined_text = (name + ' ' + description).lower()
-                
-                # Check each category's keywords
-                for category, keywords in category_keywords.items():
-                    if any(keyword.lower() in combined_text for keyword in keywords):
-                        categories.add(category)
+                categories = set(SERVICE_CATEGORY_CLASSIFIER.classify(name + ' ' + description))
                 
                 # Always include these categories for this specific service
                 default_categories = {
@@ -513,6 +450,13 @@ class ServiceContentExtractor:
             
             print("\nProcessing complete! Results saved to service_data/service_analysis.json")
             
+            # The JSON file is overwritten every run; the store keeps each run's result
+            key = service_id(row['service_url']) or canonical_service_url(row['service_url'])
+            with ServiceStore() as store:
+                store.add_memberships([row.to_dict()])
+                store.add_provider(key, provider_url)
+                store.add_extraction(key, "initiatives", service_data, provider_url)
+            
             # Save the LLM prompt
             save_for_llm(service_data)
             
@@ -522,7 +466,9 @@ class ServiceContentExtractor:
             traceback.print_exc()  # Print full traceback for better debugging
         
         finally:
+            get_cache().print_summary()
             self.driver.quit()
+            metrics.export()
 
 def main():
     extractor = ServiceContentExtractor()
@@ -2,7 +2,6 @@ import pandas as pd
 import time
 import json
 import requests
-from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
@@ -10,22 +9,148 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
+from contextlib import contextmanager
 from datetime import datetime
 import os
+import sys
+from dotenv import load_dotenv
+from fast_fetch import fetch_provider_url, stats as fetch_stats
+from service_ids import dedupe_services, fan_out
+from catalog_store import CATALOG_CSV, load_rows
+from provider_fetch import fetch_provider_sites
+from text_clean import clean_page_text
+from http_cache import cached_get, get_cache
+from llm_cache import LLMCache, template_version
+from llm_client import LLMClient, parse_json_content
+from chunking import chunk_cache_texts, chunk_text, merge_extractions, strip_site_boilerplate
+from ensemble import ModelEnsemble, merge_voted
+from journal import Journal, JOURNAL_PATH, completed_ids, load_results
+from service_store import ServiceStore
+import metrics
+from metrics import CLEANED_TEXT_CHARS, JSON_PARSE_FAILURES, domain_of, span, tags
 
 # Configuration
-DEEPSEEK_API_KEY = "your_api_key_here"  # Replace with your DeepSeek API key
-BACKUP_DIR = "backups"
+load_dotenv()
+DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")  # Same variable LLMClient("deepseek") reads
+OUTPUT_CSV = "services_with_ai_analysis.csv"
+OUTPUT_PARQUET = "services_with_ai_analysis.parquet"
 DELAY_BETWEEN_REQUESTS = 2  # Seconds between requests
 MAX_RETRIES = 3  # Maximum number of retry attempts
+FETCH_BATCH_SIZE = 100  # Provider sites fetched concurrently per batch
+DEEPSEEK_CHUNK_TOKENS = 8000  # Page tokens per analysis call; longer pages are chunked, not truncated
 
-# Ensure backup directory exists
-os.makedirs(BACKUP_DIR, exist_ok=True)
+DEEPSEEK_MODEL = "deepseek-chat"
+DEEPSEEK_TEMPERATURE = 0.3
+DEEPSEEK_SYSTEM_PROMPT = "You are an expert at analyzing social service websites and extracting structured information."
+
+DEEPSEEK_PROMPT_TEMPLATE = """
+Analyze this service provider's website content and extract detailed information.
+Service Provider: {service_name}
+
+Website Content:
+{website_content}
+
+Extract and provide the following information in a structured JSON format:
+{{
+    "services": {{
+        "main_programs": [],
+        "description": "",
+        "special_services": []
+    }},
+    "eligibility": {{
+        "requirements": [],
+        "restrictions": [],
+        "documentation_needed": []
+    }},
+    "location": {{
+        "address": "",
+        "service_area": "",
+        "accessibility": ""
+    }},
+    "contact": {{
+        "phone": "",
+        "email": "",
+        "website": "",
+        "social_media": []
+    }},
+    "hours": {{
+        "regular_hours": "",
+        "special_hours": "",
+        "holidays": ""
+    }},
+    "costs": {{
+        "fee_structure": "",
+        "payment_methods": [],
+        "financial_assistance": ""
+    }},
+    "application": {{
+        "process": [],
+        "required_documents": [],
+        "waiting_period": ""
+    }},
+    "languages": {{
+        "service_languages": [],
+        "translation_available": ""
+    }}
+}}
+
+Rules:
+1. Use "Not specified" for missing information
+2. Keep responses factual and based on the provided content
+3. Include all relevant details found in the text
+4. Maintain the exact JSON structure shown above
+"""
+# The JSON skeleton in the prompt, used to spot sections a completion is missing
+DEEPSEEK_SCHEMA = parse_json_content(DEEPSEEK_PROMPT_TEMPLATE.format(service_name="", website_content=""))
+
+# Follow-up for sections missing from (or cut off in) the first answer
+DEEPSEEK_MISSING_TEMPLATE = """
+Analyze this service provider's website content and extract only the sections below.
+Service Provider: {service_name}
+
+Website Content:
+{website_content}
+
+Provide exactly these sections in a structured JSON format:
+{sections}
+
+Rules:
+1. Use "Not specified" for missing information
+2. Keep responses factual and based on the provided content
+3. Maintain the exact JSON structure shown above
+"""
+
+# Bump DEEPSEEK_PROMPT_BASE_VERSION when the prompt's meaning changes; edits to the text
+# are also picked up by the fingerprint and invalidate cached completions either way
+DEEPSEEK_PROMPT_BASE_VERSION = "1"
+DEEPSEEK_PROMPT_VERSION = template_version(
+    DEEPSEEK_PROMPT_BASE_VERSION, DEEPSEEK_SYSTEM_PROMPT + DEEPSEEK_PROMPT_TEMPLATE
+)
+
+@contextmanager
+def service_trace(service, name, provider_url=None):
+    """Span for one step of a service, with its topic and provider domain as metric labels"""
+    topic = service['topics'][0][0] if service.get('topics') else None
+    with tags(topic=topic, domain=domain_of(provider_url)), \
+            span(name, trace_id=service['service_id'], service_name=service['service_name'], provider_url=provider_url):
+        yield
+
+def record_extraction(store, service_key, details):
+    """Store a service's analysis, and its field confidence when an ensemble voted on it"""
+    store.add_extraction(service_key, "deepseek_analysis", details['ai_analysis'], details['provider_url'])
+    if details.get('field_confidence'):
+        store.add_extraction(service_key, "field_confidence", details['field_confidence'], details['provider_url'])
 
 class ServiceScraper:
     def __init__(self):
-        self.setup_driver()
+        self.driver = None  # Started on first use; most detail pages are served over HTTP
         self.session = requests.Session()
+        self.llm_client = LLMClient("deepseek", api_key=DEEPSEEK_API_KEY)
+        self.llm_cache = LLMCache()
+        self.llm_cache.register_template("deepseek_analysis", DEEPSEEK_PROMPT_VERSION)
+        # Set when ENSEMBLE_MODELS lists two or more models; DeepSeek reuses the client above
+        self.ensemble = ModelEnsemble.from_env("deepseek_analysis", DEEPSEEK_PROMPT_VERSION, self.llm_cache,
+                                               DEEPSEEK_SCHEMA, clients={"deepseek": self.llm_client})
         
     def setup_driver(self):
         """Initialize the Chrome WebDriver with appropriate options"""
@@ -34,29 +159,32 @@ class ServiceScraper:
         options.add_argument("--disable-gpu")
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-dev-shm-usage")
-        self.driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+        self.driver = metrics.instrument_driver(
+            webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options))
+
+    def get_driver(self):
+        """Return the WebDriver, starting it the first time it's needed"""
+        if self.driver is None:
+            self.setup_driver()
+        return self.driver
+
+    def find_provider_url_selenium(self, service_url):
+        """Read the provider website link from a 211 service page with Selenium"""
+        driver = self.get_driver()
+        driver.get(service_url)
+        website_links = WebDriverWait(driver, 10).until(
+            EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".record-detail-content a[target='_blank']"))
+        )
+        return next((link.get_attribute('href') for link in website_links), None)
         
     def get_website_content(self, url, max_retries=MAX_RETRIES):
         """Fetch and clean website content with retry mechanism"""
         for attempt in range(max_retries):
             try:
-                response = self.session.get(url, timeout=30)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Remove unwanted elements
-                for element in soup(['script', 'style', 'nav', 'footer', 'iframe']):
-                    element.decompose()
-                
-                # Get text content
-                text = soup.get_text(separator='\n', strip=True)
-                
-                # Clean and normalize text
-                lines = [line.strip() for line in text.splitlines() if line.strip()]
-                cleaned_text = '\n'.join(lines)
-                
-                return cleaned_text[:15000]  # Limit content length for API
+                # Served from the on-disk cache or revalidated with a conditional GET
+                text = clean_page_text(cached_get(self.session, url, timeout=30))
+                CLEANED_TEXT_CHARS.observe(len(text), domain=domain_of(url))
+                return text
                 
             except Exception as e:
                 if attempt == max_retries - 1:
@@ -66,188 +194,246 @@ class ServiceScraper:
                 
         return None
 
-    def analyze_with_deepseek(self, website_content, service_name):
-        """Analyze website content using DeepSeek Chat API"""
+    def analyze_with_deepseek(self, website_content, service_name, source_text=None):
+        """
+        Analyze website content using DeepSeek Chat API.
+        Pages over the input budget are split into chunks whose extractions are merged.
+        source_text is the page before cross-page boilerplate stripping; see chunk_cache_texts.
+        """
         if not website_content:
             return None
             
-        try:
-            API_URL = "https://api.deepseek.com/v1/chat/completions"
+        chunks = chunk_text(website_content, DEEPSEEK_CHUNK_TOKENS, DEEPSEEK_MODEL)
+        cache_texts = chunk_cache_texts(service_name, chunks, source_text)
+        if len(chunks) == 1:
+            return self.analyze_chunk(chunks[0], service_name, cache_texts[0])
             
-            prompt = f"""
-            Analyze this service provider's website content and extract detailed information.
-            Service Provider: {service_name}
-
-            Website Content:
-            {website_content}
-
-            Extract and provide the following information in a structured JSON format:
-            {{
-                "services": {{
-                    "main_programs": [],
-                    "description": "",
-                    "special_services": []
-                }},
-                "eligibility": {{
-                    "requirements": [],
-                    "restrictions": [],
-                    "documentation_needed": []
-                }},
-                "location": {{
-                    "address": "",
-                    "service_area": "",
-                    "accessibility": ""
-                }},
-                "contact": {{
-                    "phone": "",
-                    "email": "",
-                    "website": "",
-                    "social_media": []
-                }},
-                "hours": {{
-                    "regular_hours": "",
-                    "special_hours": "",
-                    "holidays": ""
-                }},
-                "costs": {{
-                    "fee_structure": "",
-                    "payment_methods": [],
-                    "financial_assistance": ""
-                }},
-                "application": {{
-                    "process": [],
-                    "required_documents": [],
-                    "waiting_period": ""
-                }},
-                "languages": {{
-                    "service_languages": [],
-                    "translation_available": ""
-                }}
-            }}
-
-            Rules:
-            1. Use "Not specified" for missing information
-            2. Keep responses factual and based on the provided content
-            3. Include all relevant details found in the text
-            4. Maintain the exact JSON structure shown above
-            """
-
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-            }
+        print(f"Analyzing {service_name} in {len(chunks)} chunks")
+        extractions = []
+        for chunk, cache_text in zip(chunks, cache_texts):
+            parsed = parse_json_content(self.analyze_chunk(chunk, service_name, cache_text))
+            if parsed is not None:
+                extractions.append(parsed)
+        if not extractions:
+            return None
+        return json.dumps(merge_extractions(extractions), indent=2, ensure_ascii=False)
 
-            response = self.session.post(
-                API_URL,
-                headers=headers,
-                json={
-                    "model": "deepseek-chat",
-                    "messages": [
-                        {"role": "system", "content": "You are an expert at analyzing social service websites and extracting structured information."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 2000
-                }
-            )
+    def analyze_chunk(self, website_content, service_name, cache_text=None):
+        """
+        Run one DeepSeek analysis call for content that fits the input budget.
+        The completion is streamed and parsed as it arrives; sections missing
+        from it are asked for once more on their own. Returns the analysis as
+        a JSON string, or None if nothing usable came back.
+        """
+        # Identical page text under the same model and prompt version is answered from the cache
+        cache_text = cache_text or f"{service_name}\n{website_content}"
+        cached = self.llm_cache.get(DEEPSEEK_MODEL, DEEPSEEK_TEMPERATURE, "deepseek_analysis",
+                                    DEEPSEEK_PROMPT_VERSION, cache_text)
+        if cached is not None:
+            return cached
+
+        def make_messages(schema):
+            if schema is DEEPSEEK_SCHEMA:
+                prompt = DEEPSEEK_PROMPT_TEMPLATE.format(service_name=service_name, website_content=website_content)
+            else:
+                prompt = DEEPSEEK_MISSING_TEMPLATE.format(service_name=service_name, website_content=website_content,
+                                                          sections=json.dumps(schema, indent=4))
+            return [
+                {"role": "system", "content": DEEPSEEK_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ]
 
-            response.raise_for_status()
-            return response.json()['choices'][0]['message']['content']
+        try:
+            # Rate-limited and retried by the shared client
+            analysis, missing = self.llm_client.extract_json(
+                make_messages, DEEPSEEK_SCHEMA,
+                model=DEEPSEEK_MODEL,
+                temperature=DEEPSEEK_TEMPERATURE,
+                max_tokens=2000
+            )
+            if not analysis:
+                JSON_PARSE_FAILURES.inc(source="deepseek_analysis")
+                return None
+            content = json.dumps(analysis, indent=2, ensure_ascii=False)
+            # Incomplete answers are not cached, so the next run asks again
+            if not missing:
+                self.llm_cache.put(DEEPSEEK_MODEL, DEEPSEEK_TEMPERATURE, "deepseek_analysis",
+                                   DEEPSEEK_PROMPT_VERSION, cache_text, content)
+            return content
 
         except Exception as e:
             print(f"Error in DeepSeek analysis: {str(e)}")
             return None
 
-    def extract_service_details(self, row):
-        """Extract service details from 211 page and provider website"""
+    def analyze_with_ensemble(self, website_content, service_name, source_text=None):
+        """
+        The DeepSeek analysis prompt sent to every ensemble model and voted per field.
+        Returns (analysis JSON, field confidence JSON), or (None, None) if no model answered.
+        """
+        if not website_content:
+            return None, None
+
+        results = []
+        chunks = chunk_text(website_content, DEEPSEEK_CHUNK_TOKENS, DEEPSEEK_MODEL)
+        for chunk, cache_text in zip(chunks, chunk_cache_texts(service_name, chunks, source_text)):
+            prompt = DEEPSEEK_PROMPT_TEMPLATE.format(service_name=service_name, website_content=chunk)
+            results.append(self.ensemble.extract(
+                [
+                    {"role": "system", "content": DEEPSEEK_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                cache_text,
+                temperature=DEEPSEEK_TEMPERATURE,
+                max_tokens=2000
+            ))
+        analysis, confidence = merge_voted(results)
+        if not analysis:
+            return None, None
+        return json.dumps(analysis, indent=2, ensure_ascii=False), json.dumps(confidence, ensure_ascii=False)
+
+    def resolve_provider_url(self, service):
+        """find_provider_url for one deduplicated service, traced under its service ID"""
+        with service_trace(service, "resolve_provider"):
+            provider_url = self.find_provider_url(service)
+            metrics.tracer.annotate(provider_url=provider_url)
+            return provider_url
+
+    def find_provider_url(self, row):
+        """Extract provider website URL from the 211 service page (HTTP first, Selenium fallback)"""
         try:
-            # Get the 211 service page
-            self.driver.get(row['service_url'])
-            time.sleep(DELAY_BETWEEN_REQUESTS)
-            
-            # Extract provider website URL
-            website_links = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".record-detail-content a[target='_blank']"))
-            )
-            provider_url = next((link.get_attribute('href') for link in website_links), None)
+            return fetch_provider_url(row['service_url'], self.find_provider_url_selenium)
+        except Exception as e:
+            print(f"Error finding provider URL for {row['service_url']}: {str(e)}")
+            return None
+
+    def extract_service_details(self, row, provider_url=None, website_content=None, source_text=None):
+        """
+        Extract service details from 211 page and provider website.
+        When provider_url is given, website_content is taken as already fetched
+        (None meaning the fetch failed) instead of being downloaded again.
+        source_text is the page before cross-page boilerplate stripping, used for cache keys.
+        """
+        try:
+            prefetched = provider_url is not None
+            if not prefetched:
+                provider_url = self.find_provider_url(row)
             
             if not provider_url:
                 print(f"No provider URL found for service: {row['service_name']}")
                 return None
                 
             # Get and analyze website content
-            website_content = self.get_website_content(provider_url)
-            ai_analysis = self.analyze_with_deepseek(website_content, row['service_name'])
+            if not prefetched:
+                website_content = self.get_website_content(provider_url)
+            if self.ensemble is not None:
+                ai_analysis, field_confidence = self.analyze_with_ensemble(
+                    website_content, row['service_name'], source_text=source_text)
+            else:
+                ai_analysis = self.analyze_with_deepseek(website_content, row['service_name'], source_text=source_text)
+                field_confidence = None
             
-            return {
+            details = {
                 'provider_url': provider_url,
                 'ai_analysis': ai_analysis,
                 'scrape_timestamp': datetime.now().isoformat()
             }
+            if field_confidence:
+                details['field_confidence'] = field_confidence
+            return details
             
         except Exception as e:
             print(f"Error processing {row['service_url']}: {str(e)}")
             return None
 
-    def save_progress(self, data, filename):
-        """Save current progress to CSV with timestamp"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = os.path.join(BACKUP_DIR, f"{filename}_{timestamp}.csv")
-        
+    def write_outputs(self, rows, journal_path=JOURNAL_PATH):
+        """Materialize the final CSV (and Parquet when available) from the journal in one pass"""
+        final_df = pd.DataFrame(fan_out(rows, load_results(journal_path)))
+        final_df.to_csv(OUTPUT_CSV, index=False)
+        print(f"Results saved to {OUTPUT_CSV}")
         try:
-            df = pd.DataFrame(data)
-            df.to_csv(backup_file, index=False)
-            print(f"Progress saved to {backup_file}")
-        except Exception as e:
-            print(f"Error saving progress: {str(e)}")
+            final_df.to_parquet(OUTPUT_PARQUET, index=False)
+            print(f"Results saved to {OUTPUT_PARQUET}")
+        except ImportError:
+            pass  # pyarrow/fastparquet not installed; the CSV is the canonical output
 
-    def process_services(self, input_csv):
-        """Main processing function"""
+    def process_services(self, input_csv, resume=True, journal_path=JOURNAL_PATH):
+        """
+        Main processing function.
+        Every completed service is appended to the journal; with 'resume', services
+        already in the journal are skipped, so an interrupted run picks up where it stopped.
+        """
+        rows = []
+        journal = Journal(journal_path)
+        store = ServiceStore()
         try:
-            # Read input CSV
-            df = pd.read_csv(input_csv)
-            print(f"Processing {len(df)} services...")
+            # Read the catalog (columnar store when current) and collapse topic rows into one record per 211 service ID
+            rows = load_rows(input_csv)
+            services = dedupe_services(rows)
+            store.add_memberships(rows)
             
-            all_results = []
+            journal.open(fresh=not resume)
+            done = completed_ids(journal_path) if resume else set()
+            pending = [s for s in services if s['service_id'] not in done]
+            print(f"Processing {len(pending)} of {len(services)} unique services "
+                  f"({len(rows)} topic rows, {len(services) - len(pending)} already in journal)...")
             
-            for index, row in df.iterrows():
-                print(f"\nProcessing {index + 1}/{len(df)}: {row['service_name']}")
+            for batch_start in range(0, len(pending), FETCH_BATCH_SIZE):
+                batch = pending[batch_start:batch_start + FETCH_BATCH_SIZE]
                 
-                # Extract service details
-                details = self.extract_service_details(row)
+                # Resolve provider URLs, then fetch all provider sites in the batch concurrently
+                provider_urls = {s['service_id']: self.resolve_provider_url(s) for s in batch}
+                pages = fetch_provider_sites(list(provider_urls.values()))
+                # Drop menus, cookie notices and footers shared by pages of the same site. What
+                # counts as shared depends on the batch, so cache keys use each page's own text
+                contents = strip_site_boilerplate(pages)
+                for service in batch:
+                    provider_url = provider_urls[service['service_id']]
+                    store.add_provider(service['service_id'], provider_url)
+                    store.add_snapshot(provider_url, pages.get(provider_url))
                 
-                if details:
-                    # Combine original data with new details
-                    result = {
-                        **row.to_dict(),
-                        **details
-                    }
-                    all_results.append(result)
-                    
-                    # Save progress every 10 items
-                    if (index + 1) % 10 == 0:
-                        self.save_progress(all_results, "interim_results")
+                # Analyze the batch concurrently under the LLM client's rate budgets
+                def analyze(service):
+                    provider_url = provider_urls[service['service_id']]
+                    if not provider_url:
+                        print(f"No provider URL found for service: {service['service_name']}")
+                        return None
+                    with service_trace(service, "analyze", provider_url):
+                        return self.extract_service_details(service, provider_url, contents.get(provider_url),
+                                                            source_text=pages.get(provider_url))
+                batch_details = self.llm_client.map(analyze, batch)
                 
-                # Add delay between processing
-                time.sleep(DELAY_BETWEEN_REQUESTS)
+                for offset, (service, details) in enumerate(zip(batch, batch_details)):
+                    index = batch_start + offset
+                    print(f"\nProcessed {index + 1}/{len(pending)}: {service['service_name']} "
+                          f"({len(service['topics'])} topic memberships)")
+                    
+                    # Only successful analyses are journaled; failures are retried on resume
+                    if details and details.get('ai_analysis'):
+                        journal.append(service['service_id'], details)
+                        record_extraction(store, service['service_id'], details)
             
-            # Save final results
-            final_df = pd.DataFrame(all_results)
-            final_df.to_csv('services_with_ai_analysis.csv', index=False)
-            print("\nProcessing complete! Results saved to services_with_ai_analysis.csv")
+            journal.close()
+            self.write_outputs(rows, journal_path)
+            print("\nProcessing complete!")
             
         except Exception as e:
             print(f"Error in main processing: {str(e)}")
-            # Save whatever results we have
-            if all_results:
-                self.save_progress(all_results, "emergency_backup")
+            print(f"Completed services are kept in {journal_path}; re-run to resume.")
         
         finally:
-            self.driver.quit()
+            journal.close()
+            store.close()
+            metrics.export()
+            fetch_stats.print_summary()
+            get_cache().print_summary()
+            self.llm_cache.print_summary()
+            if self.driver is not None:
+                self.driver.quit()
 
 def main():
     scraper = ServiceScraper()
-    scraper.process_services('all_services_output.csv')
+    # Resumes from the journal by default; --fresh starts a new one
+    scraper.process_services(CATALOG_CSV, resume="--fresh" not in sys.argv)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,56 @@
+import json
+
+from ensemble import ModelEnsemble, _vote_list, vote
+from json_stream import StreamingJSONParser
+from llm_cache import LLMCache
+
+SCHEMA = {"name": "", "languages": []}
+
+
+class FakeClient:
+    def __init__(self, completion):
+        self.completion = completion
+
+    def complete_json(self, messages, model, temperature, max_tokens):
+        parser = StreamingJSONParser()
+        parser.feed(self.completion)
+        return parser
+
+
+def test_unsupported_list_falls_back_to_the_first_model_that_named_items():
+    answers = [(0, None), (1, ["English"]), (2, ["French"])]
+    assert _vote_list(answers, quorum=2) == (["English"], [1], (1, 0))
+
+
+def make_ensemble(tmp_path, completion):
+    cache = LLMCache(path=str(tmp_path / "llm_cache.sqlite"))
+    return ModelEnsemble([("a", "model-a"), ("b", "model-b")], "test", "1", cache, SCHEMA,
+                         clients={"a": FakeClient(completion), "b": FakeClient(completion)})
+
+
+def test_answers_missing_required_fields_are_not_cached(tmp_path):
+    ensemble = make_ensemble(tmp_path, json.dumps({"name": "Food Bank"}))
+    assert ensemble._ask(0, [], "page", 0, None) == {"name": "Food Bank"}
+    assert ensemble.cache.get("model-a", 0, "test", "1", "page") is None
+
+
+def test_complete_answers_are_cached(tmp_path):
+    completion = json.dumps({"name": "Food Bank", "languages": ["English"]})
+    ensemble = make_ensemble(tmp_path, completion)
+    ensemble._ask(0, [], "page", 0, None)
+    assert ensemble.cache.get("model-a", 0, "test", "1", "page") == completion
+
+
+def test_placeholders_never_outvote_a_real_value():
+    values, outcome = vote([(0, {"contact.phone": "Not specified"}), (1, {"contact.phone": "416-555-1234"})], 2)
+    assert values["contact.phone"] == "416-555-1234"
+
+    answers = [(0, {"contact.phone": None}), (1, {"contact.phone": "Not specified"}), (2, {"contact.phone": "416-555-1234"})]
+    values, outcome = vote(answers, 2)
+    assert values["contact.phone"] == "416-555-1234"
+
+
+def test_a_field_only_placeholders_answered_is_not_settled_early():
+    values, outcome = vote([(0, {"contact.phone": None}), (1, {"contact.phone": "Not specified"})], 2, pending=1)
+    assert values["contact.phone"] is None
+    assert outcome["contact.phone"] == ([0, 1], False)
@@ -0,0 +1,23 @@
+import fast_fetch
+
+RECORD_WITH_LINK = '<div class="record-detail-content"><a target="_blank" href="https://a.org/">Website</a></div>'
+RECORD_WITHOUT_LINK = '<div class="record-detail-content"><p>Call 416-555-1234</p></div>'
+CLIENT_RENDERED = '<div id="app"></div>'
+
+def resolve(monkeypatch, html):
+    calls = []
+    monkeypatch.setattr(fast_fetch, "fetch_html", lambda url, **kwargs: html)
+    def fallback(url):
+        calls.append(url)
+        return "https://from-selenium.org/"
+    return fast_fetch.fetch_provider_url("https://211ontario.ca/service/1/x/", fallback), calls
+
+def test_provider_link_in_markup(monkeypatch):
+    assert resolve(monkeypatch, RECORD_WITH_LINK) == ("https://a.org/", [])
+
+def test_rendered_record_without_website_skips_selenium(monkeypatch):
+    assert resolve(monkeypatch, RECORD_WITHOUT_LINK) == (None, [])
+
+def test_missing_record_falls_back_to_selenium(monkeypatch):
+    url, calls = resolve(monkeypatch, CLIENT_RENDERED)
+    assert url == "https://from-selenium.org/" and len(calls) == 1
@@ -0,0 +1,66 @@
+import os
+from http_cache import HTTPCache, cached_get
+
+
+def test_running_total_tracks_stores_and_evictions(tmp_path):
+    cache = HTTPCache(cache_dir=str(tmp_path), max_bytes=250)
+    cache.store("https://a.org/1", b"x" * 100)
+    cache.store("https://a.org/2", b"x" * 100)  # Same body as /1: stored and counted once
+    cache.store("https://a.org/3", b"y" * 100)
+    assert cache.total_bytes == 200 == cache._total_bytes()
+
+    cache.store("https://a.org/3", b"z" * 120)  # Replaces /3's body
+    assert cache.total_bytes == 220 == cache._total_bytes()
+
+    # Over budget: least recently used entries go until the total fits
+    cache.store("https://a.org/4", b"w" * 100)
+    assert cache.total_bytes == cache._total_bytes() <= 250
+    assert cache.lookup("https://a.org/4") is not None
+    assert cache.lookup("https://a.org/1") is None
+
+
+def test_total_is_read_back_when_the_cache_is_reopened(tmp_path):
+    HTTPCache(cache_dir=str(tmp_path)).store("https://a.org/1", b"x" * 100)
+    assert HTTPCache(cache_dir=str(tmp_path)).total_bytes == 100
+
+
+def test_store_rewrites_a_body_evicted_before_its_entry_was_inserted(tmp_path, monkeypatch):
+    cache = HTTPCache(cache_dir=str(tmp_path))
+    write = cache._write_object
+
+    def write_then_lose(path, body):
+        write(path, body)
+        if not hasattr(cache, "raced"):
+            cache.raced = True
+            os.remove(path)  # What a concurrent evict() of the same, unreferenced hash does
+    monkeypatch.setattr(cache, "_write_object", write_then_lose)
+
+    cache.store("https://a.org/1", b"x" * 100)
+    entry = cache.lookup("https://a.org/1")
+    assert entry is not None and cache.read_text(entry) == "x" * 100
+
+
+class Response:
+    def __init__(self, status_code, content=b""):
+        self.status_code = status_code
+        self.content = content
+        self.text = content.decode()
+        self.encoding = "utf-8"
+        self.headers = {}
+
+    def raise_for_status(self):
+        pass
+
+
+def test_cached_get_refetches_a_304_it_cannot_reuse(tmp_path):
+    requests_made = []
+
+    class Session:
+        def get(self, url, timeout, headers):
+            requests_made.append(headers)
+            return Response(304) if len(requests_made) == 1 else Response(200, b"fresh page")
+
+    cache = HTTPCache(cache_dir=str(tmp_path))
+    assert cached_get(Session(), "https://a.org/1", cache=cache) == "fresh page"
+    assert requests_made[-1] == {"Cache-Control": "no-cache"}
+    assert cache.read_text(cache.lookup("https://a.org/1")) == "fresh page"
@@ -0,0 +1,40 @@
+import json
+import llm_client
+import services_url
+from journal import Journal, completed_ids, load_results
+from llm_client import LLMError
+
+def test_completed_ids_skip_failed_records(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    with Journal(path) as journal:
+        journal.append("1", {"provider_url": "https://a.org", "ai_analysis": "{}"})
+        journal.append("2", {"provider_url": "https://b.org", "ai_analysis": None})
+        journal.append("3", {"provider_url": "https://c.org", "ai_analysis": "{}"})
+        journal.append("3", {"provider_url": "https://c.org", "ai_analysis": None})
+    assert completed_ids(path) == {"1"}
+
+def test_resume_retries_a_service_whose_analysis_failed(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("catalog.csv", "w", encoding="utf-8") as f:
+        f.write("service_name,service_url,Topic,Subtopic\n")
+        f.write("Food Bank,https://211ontario.ca/service/101/food-bank/,Food,Meals\n")
+    monkeypatch.setattr(services_url, "fetch_provider_url", lambda url, fallback: "https://foodbank.example.org/")
+    monkeypatch.setattr(services_url, "fetch_provider_sites", lambda urls, **kwargs: {url: "Open weekdays" for url in urls})
+
+    llm = {"fails": True}
+    def complete(self, messages, model, temperature, max_tokens, on_delta=None):
+        if llm["fails"]:
+            raise LLMError("stub: provider unavailable")
+        content = json.dumps({"hours": {"regular_hours": "weekdays"}})
+        if on_delta:
+            on_delta(content)
+        return content
+    monkeypatch.setattr(llm_client.LLMClient, "_complete", complete)
+
+    services_url.ServiceScraper().process_services("catalog.csv", journal_path="journal.jsonl")
+    assert completed_ids("journal.jsonl") == set()
+
+    llm["fails"] = False
+    services_url.ServiceScraper().process_services("catalog.csv", journal_path="journal.jsonl")
+    assert completed_ids("journal.jsonl") == {"101"}
+    assert "weekdays" in load_results("journal.jsonl")["101"]["ai_analysis"]
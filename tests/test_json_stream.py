@@ -0,0 +1,17 @@
+from json_stream import StreamingJSONParser, parse_partial_json
+
+
+def test_an_unclosed_nested_container_is_dropped_on_repair():
+    assert parse_partial_json('{"languages": ["English", {"x": "y') == {"languages": ["English"]}
+    assert parse_partial_json('{"name": "A", "hours": {') == {"name": "A"}
+
+
+def test_a_cut_off_list_keeps_its_items_but_is_reported_missing():
+    parser = StreamingJSONParser()
+    parser.feed('{"name": "A", "languages": ["en", "fr')
+    assert parser.result() == {"name": "A", "languages": ["en"]}
+    assert parser.missing(["name", "languages"]) == ["languages"]
+
+
+def test_an_empty_object_still_parses():
+    assert parse_partial_json("Here you go: {") == {}
@@ -0,0 +1,22 @@
+import llm_client
+from metrics import LLM_FIRST_FIELD_SECONDS
+
+
+def first_field_count(model):
+    series = LLM_FIRST_FIELD_SECONDS.series.get(LLM_FIRST_FIELD_SECONDS._key({"provider": "deepseek", "model": model}))
+    return series["count"] if series else 0
+
+
+def test_first_field_time_is_recorded_once_per_completion(monkeypatch):
+    pieces = ['{"name": "Food Bank", "phone": "416-555-1234", ', '"email": "a@b.org"}']
+
+    def complete(self, messages, model, temperature, max_tokens, on_delta=None):
+        for piece in pieces:
+            on_delta(piece)
+        return "".join(pieces)
+    monkeypatch.setattr(llm_client.LLMClient, "_complete", complete)
+
+    client = llm_client.LLMClient("deepseek", api_key="test")
+    parser = client.complete_json([], "first-field-test")
+    assert len(parser.fields) == 3
+    assert first_field_count("first-field-test") == 1
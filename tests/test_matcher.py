@@ -0,0 +1,25 @@
+from matcher import ServiceIndex
+
+SERVICES = [
+    {"service_id": "1", "service_name": "Downtown Food Bank"},
+    {"service_id": "2", "service_name": "Scarborough Food Bank"},
+    {"service_id": "3", "service_name": "Youth Shelter"},
+]
+COORDINATES = {"1": (43.65, -79.38), "2": (43.77, -79.23), "3": (43.65, -79.39)}
+
+
+def make_index():
+    return ServiceIndex(SERVICES, [{"name": s["service_name"]} for s in SERVICES], COORDINATES)
+
+
+def test_a_place_name_location_is_ignored():
+    results = make_index().search({"needs": "food bank", "location": "Toronto"})
+    assert sorted(r["service_id"] for r in results) == ["1", "2"]
+    assert all("distance_km" not in r for r in results)
+
+
+def test_coordinates_limit_results_to_the_radius():
+    near = {"lat": 43.65, "lon": -79.38, "radius_km": 5}
+    results = make_index().search({"needs": "food bank", "location": near})
+    assert [r["service_id"] for r in results] == ["1"]
+    assert results[0]["distance_km"] < 1
@@ -0,0 +1,99 @@
+import csv
+import os
+import threading
+import time
+import pytest
+import all as crawler
+import crawl_plan
+import fast_fetch
+import pipeline
+
+PLAN = {"location": "Toronto", "topics": [
+    {"topic": "Food", "subtopics": [{"subtopic": f"Sub {i}", "result_url": f"https://211ontario.ca/results/?topicPath=1-{i}"}
+                                    for i in range(6)]},
+]}
+
+class Driver:
+    def quit(self):
+        pass
+
+@pytest.fixture
+def crawl(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(crawler, "make_driver", Driver)
+    monkeypatch.setattr(crawl_plan, "load_or_build_plan", lambda discover, location: PLAN)
+    monkeypatch.setattr(fast_fetch, "fetch_provider_url", lambda url, fallback: None)
+
+    def fetch_listing(url, fallback):
+        i = int(url.rsplit("-", 1)[1])
+        time.sleep(0.02 * (6 - i))  # later subtopics finish first
+        return [{"service_name": f"S{i}-{n}", "service_url": f"https://211ontario.ca/service/{i}{n}/s/"}
+                for n in range(2)]
+    monkeypatch.setattr(fast_fetch, "fetch_listing", fetch_listing)
+
+def read_names(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return [row["service_name"] for row in csv.DictReader(f)]
+
+def test_memberships_are_written_in_plan_order(crawl):
+    pipeline.run_service_pipeline(resume=False, memberships_csv="memberships.csv")
+    assert read_names("memberships.csv") == [f"S{i}-{n}" for i in range(6) for n in range(2)]
+
+def test_a_crash_keeps_the_previous_memberships(crawl, monkeypatch):
+    with open("memberships.csv", "w", encoding="utf-8") as f:
+        f.write("service_name,service_url,Topic,Subtopic\nOld,https://211ontario.ca/service/1/old/,Food,Sub\n")
+    run = pipeline.Pipeline.run
+
+    def crash_midway(self, source, sink):
+        jobs = list(source)
+        run(self, jobs[:3], sink)
+        raise RuntimeError("crashed after three subtopics")
+    monkeypatch.setattr(pipeline.Pipeline, "run", crash_midway)
+    with pytest.raises(RuntimeError):
+        pipeline.run_service_pipeline(resume=False, memberships_csv="memberships.csv")
+    assert read_names("memberships.csv") == ["Old"]
+
+def test_a_fresh_cached_plan_starts_no_browser(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    topics = [("Food", [(f"Sub {i}", f"https://211ontario.ca/results/?topicPath=1-{i}") for i in range(2)])]
+    crawl_plan.save_plan(crawl_plan.make_plan("Toronto", topics), crawl_plan.PLAN_FILE)
+
+    def no_browser():
+        raise AssertionError("browser started although the plan cache is fresh")
+    monkeypatch.setattr(crawler, "make_driver", no_browser)
+    monkeypatch.setattr(fast_fetch, "fetch_listing", lambda url, fallback: [])
+    pipeline.run_service_pipeline(resume=False, memberships_csv="memberships.csv")
+    assert read_names("memberships.csv") == []
+
+def test_a_run_after_a_crash_discards_its_spill_files(crawl):
+    os.makedirs("memberships.csv.parts")
+    stale = [{"service_name": "Stale", "service_url": "https://211ontario.ca/service/9/s/", "Topic": "T", "Subtopic": "S"}]
+    pipeline.write_memberships(stale, os.path.join("memberships.csv.parts", "000099.csv"), header=False)
+    pipeline.run_service_pipeline(resume=False, memberships_csv="memberships.csv")
+    assert read_names("memberships.csv") == [f"S{i}-{n}" for i in range(6) for n in range(2)]
+    assert not os.path.exists("memberships.csv.parts")
+
+def test_seen_keys_report_first_sightings_only():
+    seen = pipeline.SeenKeys(["1"])
+    assert [seen.add(key) for key in ["1", "2", "2", "3"]] == [False, True, False, True]
+    seen.close()
+
+def test_a_failing_sink_stops_the_workers_and_raises():
+    def sink(item):
+        raise ValueError("sink broke")
+    threads = threading.active_count()
+    p = pipeline.Pipeline(queue_size=2).stage("double", lambda x: [x, x], workers=3)
+    with pytest.raises(ValueError):
+        p.run(range(1000), sink)
+    assert threading.active_count() == threads  # No worker left blocked on a full queue
+    assert p.stats["double"]["in"] < 1000
+
+def test_a_failing_source_is_raised_after_its_items_drain():
+    def source():
+        yield from range(5)
+        raise OSError("listing broke")
+    received = []
+    p = pipeline.Pipeline(queue_size=2).stage("same", lambda x: [x], workers=2)
+    with pytest.raises(OSError):
+        p.run(source(), received.append)
+    assert sorted(received) == list(range(5))
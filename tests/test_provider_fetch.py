@@ -0,0 +1,50 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_cache
+from provider_fetch import ProviderFetcher
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/missing":
+            self.send_error(404)
+            return
+        if self.path == "/not-modified" and self.headers.get("Cache-Control") != "no-cache":
+            self.send_response(304)  # A misbehaving server: 304 to a request without validators
+            self.end_headers()
+            return
+        body = f"<html><body><p>Page {self.path}</p></body></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def test_fetcher_serves_many_threads_from_one_session(server):
+    with ProviderFetcher(use_cache=False) as fetcher:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            texts = list(pool.map(fetcher.fetch, [f"{server}/{i}" for i in range(20)]))
+        assert texts == [f"Page /{i}" for i in range(20)]
+        assert fetcher.fetch(f"{server}/missing") is None
+
+
+def test_a_304_with_nothing_stored_is_fetched_again(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, "_default_cache", http_cache.HTTPCache(cache_dir=str(tmp_path)))
+    with ProviderFetcher() as fetcher:
+        assert fetcher.fetch(f"{server}/not-modified") == "Page /not-modified"
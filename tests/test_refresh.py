@@ -0,0 +1,90 @@
+import csv
+import json
+import pytest
+import llm_client
+import refresh
+from journal import load_results
+from service_store import ServiceStore
+from llm_client import LLMError
+
+SERVICE_URL = "https://211ontario.ca/service/101/food-bank/"
+PROVIDER_URL = "https://foodbank.example.org/"
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    """A one-service catalog whose pages and LLM answers the test controls"""
+    monkeypatch.chdir(tmp_path)
+    with open("catalog.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["service_name", "service_url", "Topic", "Subtopic"])
+        writer.writeheader()
+        writer.writerow({"service_name": "Food Bank", "service_url": SERVICE_URL, "Topic": "Food", "Subtopic": "Meals"})
+
+    state = {"provider_text": "Open Monday to Friday", "llm_fails": False,
+             "listing": [{"service_name": "Food Bank", "service_url": SERVICE_URL, "Topic": "Food", "Subtopic": "Meals"}]}
+    monkeypatch.setattr(refresh, "crawl_listing", lambda location, previous_rows: list(state["listing"]))
+    monkeypatch.setattr(refresh, "fetch_html", lambda url, **kwargs: "<html>detail</html>")
+    monkeypatch.setattr(refresh, "parse_detail_text", lambda html: "Food Bank detail")
+    monkeypatch.setattr(refresh, "parse_provider_link", lambda html, url: (True, PROVIDER_URL))
+    monkeypatch.setattr(refresh, "fetch_provider_sites",
+                        lambda urls, **kwargs: {url: state["provider_text"] for url in urls if url})
+
+    def complete(self, messages, model, temperature, max_tokens, on_delta=None):
+        if state["llm_fails"]:
+            raise LLMError("stub: provider unavailable")
+        content = json.dumps({"hours": {"regular_hours": state["provider_text"]}})
+        if on_delta:
+            on_delta(content)
+        return content
+    monkeypatch.setattr(llm_client.LLMClient, "_complete", complete)
+    return state
+
+def test_failed_analysis_keeps_last_extraction_and_is_retried(site):
+    refresh.refresh("catalog.csv")
+    good = load_results()["101"]["ai_analysis"]
+    assert "Monday to Friday" in good
+    first_snapshot = refresh.load_snapshot()
+
+    site["provider_text"] = "Open weekends only"
+    site["llm_fails"] = True
+    delta = refresh.refresh("catalog.csv")
+    assert delta["changed"] == ["101"]
+    assert load_results()["101"]["ai_analysis"] == good
+    # The old fingerprint is kept, so the next refresh still sees the change
+    assert refresh.load_snapshot() == first_snapshot
+
+    site["llm_fails"] = False
+    delta = refresh.refresh("catalog.csv")
+    assert delta["changed"] == ["101"]
+    assert "weekends only" in load_results()["101"]["ai_analysis"]
+
+def test_provider_hash_ignores_other_pages_of_the_host(site, monkeypatch):
+    pages = {
+        "https://example.org/a": "Menu\nFood bank hours",
+        "https://example.org/b": "Menu\nShelter beds",
+    }
+    monkeypatch.setattr(refresh, "parse_provider_link",
+                        lambda html, url: (True, f"https://example.org/{url.rstrip('/')[-1]}"))
+    monkeypatch.setattr(refresh, "fetch_provider_sites", lambda urls, **kwargs: {url: pages[url] for url in urls})
+    a = {"service_id": "1", "service_name": "A", "service_url": "https://211ontario.ca/service/1/a"}
+    b = {"service_id": "2", "service_name": "B", "service_url": "https://211ontario.ca/service/2/b"}
+
+    alone, _ = refresh.fingerprint_services([a], scraper=None)
+    together, _ = refresh.fingerprint_services([a, b], scraper=None)
+    # With b present "Menu" counts as boilerplate of the host; a's fingerprint must not move
+    assert alone["1"]["provider_hash"] == together["1"]["provider_hash"]
+
+def test_services_gone_from_the_listing_are_recorded_as_removed(site):
+    refresh.refresh("catalog.csv")
+    site["listing"] = []
+    delta = refresh.refresh("catalog.csv")
+    assert delta["removed"] == ["101"]
+    with ServiceStore() as store:
+        assert store.removed_services() == ["101"]
+    with open("catalog.csv", newline="", encoding="utf-8") as f:
+        assert list(csv.DictReader(f)) == []
+
+    # Listed again: the removal is superseded
+    site["listing"] = [{"service_name": "Food Bank", "service_url": SERVICE_URL, "Topic": "Food", "Subtopic": "Meals"}]
+    refresh.refresh("catalog.csv")
+    with ServiceStore() as store:
+        assert store.removed_services() == []
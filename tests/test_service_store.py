@@ -0,0 +1,14 @@
+from service_store import ServiceStore
+
+def test_mixed_statements_in_one_batch_keep_queue_order(tmp_path):
+    with ServiceStore(str(tmp_path / "services.sqlite")) as store:
+        store.add_memberships([{"service_name": "One", "service_url": "https://211ontario.ca/service/1/one/",
+                                "Topic": "Food", "Subtopic": "Meals"}])
+        store.add_provider("1", "https://a.org/one")
+        store.add_memberships([{"service_name": "Two", "service_url": "https://211ontario.ca/service/2/two/",
+                                "Topic": "Food", "Subtopic": "Meals"}])
+        store.add_provider("2", "https://www.a.org/two")
+        assert len(store.pending) == 8  # still one unflushed batch
+
+        assert store.service("2")["provider_url"] == "https://www.a.org/two"
+        assert [s["service_id"] for s in store.services_for_domain("a.org")] == ["1", "2"]
@@ -0,0 +1,41 @@
+import json
+import llm_client
+import services_url
+
+PAGES = {
+    "https://example.org/a": "Menu\nContact us\nFood bank open weekdays",
+    "https://example.org/b": "Menu\nContact us\nShelter beds for youth",
+}
+
+def write_catalog(path, ids):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("service_name,service_url,Topic,Subtopic\n")
+        for sid in ids:
+            f.write(f"Service {sid},https://211ontario.ca/service/{sid}/{sid}/,Food,Meals\n")
+
+def test_cache_key_does_not_depend_on_batch_neighbours(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    providers = {"1": "https://example.org/a", "2": "https://example.org/b"}
+    monkeypatch.setattr(services_url, "fetch_provider_url",
+                        lambda url, fallback: providers[url.split("/service/")[1].split("/")[0]])
+    monkeypatch.setattr(services_url, "fetch_provider_sites", lambda urls, **kwargs: {url: PAGES[url] for url in urls})
+
+    prompts = []
+    def complete(self, messages, model, temperature, max_tokens, on_delta=None):
+        prompts.append(messages[-1]["content"])
+        content = json.dumps(services_url.DEEPSEEK_SCHEMA)
+        if on_delta:
+            on_delta(content)
+        return content
+    monkeypatch.setattr(llm_client.LLMClient, "_complete", complete)
+
+    write_catalog("alone.csv", ["1"])
+    services_url.ServiceScraper().process_services("alone.csv", resume=False)
+    # Page a alone keeps its menu; next to page b the shared lines are stripped
+    assert "Menu" in prompts[0]
+
+    write_catalog("together.csv", ["1", "2"])
+    services_url.ServiceScraper().process_services("together.csv", resume=False)
+    # Only page b is a new LLM input; page a is answered from the cache
+    assert len([p for p in prompts if "Shelter beds" in p]) >= 1
+    assert not [p for p in prompts[1:] if "Food bank open weekdays" in p]
@@ -0,0 +1,28 @@
+import time
+
+from waits import WaitRecorder, wait_for_stable_count
+
+RESULTS = ("class name", "title")
+EMPTY = ("xpath", "//p[@class='no-results']")
+
+
+class Driver:
+    def __init__(self, results=0, empty=False):
+        self.results = results
+        self.empty = empty
+
+    def find_elements(self, by, value):
+        if (by, value) == RESULTS:
+            return [object()] * self.results
+        return [object()] if self.empty and (by, value) == EMPTY else []
+
+
+def test_an_empty_listing_returns_without_waiting_for_results():
+    start = time.monotonic()
+    count = wait_for_stable_count(Driver(empty=True), RESULTS, empty_locator=EMPTY, timeout=5, rec=WaitRecorder())
+    assert count == 0
+    assert time.monotonic() - start < 1
+
+
+def test_results_still_wait_for_a_stable_count():
+    assert wait_for_stable_count(Driver(results=3), RESULTS, empty_locator=EMPTY, settle=0.2, rec=WaitRecorder()) == 3
@@ -0,0 +1,88 @@
+from bs4 import BeautifulSoup
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Elements whose text never describes the service
+UNWANTED_TAGS = ['script', 'style', 'nav', 'footer', 'iframe']
+
+def _append_lines(lines, text):
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            lines.append(line)
+
+class _TextCollector:
+    """
+    lxml parser target: receives parse events as libxml2 reads the page and
+    keeps the text outside unwanted elements, so no tree is ever built.
+    """
+    def __init__(self):
+        self.lines = []
+        self.pending = []      # Data events belonging to the current text node
+        self.skip_depth = 0    # > 0 while inside an unwanted element
+
+    def _flush(self):
+        if self.pending:
+            if not self.skip_depth:
+                _append_lines(self.lines, ''.join(self.pending))
+            self.pending = []
+
+    def start(self, tag, attrib):
+        self._flush()
+        if self.skip_depth or tag in UNWANTED_TAGS:
+            self.skip_depth += 1
+
+    def end(self, tag):
+        self._flush()
+        if self.skip_depth:
+            self.skip_depth -= 1
+
+    def data(self, data):
+        self.pending.append(data)
+
+    def comment(self, text):
+        self._flush()
+
+    def pi(self, target, data=None):
+        self._flush()
+
+    def close(self):
+        self._flush()
+        return self.lines
+
+def clean_page_text_bs4(html):
+    """BeautifulSoup implementation of clean_page_text, used when lxml is missing"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Remove unwanted elements
+    for element in soup(UNWANTED_TAGS):
+        element.decompose()
+
+    # Get text content
+    text = soup.get_text(separator='\n', strip=True)
+
+    # Clean and normalize text
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return '\n'.join(lines)
+
+def clean_page_text(html):
+    """
+    Strip unwanted elements from an HTML page and return its visible text,
+    one non-empty, whitespace-trimmed line per text block.
+    With lxml installed this happens in a single streaming pass of its C parser.
+    """
+    if etree is None or not html:
+        return clean_page_text_bs4(html or '')
+    parser = etree.HTMLParser(target=_TextCollector())
+    try:
+        parser.feed(html)
+        return '\n'.join(parser.close())
+    except (etree.LxmlError, ValueError):
+        return clean_page_text_bs4(html)
+
+def clean_inline_text(html):
+    """Visible text of an HTML fragment collapsed onto a single line"""
+    return ' '.join(clean_page_text(html).split())
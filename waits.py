@@ -0,0 +1,222 @@
+import time
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
+from metrics import WAIT_SECONDS
+
+# ---------- Configuration ----------
+
+# Per-step timeouts in seconds. Steps not listed here fall back to DEFAULT_TIMEOUT.
+STEP_TIMEOUTS = {
+    "page_ready": 15,
+    "element": 10,
+    "network_idle": 8,
+    "stable_count": 10,
+    "next_page": 5,
+}
+DEFAULT_TIMEOUT = 10
+POLL_INTERVAL = 0.1     # Seconds between readiness checks
+IDLE_WINDOW = 0.5       # Seconds with no network activity to count as idle
+SETTLE_WINDOW = 0.5     # Seconds a result count must hold steady to count as stable
+
+# Installs a counter of in-flight fetch/XHR requests on the page (idempotent per document)
+NETWORK_HOOK_JS = """
+if (!window.__snmPending) {
+    window.__snmPending = {count: 0};
+    var pending = window.__snmPending;
+    var origFetch = window.fetch;
+    if (origFetch) {
+        window.fetch = function() {
+            pending.count++;
+            return origFetch.apply(this, arguments).finally(function() { pending.count--; });
+        };
+    }
+    var origSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        pending.count++;
+        this.addEventListener('loadend', function() { pending.count--; });
+        return origSend.apply(this, arguments);
+    };
+}
+return [window.__snmPending.count, performance.getEntriesByType('resource').length];
+"""
+
+# ---------- Wait Recorder ----------
+
+class WaitRecorder:
+    """
+    Records how long each wait actually took, next to the fixed sleep it replaced,
+    so a crawl can report the idle time saved.
+    """
+    def __init__(self):
+        self.records = []  # (step, elapsed, baseline, ok)
+
+    def record(self, step, elapsed, baseline=0, ok=True):
+        self.records.append((step, elapsed, baseline, ok))
+
+    def reset(self):
+        self.records = []
+
+    def summary(self):
+        """Return per-step totals: count, waited, baseline, max and timeouts"""
+        steps = {}
+        for step, elapsed, baseline, ok in self.records:
+            s = steps.setdefault(step, {"count": 0, "waited": 0.0, "baseline": 0.0,
+                                        "max": 0.0, "timeouts": 0})
+            s["count"] += 1
+            s["waited"] += elapsed
+            s["baseline"] += baseline
+            s["max"] = max(s["max"], elapsed)
+            if not ok:
+                s["timeouts"] += 1
+        return steps
+
+    def print_summary(self):
+        """Print a per-step table of time waited vs. the old fixed sleeps"""
+        steps = self.summary()
+        if not steps:
+            return
+        total_waited = sum(s["waited"] for s in steps.values())
+        total_baseline = sum(s["baseline"] for s in steps.values())
+        print("\n[INFO] Wait summary (step: count, waited, fixed-sleep baseline, max, timeouts)")
+        for step, s in sorted(steps.items(), key=lambda kv: -kv[1]["waited"]):
+            print(f"  {step}: {s['count']}x, {s['waited']:.1f}s waited, "
+                  f"{s['baseline']:.1f}s baseline, max {s['max']:.2f}s, {s['timeouts']} timeouts")
+        print(f"[INFO] Total waited {total_waited:.1f}s vs {total_baseline:.1f}s of fixed sleeps "
+              f"(saved {total_baseline - total_waited:.1f}s)")
+
+# Shared recorder used when callers don't pass their own
+recorder = WaitRecorder()
+
+# ---------- Helper Functions ----------
+
+def _timeout(kind, timeout):
+    return timeout if timeout is not None else STEP_TIMEOUTS.get(kind, DEFAULT_TIMEOUT)
+
+def _poll(condition, timeout):
+    """Poll 'condition' until it returns a truthy value or the timeout expires"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            result = condition()
+        except Exception:
+            result = None
+        if result:
+            return result
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(POLL_INTERVAL)
+
+def _finish(step, start, baseline, ok, rec):
+    elapsed = time.monotonic() - start
+    (rec or recorder).record(step, elapsed, baseline, ok)
+    WAIT_SECONDS.observe(elapsed, step=step, outcome="ok" if ok else "timeout")
+
+# ---------- Readiness Waits ----------
+
+def wait_for_page_ready(driver, step="page_ready", timeout=None, baseline=0, rec=None):
+    """
+    Waits until document.readyState is 'complete'.
+    Returns True when ready, False on timeout.
+    """
+    start = time.monotonic()
+    ok = bool(_poll(
+        lambda: driver.execute_script("return document.readyState") == "complete",
+        _timeout("page_ready", timeout),
+    ))
+    _finish(step, start, baseline, ok, rec)
+    return ok
+
+def wait_for_element(driver, locator, step="element", clickable=False, timeout=None, baseline=0, rec=None):
+    """
+    Waits for a single element to be present (or clickable) and returns it.
+    Raises TimeoutException like WebDriverWait so existing error handling still applies.
+    """
+    start = time.monotonic()
+    condition = EC.element_to_be_clickable(locator) if clickable else EC.presence_of_element_located(locator)
+    try:
+        element = WebDriverWait(driver, _timeout("element", timeout), poll_frequency=POLL_INTERVAL).until(condition)
+    except TimeoutException:
+        _finish(step, start, baseline, False, rec)
+        raise
+    _finish(step, start, baseline, True, rec)
+    return element
+
+def wait_for_staleness(driver, element, step="staleness", timeout=None, baseline=0, rec=None):
+    """
+    Waits for an element from the previous page to detach, i.e. a navigation happened.
+    Returns True when stale, False on timeout.
+    """
+    start = time.monotonic()
+    try:
+        WebDriverWait(driver, _timeout("page_ready", timeout), poll_frequency=POLL_INTERVAL).until(
+            EC.staleness_of(element)
+        )
+        ok = True
+    except TimeoutException:
+        ok = False
+    _finish(step, start, baseline, ok, rec)
+    return ok
+
+def wait_for_network_idle(driver, step="network_idle", idle_window=IDLE_WINDOW, timeout=None, baseline=0, rec=None):
+    """
+    Waits until no fetch/XHR requests are pending and no new resources have
+    loaded for 'idle_window' seconds. Returns True when idle, False on timeout.
+    """
+    start = time.monotonic()
+    deadline = start + _timeout("network_idle", timeout)
+    last_resources = None
+    quiet_since = None
+    ok = False
+    while time.monotonic() < deadline:
+        try:
+            pending, resources = driver.execute_script(NETWORK_HOOK_JS)
+        except Exception:
+            pending, resources = 0, last_resources
+        now = time.monotonic()
+        if pending == 0 and resources == last_resources:
+            if quiet_since is None:
+                quiet_since = now
+            if now - quiet_since >= idle_window:
+                ok = True
+                break
+        else:
+            quiet_since = None
+        last_resources = resources
+        time.sleep(POLL_INTERVAL)
+    _finish(step, start, baseline, ok, rec)
+    return ok
+
+def wait_for_stable_count(driver, locator, step="stable_count", min_count=1, settle=SETTLE_WINDOW,
+                          empty_locator=None, timeout=None, baseline=0, rec=None):
+    """
+    Waits until at least 'min_count' elements match 'locator' and the count has
+    not changed for 'settle' seconds. Returns the final count (0 on timeout).
+    If 'empty_locator' (the page's "no results" marker) matches while nothing
+    matches 'locator', returns 0 at once instead of waiting out the timeout.
+    """
+    start = time.monotonic()
+    deadline = start + _timeout("stable_count", timeout)
+    last_count = -1
+    stable_since = None
+    count = 0
+    ok = False
+    while time.monotonic() < deadline:
+        try:
+            count = len(driver.find_elements(*locator))
+            if count == 0 and empty_locator is not None and driver.find_elements(*empty_locator):
+                ok = True
+                break
+        except Exception:
+            count = 0
+        now = time.monotonic()
+        if count >= min_count and count == last_count:
+            if now - stable_since >= settle:
+                ok = True
+                break
+        else:
+            stable_since = now
+        last_count = count
+        time.sleep(POLL_INTERVAL)
+    _finish(step, start, baseline, ok, rec)
+    return count if ok else 0